@@ -1,8 +1,9 @@
 from django.urls import path
 
 from .views import (AddFavoriteApi, AddPurchaseApi, AddSubscriptionApi,
-                    IngredientApi, RemoveFavoriteApi,
+                    BatchApi, IngredientApi, RemoveFavoriteApi,
                     RemovePurchaseApi, RemoveSubscriptionApi,
+                    SearchApi,
                     )
 
 urlpatterns = [
@@ -12,5 +13,7 @@ urlpatterns = [
     path("remove_favorites/<int:id>/", RemoveFavoriteApi.as_view(), name='remove_favorites'),
     path("add_purchases/", AddPurchaseApi.as_view(), name='add_purchases'),
     path("remove_purchases/<int:id>/", RemovePurchaseApi.as_view(), name='remove_purchases'),
+    path("batch/", BatchApi.as_view(), name='batch'),
     path("ingredients/", IngredientApi.as_view(), name='ingredient'),
+    path("search/", SearchApi.as_view(), name='search_api'),
 ]
\ No newline at end of file
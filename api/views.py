@@ -1,11 +1,16 @@
 import json
+import uuid
 
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import JsonResponse
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
 from django.views import View
 
-from app.mixins import AddMixin, RemoveMixin
-from app.models import Ingredient, User, Subscription, Favorite, ShopList
+from app import toggles
+from app.mixins import AddMixin, RemoveMixin, get_posted_id, toggle_response
+from app.ingredient_index import ingredient_index
+from app.models import Subscription, Favorite, ShopList
+from app.search import get_recipes, search_recipe_ids
 
 
 class IngredientApi(LoginRequiredMixin, View):
@@ -15,10 +20,27 @@ class IngredientApi(LoginRequiredMixin, View):
 
     @staticmethod
     def get(request, *args, **kwargs):
-        ingredient = request.GET['query']
-        data = []
-        if len(ingredient) >= 3:
-            data = list(Ingredient.objects.filter(title__startswith=ingredient).values('title', 'dimension'))
+        data = ingredient_index.search(request.GET.get('query', ''))
+        return JsonResponse(data, safe=False, json_dumps_params={'ensure_ascii': False})
+
+
+class SearchApi(View):
+    """
+    Класс принимает поисковый запрос и возвращает найденные рецепты в json
+    """
+
+    @staticmethod
+    def get(request, *args, **kwargs):
+        ids = search_recipe_ids(request.GET.get('q', ''))
+        data = [
+            {
+                'id': recipe.id,
+                'title': recipe.title,
+                'author': recipe.author.get_full_name(),
+                'url': recipe.get_absolute_url(),
+            }
+            for recipe in get_recipes(ids)
+        ]
         return JsonResponse(data, safe=False, json_dumps_params={'ensure_ascii': False})
 
 
@@ -29,16 +51,11 @@ class AddSubscriptionApi(LoginRequiredMixin, View):
 
     @staticmethod
     def post(request, *args, **kwargs):
-        user = request.user
-        author_id = json.loads(request.body).get('id')
-        author = User.objects.get(id=author_id)
-        follow = Subscription.objects.filter(user=user, author=author).exists()
-        if user != author and not follow:
-            _, subscribed = Subscription.objects.get_or_create(user=request.user, author=author)
-            data = {'success': subscribed}
-        else:
-            data = {'success': False}
-        return JsonResponse(data, safe=False)
+        author_id = get_posted_id(request)
+        if author_id is None:
+            raise Http404('Автор не найден')
+        user_id = request.user.id
+        return toggle_response(toggles.add(Subscription, {'user_id': user_id}, 'author', author_id, user_id))
 
 
 class RemoveSubscriptionApi(LoginRequiredMixin, View):
@@ -48,15 +65,7 @@ class RemoveSubscriptionApi(LoginRequiredMixin, View):
 
     @staticmethod
     def delete(request, id, *args, **kwargs):
-        user = request.user
-        author = User.objects.get(id=id)
-        follow = Subscription.objects.filter(user=user, author=author)
-        if user != author and follow.exists():
-            removed = follow.delete()
-            data = {'success': True if removed else False}
-        else:
-            data = {'success': False}
-        return JsonResponse(data, safe=False)
+        return toggle_response(toggles.remove(Subscription, {'user_id': request.user.id}, 'author', id))
 
 
 class AddFavoriteApi(LoginRequiredMixin, AddMixin, View):
@@ -85,3 +94,39 @@ class RemovePurchaseApi(RemoveMixin, View):
 
     def delete(self, request, id, *args, **kwargs):
         return super().user_delete(request, id, ShopList)
+
+
+class BatchApi(View):
+    """
+    Класс применяет пакет операций со списком покупок, избранным и подписками
+    и возвращает успех каждой операции и новое состояние пользователя.
+    Неавторизованному пользователю доступен только список покупок
+    """
+
+    @staticmethod
+    def post(request, *args, **kwargs):
+        try:
+            operations = toggles.parse_operations(json.loads(request.body))
+        except ValueError:
+            operations = None
+        if operations is None:
+            return HttpResponseBadRequest('Неверный пакет операций')
+
+        if request.user.is_authenticated:
+            owner = {'user_id': request.user.id}
+        elif any(kind != 'purchase' for _, kind, _ in operations):
+            raise PermissionDenied
+        else:
+            session_key = request.session.get('purchase_id')
+            if not session_key:
+                session_key = request.session['purchase_id'] = str(uuid.uuid4())
+            owner = {'session_key': session_key}
+
+        results, state = toggles.apply_operations(operations, **owner)
+        data = {
+            'results': results,
+            'subscriptions': sorted(state.subscribers),
+            'favorites': sorted(state.favorites),
+            'purchases': sorted(state.purchases),
+        }
+        return JsonResponse(data)
@@ -1,21 +1,74 @@
+from django import forms
 from django.contrib import admin
 from django.utils.safestring import mark_safe
 
+from . import search, shop_totals
+from .counters import save_without_counters
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient, ShopList,
                      Subscription)
 
 
+class RecipeAdminForm(forms.ModelForm):
+    tag = forms.MultipleChoiceField(choices=Recipe.TAGS, widget=forms.CheckboxSelectMultiple, label='Теги')
+
+    class Meta:
+        model = Recipe
+        exclude = ("tags",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.initial['tag'] = self.instance.tag
+
+    def save(self, commit=True):
+        self.instance.tag = self.cleaned_data['tag']
+        return super().save(commit)
+
+
+class TagListFilter(admin.SimpleListFilter):
+    title = "Теги"
+    parameter_name = "tag"
+
+    def lookups(self, request, model_admin):
+        return Recipe.TAGS
+
+    def queryset(self, request, queryset):
+        mask = Recipe.tags_to_mask([self.value()]) if self.value() else 0
+        if mask:
+            return queryset.filter(tags__in=Recipe.masks_matching(mask))
+        return queryset
+
+
+class RecipeIngredientInline(admin.TabularInline):
+    model = RecipeIngredient
+    autocomplete_fields = ("ingredient",)
+    extra = 1
+
+
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ("slug", "author", "title", "tag", "text", "get_html_photo", "time", "pub_date")
+    form = RecipeAdminForm
+    inlines = (RecipeIngredientInline,)
+    list_display = ("slug", "author", "title", "tag", "text", "get_html_photo", "time", "pub_date", "favorite_count")
     list_display_links = ("slug", "author")
-    list_filter = ("author", "tag", "time", "pub_date")
-    fields = ("author", "title", "tag", "ingredient", "text", "image", "get_html_photo", "time")
+    list_filter = ("author", TagListFilter, "time", "pub_date")
+    fields = ("author", "title", "tag", "text", "image", "get_html_photo", "time")
     readonly_fields = ('get_html_photo', "pub_date")
-    filter_horizontal = ("ingredient",)
     search_fields = ("title",)
     empty_value_display = "-пусто-"
     save_on_top = True
 
+    def save_model(self, request, obj, form, change):
+        save_without_counters(obj)
+
+    def save_related(self, request, form, formsets, change):
+        recipe = form.instance
+        listed = change and ShopList.objects.filter(recipe=recipe).exists()
+        if listed:
+            shop_totals.remove_listed_recipe(recipe.id)
+        super().save_related(request, form, formsets, change)
+        if listed:
+            shop_totals.add_listed_recipe(recipe.id)
+        search.index_recipe(recipe)
+
     def get_html_photo(self, object):
         return mark_safe(f"<img src='{object.image.url}' width=100>")
 
@@ -30,7 +83,7 @@ class IngredientAdmin(admin.ModelAdmin):
 
 
 class RecipeIngredientAdmin(admin.ModelAdmin):
-    list_display = ("id", "ingredient", "ing_count")
+    list_display = ("id", "recipe", "ingredient", "ing_count")
     list_display_links = ("id", "ingredient")
     empty_value_display = "-пусто-"
 
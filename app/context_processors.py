@@ -0,0 +1,23 @@
+from django.utils.functional import SimpleLazyObject
+
+from .user_state import get_user_state
+
+
+def get_purchases_count(request):
+    """У пользователя число покупок хранится счетчиком, у анонимной сессии считается по состоянию"""
+    if request.user.is_authenticated:
+        return request.user.purchase_count
+    return get_user_state(request).purchases_count
+
+
+def user_state(request):
+    """
+    Добавляет в контекст подписки, избранное и покупки пользователя.
+    Состояние загружается только если шаблон к нему обратился
+    """
+    return {
+        'subscribers': SimpleLazyObject(lambda: get_user_state(request).subscribers),
+        'favorites': SimpleLazyObject(lambda: get_user_state(request).favorites),
+        'purchases': SimpleLazyObject(lambda: get_user_state(request).purchases),
+        'purchases_count': SimpleLazyObject(lambda: get_purchases_count(request)),
+    }
@@ -0,0 +1,65 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Recipe, ShopList, Subscription, User
+
+# счетчик: модель, поле, модель считаемых записей, ссылка на модель счетчика
+COUNTERS = (
+    (User, 'recipe_count', Recipe, 'author'),
+    (User, 'follower_count', Subscription, 'author'),
+    (User, 'purchase_count', ShopList, 'user'),
+    (Recipe, 'favorite_count', Favorite, 'recipe'),
+)
+
+
+def save_without_counters(instance):
+    """
+    Сохраняет форму или профиль, не трогая колонки счетчиков: они меняются только
+    атомарными UPDATE, и полное сохранение записанного раньше экземпляра затерло бы
+    параллельное изменение. Новая запись сохраняется целиком
+    """
+    if instance._state.adding:
+        return instance.save()
+    counters = {field for model, field, _, _ in COUNTERS if isinstance(instance, model)}
+    return instance.save(update_fields=[
+        field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in counters
+    ])
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно меняет счетчик одним UPDATE, не опуская его ниже нуля"""
+    if pk is None or not delta:
+        return
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def change_counters(model, pks, field, delta):
+    """То же, что change_counter, для нескольких строк одним UPDATE"""
+    if not pks or not delta:
+        return
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def count_subquery(related, fk):
+    """Подзапрос, считающий записи related, ссылающиеся на строку внешнего запроса"""
+    counts = related.objects.filter(
+        **{fk: OuterRef('pk')}
+    ).order_by().values(fk).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+def reconcile(model, field, related, fk):
+    """Пересчитывает разошедшиеся значения счетчика, возвращает число исправленных строк"""
+    drifted = list(model.objects.annotate(
+        actual=count_subquery(related, fk)
+    ).exclude(**{field: F('actual')}).values_list('pk', flat=True))
+    if drifted:
+        model.objects.filter(pk__in=drifted).update(**{field: count_subquery(related, fk)})
+    return len(drifted)
@@ -1,6 +1,9 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
 
 from .models import Recipe
+from .uploads import normalize_image
 
 
 class RecipeForm(forms.ModelForm):
@@ -16,3 +19,25 @@ class RecipeForm(forms.ModelForm):
             'image': forms.FileInput(attrs={'class': 'form__file-button'})
         }
 
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_errors = upload_errors or {}
+
+    def clean(self):
+        """Файл, отклоненный при загрузке, не попал в форму: вместо «Обязательное поле» показывается причина"""
+        cleaned_data = super().clean()
+        for field, message in self.upload_errors.items():
+            if field in self.fields:
+                self.errors.pop(field, None)
+                self.add_error(field, message)
+        return cleaned_data
+
+    def clean_image(self):
+        """Новое фото уменьшается и пересохраняется, чтобы в media не попадали многомегабайтные оригиналы"""
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image
+        try:
+            return normalize_image(image)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            raise forms.ValidationError('Не удалось обработать изображение')
@@ -0,0 +1,80 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Ingredient
+
+CATALOG_KEY = 'ingredient_catalog_name'
+KEEP_VERSIONS = 3
+
+
+def build_catalog():
+    """Справочник ингредиентов в json и имя файла с хешем содержимого, id отправляет форма рецепта"""
+    rows = Ingredient.objects.order_by('title', 'dimension').values_list('id', 'title', 'dimension')
+    content = json.dumps(
+        [{'id': pk, 'title': title, 'dimension': dimension} for pk, title, dimension in rows.iterator()],
+        ensure_ascii=False, separators=(',', ':')
+    ).encode()
+    return f'ingredients.{hashlib.sha256(content).hexdigest()[:12]}.json', content
+
+
+def _write(path, content):
+    """Пишет файл атомарно, чтобы nginx не отдал его недописанным"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as file:
+        file.write(content)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def _prune(root, keep):
+    """Удаляет старые версии, оставляя несколько последних для уже открытых страниц"""
+    names = [name for name in os.listdir(root) if name.startswith('ingredients.') and name.endswith('.json')]
+    names.sort(key=lambda name: os.path.getmtime(os.path.join(root, name)), reverse=True)
+    for name in names[keep:]:
+        for path in (os.path.join(root, name), os.path.join(root, name + '.gz')):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def publish_catalog():
+    """
+    Записывает справочник в INGREDIENT_CATALOG_ROOT вместе со сжатой копией
+    для gzip_static и запоминает имя текущей версии в кэше
+    """
+    name, content = build_catalog()
+    root = settings.INGREDIENT_CATALOG_ROOT
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, name)
+    if not os.path.exists(path):
+        _write(path + '.gz', gzip.compress(content, 9, mtime=0))
+        _write(path, content)
+    else:
+        os.utime(path)
+    _prune(root, KEEP_VERSIONS)
+    cache.set(CATALOG_KEY, name, None)
+    return name
+
+
+def get_catalog_url():
+    """
+    Адрес текущей версии справочника. Если файл не удалось записать,
+    возвращается None, и подсказки работают через api
+    """
+    name = cache.get(CATALOG_KEY)
+    if name is None:
+        try:
+            name = publish_catalog()
+        except OSError:
+            return None
+    return settings.INGREDIENT_CATALOG_URL + name
+
+
+def invalidate_catalog():
+    """Справочник изменился, новая версия будет записана при следующем обращении"""
+    cache.delete(CATALOG_KEY)
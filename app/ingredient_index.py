@@ -0,0 +1,109 @@
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'ingredient_index_version'
+MIN_QUERY_LENGTH = 3
+MAX_RESULTS = 20
+
+
+def normalize(text):
+    """Подсказки не различают регистр, буквы ё/е и лишние пробелы"""
+    return ' '.join(text.lower().replace('ё', 'е').split())
+
+
+def _prefix_range(keys, prefix):
+    """Позиции ключей отсортированного списка, начинающихся с prefix"""
+    start = bisect_left(keys, prefix)
+    end = bisect_left(keys, prefix + '\uffff', start)
+    return range(start, end)
+
+
+class IngredientIndex:
+    """
+    Справочник ингредиентов в памяти процесса для подсказок при вводе.
+    Хранит отсортированные нормализованные названия и отдельно начала
+    следующих слов названия, чтобы "грудки" находили "куриные грудки".
+    Строится лениво при первом обращении и перестраивается, если справочник
+    изменился в любом процессе или истек INGREDIENT_INDEX_TTL
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._version = None
+        self._items = []
+        self._titles = []
+        self._words = []
+        self._word_items = []
+
+    def load(self):
+        """Строит индекс заново одним запросом к справочнику"""
+        from .models import Ingredient
+
+        rows = Ingredient.objects.order_by().values_list('title', 'dimension')
+        items = sorted((normalize(title), title, dimension) for title, dimension in rows.iterator())
+        words = sorted(
+            (word, pos)
+            for pos, (key, _, _) in enumerate(items)
+            for word in key.split(' ')[1:]
+        )
+        with self._lock:
+            self._items = [{'title': title, 'dimension': dimension} for _, title, dimension in items]
+            self._titles = [key for key, _, _ in items]
+            self._words = [word for word, _ in words]
+            self._word_items = [pos for _, pos in words]
+            self._loaded_at = time.monotonic()
+            self._version = cache.get(VERSION_KEY)
+
+    def invalidate(self):
+        """Сбрасывает копию индекса во всех процессах, вызывается при изменении справочника"""
+        with self._lock:
+            self._loaded_at = None
+        cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+    def ensure_loaded(self):
+        version = cache.get(VERSION_KEY)
+        ttl = getattr(settings, 'INGREDIENT_INDEX_TTL', 3600)
+        with self._lock:
+            if (self._loaded_at is None or version != self._version
+                    or time.monotonic() - self._loaded_at > ttl):
+                self.load()
+
+    def search(self, query, limit=MAX_RESULTS):
+        """
+        Возвращает до limit ингредиентов в порядке: точное совпадение,
+        начало названия, начало другого слова названия, вхождение в середину.
+        Внутри группы короче название - выше
+        """
+        query = normalize(query)
+        if len(query) < MIN_QUERY_LENGTH:
+            return []
+        self.ensure_loaded()
+        with self._lock:
+            titles = self._titles
+            found = list(_prefix_range(titles, query))
+            seen = set(found)
+            found.sort(key=lambda pos: (titles[pos] != query, len(titles[pos]), titles[pos]))
+
+            if len(found) < limit:
+                words = sorted(
+                    {self._word_items[pos] for pos in _prefix_range(self._words, query)} - seen,
+                    key=lambda pos: (len(titles[pos]), titles[pos])
+                )
+                found.extend(words)
+                seen.update(words)
+
+            if len(found) < limit:
+                found.extend(sorted(
+                    (pos for pos, title in enumerate(titles) if query in title and pos not in seen),
+                    key=lambda pos: (len(titles[pos]), titles[pos])
+                ))
+            return [self._items[pos] for pos in found[:limit]]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,45 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.pdf_jobs import TEMPLATE
+from app.pdf_pool import RendererPool
+from app.services import render_pdf
+
+
+def get_rows(count):
+    return [{'title': f'Ингредиент {number}', 'total': number, 'dimension': 'г'} for number in range(count)]
+
+
+def measure(render, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает время рендеринга PDF списка покупок: холодный процесс, процесс запроса и прогретый пул'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10, 100, 1000],
+                            help='Число строк в списке покупок')
+        parser.add_argument('--repeat', type=int, default=5, help='Повторов для медианы')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"строк":>6} {"холодный":>10} {"в запросе":>10} {"пул":>10}')
+        for size in options['sizes']:
+            context = {'totals': get_rows(size)}
+
+            # новый процесс: запуск Django, разбор шаблона, CSS и шрифта, затем сам PDF
+            pool = RendererPool(1, options['repeat'] + 1, timeout=600)
+            cold = measure(lambda: pool.render(TEMPLATE, context), 1)
+            # как рендерил PDF процесс веб-сервера до пула
+            inline = measure(lambda: render_pdf(TEMPLATE, context), options['repeat'])
+            warm = measure(lambda: pool.render(TEMPLATE, context), options['repeat'])
+            pool.close()
+
+            self.stdout.write(f'{size:>6} {cold:>9.3f}с {inline:>9.3f}с {warm:>9.3f}с')
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from app.ingredient_catalog import publish_catalog
+
+
+class Command(BaseCommand):
+    help = 'Записывает справочник ингредиентов для подсказок на клиенте'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Справочник ингредиентов: {publish_catalog()}')
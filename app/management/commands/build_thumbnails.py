@@ -0,0 +1,29 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from app.models import Recipe
+from app.thumbnails import setup_worker, try_generate
+
+
+class Command(BaseCommand):
+    help = 'Создает миниатюры всех размеров для фото уже загруженных рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                            help='Процессов Pillow, 0 - создавать в текущем процессе')
+
+    def handle(self, *args, **options):
+        names = list(Recipe.objects.exclude(image='').order_by('id').values_list('image', flat=True).distinct())
+        if options['workers']:
+            # spawn: процессы не наследуют соединение с базой
+            with ProcessPoolExecutor(options['workers'], multiprocessing.get_context('spawn'),
+                                     initializer=setup_worker) as executor:
+                results = list(executor.map(try_generate, names, chunksize=8))
+        else:
+            results = [try_generate(name) for name in names]
+        failed = [name for name, count in zip(names, results) if count is None]
+        for name in failed:
+            self.stderr.write(f'Не удалось создать миниатюры {name}')
+        self.stdout.write(f'Фото: {len(names)}, с ошибками: {len(failed)}')
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from app.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Заново строит полнотекстовый индекс рецептов'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Проиндексировано рецептов: {rebuild_index()}')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.shop_totals import rebuild_totals
+
+
+class Command(BaseCommand):
+    help = 'Заново собирает сводные списки покупок из списков покупок'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_totals()
+        self.stdout.write(f'Строк в сводных списках: {count}')
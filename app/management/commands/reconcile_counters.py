@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from app.counters import COUNTERS, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики рецептов, подписчиков, избранного и покупок'
+
+    def handle(self, *args, **options):
+        for model, field, related, fk in COUNTERS:
+            fixed = reconcile(model, field, related, fk)
+            self.stdout.write(f'{model._meta.label}.{field}: исправлено {fixed}')
@@ -0,0 +1,67 @@
+from django.db import migrations, models
+
+TAG_BITS = {
+    'BREAKFAST': 1,
+    'LUNCH': 2,
+    'DINNER': 4,
+}
+BATCH_SIZE = 1000
+
+
+def split_tags(value):
+    if isinstance(value, str):
+        return [tag for tag in value.split(',') if tag]
+    return list(value or [])
+
+
+def tags_to_mask(apps, schema_editor):
+    Recipe = apps.get_model('app', 'Recipe')
+    batch = []
+    for recipe in Recipe.objects.only('id', 'tag').iterator(chunk_size=BATCH_SIZE):
+        recipe.tags = sum(TAG_BITS.get(tag, 0) for tag in set(split_tags(recipe.tag)))
+        batch.append(recipe)
+        if len(batch) >= BATCH_SIZE:
+            Recipe.objects.bulk_update(batch, ['tags'])
+            batch = []
+    Recipe.objects.bulk_update(batch, ['tags'])
+
+
+def mask_to_tags(apps, schema_editor):
+    Recipe = apps.get_model('app', 'Recipe')
+    batch = []
+    for recipe in Recipe.objects.only('id', 'tags').iterator(chunk_size=BATCH_SIZE):
+        recipe.tag = ','.join(tag for tag, bit in TAG_BITS.items() if recipe.tags & bit)
+        batch.append(recipe)
+        if len(batch) >= BATCH_SIZE:
+            Recipe.objects.bulk_update(batch, ['tag'])
+            batch = []
+    Recipe.objects.bulk_update(batch, ['tag'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_recipe_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Теги'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='tag',
+            field=models.CharField(max_length=22, blank=True, default=''),
+        ),
+        migrations.RunPython(tags_to_mask, mask_to_tags),
+        migrations.RemoveField(
+            model_name='recipe',
+            name='tag',
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['tags', 'pub_date', 'id'], name='recipe_tags_pub_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def copy_pub_date(apps, schema_editor):
+    Recipe = apps.get_model('app', 'Recipe')
+    Recipe.objects.update(mod_date=F('pub_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_recipe_tags_bitmask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='mod_date',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Дата изменения'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_pub_date, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Recipe = apps.get_model('app', 'Recipe')
+    Subscription = apps.get_model('app', 'Subscription')
+    Favorite = apps.get_model('app', 'Favorite')
+    ShopList = apps.get_model('app', 'ShopList')
+
+    def count(related, fk):
+        return Coalesce(Subquery(related.objects.filter(
+            **{fk: OuterRef('pk')}
+        ).order_by().values(fk).annotate(total=Count('pk')).values('total')), 0)
+
+    User.objects.update(
+        recipe_count=count(Recipe, 'author'),
+        follower_count=count(Subscription, 'author'),
+        purchase_count=count(ShopList, 'user'),
+    )
+    Recipe.objects.update(favorite_count=count(Favorite, 'recipe'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_recipe_mod_date'),
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
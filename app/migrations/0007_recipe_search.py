@@ -0,0 +1,70 @@
+from django.db import migrations
+
+# Схема и нормализация текста зафиксированы здесь, а не импортируются из app.search,
+# чтобы последующие изменения поиска не меняли уже примененную миграцию
+SEARCH_TABLE = 'app_recipe_search'
+
+CREATE_SQL = {
+    'sqlite': (
+        f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+        f"title, ingredients, text, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    ),
+    'postgresql': (
+        f'CREATE TABLE {SEARCH_TABLE} ('
+        f'recipe_id bigint PRIMARY KEY REFERENCES app_recipe (id) ON DELETE CASCADE, '
+        f'document tsvector NOT NULL)',
+        f'CREATE INDEX {SEARCH_TABLE}_document_idx ON {SEARCH_TABLE} USING GIN (document)',
+    ),
+}
+
+INSERT_SQL = {
+    'sqlite': f'INSERT INTO {SEARCH_TABLE} (rowid, title, ingredients, text) VALUES (%s, %s, %s, %s)',
+    'postgresql': (
+        f"INSERT INTO {SEARCH_TABLE} (recipe_id, document) VALUES (%s, "
+        f"setweight(to_tsvector('russian', %s), 'A') || "
+        f"setweight(to_tsvector('russian', %s), 'B') || "
+        f"setweight(to_tsvector('russian', %s), 'C'))"
+    ),
+}
+
+DROP_SQL = f'DROP TABLE IF EXISTS {SEARCH_TABLE}'
+
+
+def normalize(text):
+    return text.lower().replace('ё', 'е')
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in CREATE_SQL:
+        return
+    Recipe = apps.get_model('app', 'Recipe')
+    Ingredient = apps.get_model('app', 'Ingredient')
+    with schema_editor.connection.cursor() as cursor:
+        for sql in CREATE_SQL[vendor]:
+            cursor.execute(sql)
+        for recipe in Recipe.objects.order_by().iterator():
+            ingredients = Ingredient.objects.filter(
+                recipeingredient__ingredients=recipe
+            ).values_list('title', flat=True)
+            cursor.execute(INSERT_SQL[vendor], [
+                recipe.id, normalize(recipe.title), normalize(' '.join(ingredients)), normalize(recipe.text)
+            ])
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor not in CREATE_SQL:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
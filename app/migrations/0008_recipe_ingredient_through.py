@@ -0,0 +1,88 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def copy_amounts(apps, schema_editor):
+    """
+    Общие строки (ингредиент, количество) превращаются в строки рецепта.
+    Один ингредиент, указанный в рецепте дважды, складывается
+    """
+    Recipe = apps.get_model('app', 'Recipe')
+    RecipeIngredient = apps.get_model('app', 'RecipeIngredientAmount')
+    field = Recipe._meta.get_field('ingredient')
+    shared = field.m2m_reverse_field_name()
+    rows = field.remote_field.through.objects.order_by('id').values_list(
+        'recipe_id', f'{shared}__ingredient_id', f'{shared}__ing_count'
+    )
+    amounts = {}
+    for recipe_id, ingredient_id, count in rows.iterator():
+        key = (recipe_id, ingredient_id)
+        amounts[key] = amounts.get(key, 0) + max(count, 0)
+    RecipeIngredient.objects.bulk_create(
+        (RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id, ing_count=count)
+         for (recipe_id, ingredient_id), count in amounts.items()),
+        batch_size=BATCH_SIZE
+    )
+
+
+def restore_shared(apps, schema_editor):
+    Recipe = apps.get_model('app', 'Recipe')
+    RecipeIngredient = apps.get_model('app', 'RecipeIngredientAmount')
+    SharedRecipeIngredient = apps.get_model('app', 'RecipeIngredient')
+    field = Recipe._meta.get_field('ingredient')
+    through = field.remote_field.through
+    shared_ids = {}
+    links = []
+    for recipe_id, ingredient_id, count in RecipeIngredient.objects.order_by('id').values_list(
+            'recipe_id', 'ingredient_id', 'ing_count').iterator():
+        key = (ingredient_id, count)
+        if key not in shared_ids:
+            shared_ids[key] = SharedRecipeIngredient.objects.create(ingredient_id=ingredient_id, ing_count=count).id
+        links.append(through(**{'recipe_id': recipe_id, f'{field.m2m_reverse_field_name()}_id': shared_ids[key]}))
+    through.objects.bulk_create(links, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_recipe_search'),
+    ]
+
+    # Новая модель создается под временным именем: в SQLite RenameModel не переименовывает
+    # индексы, и индексы старой таблицы совпали бы по имени с индексами новой
+    operations = [
+        migrations.CreateModel(
+            name='RecipeIngredientAmount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ing_count', models.PositiveIntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.ingredient', verbose_name='Ингредиент')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_ingredients', to='app.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент для рецепта',
+                'verbose_name_plural': 'Ингредиенты для рецептов',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recipeingredientamount',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        ),
+        migrations.RunPython(copy_amounts, restore_shared),
+        migrations.RemoveField(
+            model_name='recipe',
+            name='ingredient',
+        ),
+        migrations.DeleteModel(
+            name='RecipeIngredient',
+        ),
+        migrations.RenameModel('RecipeIngredientAmount', 'RecipeIngredient'),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient',
+            field=models.ManyToManyField(related_name='recipes', through='app.RecipeIngredient', to='app.Ingredient', verbose_name='Ингредиенты'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# модель, поля уникальной пары
+UNIQUE_FIELDS = (
+    ('Subscription', ('user', 'author')),
+    ('Favorite', ('user', 'recipe')),
+    ('ShopList', ('user', 'recipe')),
+    ('ShopList', ('session_key', 'recipe')),
+)
+
+
+def remove_duplicates(apps, schema_editor):
+    """Удаляет повторы, оставляя самую раннюю запись, и пересчитывает счетчики, если что-то удалено"""
+    deleted = 0
+    for model_name, fields in UNIQUE_FIELDS:
+        model = apps.get_model('app', model_name)
+        rows = model.objects.exclude(**{f'{fields[0]}__isnull': True}).order_by().values(*fields)
+        keep = rows.annotate(first=Min('pk'), total=Count('pk')).filter(total__gt=1)
+        for row in keep:
+            deleted += model.objects.filter(
+                **{field: row[field] for field in fields}
+            ).exclude(pk=row['first']).delete()[0]
+    if not deleted:
+        return
+
+    User = apps.get_model('users', 'User')
+    Recipe = apps.get_model('app', 'Recipe')
+
+    def count(related, fk):
+        return Coalesce(Subquery(apps.get_model('app', related).objects.filter(
+            **{fk: OuterRef('pk')}
+        ).order_by().values(fk).annotate(total=Count('pk')).values('total')), 0)
+
+    User.objects.update(
+        follower_count=count('Subscription', 'author'),
+        purchase_count=count('ShopList', 'user'),
+    )
+    Recipe.objects.update(favorite_count=count('Favorite', 'recipe'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_recipe_ingredient_through'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoplist',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_user_purchase'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoplist',
+            constraint=models.UniqueConstraint(fields=('session_key', 'recipe'), name='unique_session_purchase'),
+        ),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_subscription'),
+        ),
+    ]
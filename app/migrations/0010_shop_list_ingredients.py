@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_totals(apps, schema_editor):
+    """Собирает сводные списки из уже сохраненных списков покупок, отдельно по пользователю и по сессии"""
+    quote = schema_editor.quote_name
+    totals, ingredients, shop_list = (
+        quote(apps.get_model('app', name)._meta.db_table)
+        for name in ('ShopListIngredient', 'RecipeIngredient', 'ShopList')
+    )
+    for column in map(quote, ('user_id', 'session_key')):
+        schema_editor.execute(
+            f'INSERT INTO {totals} ({column}, ingredient_id, total, recipes) '
+            f'SELECT s.{column}, ri.ingredient_id, SUM(ri.ing_count), COUNT(*) '
+            f'FROM {shop_list} s JOIN {ingredients} ri ON ri.recipe_id = s.recipe_id '
+            f'WHERE s.{column} IS NOT NULL GROUP BY s.{column}, ri.ingredient_id'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app', '0009_unique_toggles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopListIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(blank=True, max_length=1024, null=True, verbose_name='Ключ сессии')),
+                ('total', models.IntegerField(default=0, verbose_name='Количество')),
+                ('recipes', models.IntegerField(default=0, verbose_name='Число рецептов')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='shop_ingredients', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент списка покупок',
+                'verbose_name_plural': 'Сводный список покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoplistingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_user_shop_ingredient'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoplistingredient',
+            constraint=models.UniqueConstraint(fields=('session_key', 'ingredient'), name='unique_session_shop_ingredient'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
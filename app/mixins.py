@@ -2,12 +2,16 @@ import json
 import uuid
 
 from django.contrib import messages
-from django.http import JsonResponse
+from django.db import transaction
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse
 from django.views.generic.base import TemplateResponseMixin
 from django.views.generic.edit import ModelFormMixin
 
-from .models import Recipe, ShopList
-from .services import add_ingredient, add_tag
+from . import page_cache, toggles
+from .counters import save_without_counters
+from .ingredient_catalog import get_catalog_url
+from .paginator import CursorPaginator, InvalidCursor
+from .services import add_ingredient, add_tag, save_recipe_ingredients
 
 
 class DataMixin(TemplateResponseMixin, ModelFormMixin):
@@ -15,22 +19,54 @@ class DataMixin(TemplateResponseMixin, ModelFormMixin):
     Миксин для создания ингредиентов, тегов и добавления в рецепт
     """
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['ingredient_catalog_url'] = get_catalog_url()
+        return context
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        if self.request.method in ('POST', 'PUT'):
+            kwargs['upload_errors'] = getattr(self.request, 'upload_errors', {})
+        return kwargs
+
     def user_form_valid(self, request, get_context_data, form):
         tags = add_tag(request)
         if not tags:
             messages.error(request, 'Нужно выбрать хотя бы один тег')
             return self.render_to_response(get_context_data(form=form))
-        ingredients = add_ingredient(request)
+        ingredients, errors = add_ingredient(request)
         if not ingredients:
-            messages.error(request, 'Вы забыли выбрать ингредиенты')
+            errors.append('Вы забыли выбрать ингредиенты')
+        if errors:
+            for error in errors:
+                messages.error(request, error)
             return self.render_to_response(get_context_data(form=form))
         recipe = form.save(commit=False)
         recipe.author = request.user
         recipe.tag = tags
-        recipe.save()
-        recipe.ingredient.clear()
-        recipe.ingredient.add(*ingredients)
-        return super().form_valid(form)
+        created = recipe._state.adding
+        # рецепт без ингредиентов или с частью старых не должен быть виден другим запросам
+        with transaction.atomic():
+            save_without_counters(recipe)
+            save_recipe_ingredients(recipe, ingredients, created)
+        self.object = recipe
+        return HttpResponseRedirect(self.get_success_url())
+
+
+def get_posted_id(request):
+    """id из тела json запроса, None - если его нет или это не число"""
+    try:
+        return int(json.loads(request.body).get('id'))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def toggle_response(result):
+    """Ответ кнопки: True - состояние изменилось, False - уже было таким, None - нет такого id"""
+    if result is None:
+        raise Http404('Запись не найдена')
+    return JsonResponse({"success": result}, safe=False)
 
 
 class AddMixin:
@@ -40,29 +76,17 @@ class AddMixin:
 
     @staticmethod
     def user_post(request, obj):
-        data = {"success": False}
-        recipe_id = json.loads(request.body).get('id')
-        recipe = Recipe.objects.get(id=recipe_id)
+        recipe_id = get_posted_id(request)
+        if recipe_id is None:
+            raise Http404('Запись не найдена')
         if request.user.is_authenticated:
-            user = request.user
-            exists = obj.objects.filter(user=user, recipe=recipe).exists()
-            if not exists:
-                _, success = obj.objects.get_or_create(user=user, recipe=recipe)
-                data = {"success": success}
+            owner = {'user_id': request.user.id}
         else:
-            if not request.session.get('purchase_id'):
+            session_key = request.session.get('purchase_id')
+            if not session_key:
                 session_key = request.session['purchase_id'] = str(uuid.uuid4())
-                exists = obj.objects.filter(session_key=session_key, recipe=recipe).exists()
-                if not exists:
-                    _, success = obj.objects.get_or_create(session_key=session_key, recipe=recipe)
-                    data = {"success": success}
-            else:
-                session_key = request.session.get('purchase_id')
-                exists = obj.objects.filter(session_key=session_key, recipe=recipe).exists()
-                if not exists:
-                    _, success = obj.objects.get_or_create(session_key=session_key, recipe=recipe)
-                    data = {"success": success}
-        return JsonResponse(data, safe=False)
+            owner = {'session_key': session_key}
+        return toggle_response(toggles.add(obj, owner, 'recipe', recipe_id))
 
 
 class RemoveMixin:
@@ -72,35 +96,66 @@ class RemoveMixin:
 
     @staticmethod
     def user_delete(request, id, obj):
-        data = {"success": False}
-        recipe = Recipe.objects.get(id=id)
         if request.user.is_authenticated:
-            user = request.user
-            model = obj.objects.filter(user=user, recipe=recipe)
-            if model.exists():
-                success = model.delete()
-                data = {"success": True if success else False}
+            owner = {'user_id': request.user.id}
         else:
-            session_key = request.session.get('purchase_id')
-            model = obj.objects.filter(session_key=session_key, recipe=recipe)
-            if model.exists():
-                success = model.delete()
-                data = {"success": True if success else False}
-        return JsonResponse(data, safe=False)
+            owner = {'session_key': request.session.get('purchase_id')}
+        return toggle_response(toggles.remove(obj, owner, 'recipe', id))
 
 
-class GetContextDataMixin:
+class CursorPaginationMixin:
+    """
+    Миксин курсорной пагинации для списков рецептов.
+    Старые ссылки вида ?page=N обслуживаются обычным пагинатором,
+    но только для первых max_offset_page страниц
+    """
+    cursor_kwarg = 'cursor'
+    max_offset_page = 5
 
-    @staticmethod
-    def get_user_context_data(request, context):
-        if request.user.is_authenticated:
-            context['subscribers'] = request.user.subscriber.values_list('author', flat=True)
-            context['favorites'] = request.user.follower.values_list('recipe', flat=True)
-            context['purchases'] = request.user.users.values_list('recipe', flat=True)
-        else:
-            session_key = request.session.get('purchase_id')
-            if session_key:
-                context['purchases'] = ShopList.objects.filter(
-                    session_key=session_key
-                ).select_related('recipe').values_list('recipe', flat=True)
-        return context
+    def get_index_filter(self):
+        """Фильтр для индекса рецептов в памяти, None - выбирать из базы"""
+        return None
+
+    def paginate_queryset(self, queryset, page_size):
+        page = self.request.GET.get(self.page_kwarg)
+        if page is not None:
+            if page.isdigit() and int(page) > self.max_offset_page:
+                raise Http404('Используйте курсорную пагинацию')
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = CursorPaginator(queryset, page_size, self.get_index_filter())
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
+class AnonymousPageCacheMixin:
+    """
+    Миксин кэширует страницу целиком для анонимных посетителей без списка покупок.
+    Страница зависит от областей из get_page_cache_scopes, которые сбрасываются
+    сигналами при изменении рецептов и пользователей
+    """
+
+    def get_page_cache_scopes(self):
+        return ['index']
+
+    def dispatch(self, request, *args, **kwargs):
+        if not page_cache.is_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = page_cache.get_page_key(request, self.get_page_cache_scopes())
+        content = page_cache.get_page(request, key)
+        if content is not None:
+            return HttpResponse(content)
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            def store(response):
+                page_cache.set_page(key, response.content.decode(response.charset))
+            if hasattr(response, 'add_post_render_callback'):
+                response.add_post_render_callback(store)
+            else:
+                store(response)
+        return response
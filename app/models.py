@@ -2,7 +2,6 @@ from django.contrib.auth import get_user_model
 from django.db import models
 from django.urls import reverse
 from pytils.translit import slugify
-from multiselectfield import MultiSelectField
 
 User = get_user_model()
 
@@ -21,20 +20,6 @@ class Ingredient(models.Model):
         ordering = ('-title',)
 
 
-class RecipeIngredient(models.Model):
-    """Модель соединяет ингредиент и его количество"""
-    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, verbose_name='Ингредиент')
-    ing_count = models.IntegerField(verbose_name='Количество')
-
-    def __str__(self):
-        return f"{self.ingredient.title} - {self.ing_count} {self.ingredient.dimension}"
-
-    class Meta:
-        verbose_name = 'Ингредиент для рецепта'
-        verbose_name_plural = 'Ингредиенты для рецептов'
-        ordering = ('-ingredient',)
-
-
 class Recipe(models.Model):
     """Модель рецептов"""
     TAGS = (
@@ -42,11 +27,16 @@ class Recipe(models.Model):
         ('LUNCH', 'Обед'),
         ('DINNER', 'Ужин')
     )
+    TAG_BITS = {
+        'BREAKFAST': 1,
+        'LUNCH': 2,
+        'DINNER': 4,
+    }
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="recipes", verbose_name='Автор')
     title = models.CharField(verbose_name='Название рецепта', max_length=50)
-    ingredient = models.ManyToManyField(RecipeIngredient, verbose_name='Ингредиенты',
-                                        related_name="ingredients")
-    tag = MultiSelectField(choices=TAGS)
+    ingredient = models.ManyToManyField(Ingredient, through='RecipeIngredient', verbose_name='Ингредиенты',
+                                        related_name="recipes")
+    tags = models.PositiveSmallIntegerField(default=0, verbose_name='Теги')
     text = models.TextField(verbose_name='Описание', help_text='Введите текст описания')
     image = models.ImageField(upload_to='recipes/',
                               verbose_name='Загрузить фото',
@@ -54,7 +44,9 @@ class Recipe(models.Model):
                               )
     time = models.PositiveIntegerField(verbose_name='Время приготовления')
     pub_date = models.DateTimeField("Дата публикации", auto_now_add=True)
+    mod_date = models.DateTimeField("Дата изменения", auto_now=True)
     slug = models.SlugField(max_length=255, unique=True, db_index=True, verbose_name="slug")
+    favorite_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном')
 
     def __str__(self):
         return self.title
@@ -62,6 +54,35 @@ class Recipe(models.Model):
     def get_absolute_url(self):
         return reverse('recipe', kwargs={'recipe_slug': self.slug})
 
+    @property
+    def tag(self):
+        """Список тегов рецепта, хранящихся в виде битовой маски"""
+        return [tag for tag, _ in self.TAGS if self.tags & self.TAG_BITS[tag]]
+
+    @tag.setter
+    def tag(self, values):
+        self.tags = self.tags_to_mask(values)
+
+    @classmethod
+    def tags_to_mask(cls, values):
+        """Переводит список тегов в битовую маску, неизвестные теги пропускаются"""
+        mask = 0
+        for value in values:
+            mask |= cls.TAG_BITS.get(value, 0)
+        return mask
+
+    @classmethod
+    def masks_matching(cls, mask, match_all=False):
+        """
+        Перечисляет все значения колонки tags, подходящие под маску:
+        хотя бы один тег из маски или, при match_all, все теги маски.
+        Тегов мало, поэтому фильтр превращается в индексируемый tags IN (...)
+        """
+        masks = range(1, 1 << len(cls.TAGS))
+        if match_all:
+            return [value for value in masks if value & mask == mask]
+        return [value for value in masks if value & mask]
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(f"{self.author.get_full_name()}-{self.title}")
@@ -71,6 +92,30 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(fields=('pub_date', 'id'), name='recipe_pub_date_id_idx'),
+            models.Index(fields=('author', 'pub_date', 'id'), name='recipe_author_pub_date_id_idx'),
+            models.Index(fields=('tags', 'pub_date', 'id'), name='recipe_tags_pub_date_id_idx'),
+        )
+
+
+class RecipeIngredient(models.Model):
+    """Модель связывает рецепт с ингредиентом и хранит его количество в этом рецепте"""
+    recipe = models.ForeignKey('Recipe', on_delete=models.CASCADE, related_name='recipe_ingredients',
+                               verbose_name='Рецепт')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, verbose_name='Ингредиент')
+    ing_count = models.PositiveIntegerField(verbose_name='Количество')
+
+    def __str__(self):
+        return f"{self.ingredient.title} - {self.ing_count} {self.ingredient.dimension}"
+
+    class Meta:
+        verbose_name = 'Ингредиент для рецепта'
+        verbose_name_plural = 'Ингредиенты для рецептов'
+        ordering = ('id',)
+        constraints = (
+            models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        )
 
 
 class Subscription(models.Model):
@@ -81,6 +126,9 @@ class Subscription(models.Model):
     class Meta:
         verbose_name = 'Подписчик'
         verbose_name_plural = 'Подписчики'
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'author'), name='unique_subscription'),
+        )
 
 
 class Favorite(models.Model):
@@ -92,6 +140,9 @@ class Favorite(models.Model):
     class Meta:
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные'
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite'),
+        )
 
 
 class ShopList(models.Model):
@@ -104,3 +155,33 @@ class ShopList(models.Model):
     class Meta:
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Список покупок'
+        # NULL не совпадает с NULL, поэтому покупки сессии не мешают покупкам пользователя
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'recipe'), name='unique_user_purchase'),
+            models.UniqueConstraint(fields=('session_key', 'recipe'), name='unique_session_purchase'),
+        )
+
+
+class ShopListIngredient(models.Model):
+    """
+    Сводный список покупок: сколько ингредиента нужно для всех рецептов
+    в списке покупок пользователя или анонимной сессии.
+    Поддерживается модулем shop_totals при изменении списка покупок и рецептов
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name="shop_ingredients", verbose_name='Пользователь')
+    session_key = models.CharField(max_length=1024, verbose_name='Ключ сессии', null=True, blank=True)
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, verbose_name='Ингредиент')
+    total = models.IntegerField(default=0, verbose_name='Количество')
+    recipes = models.IntegerField(default=0, verbose_name='Число рецептов')
+
+    def __str__(self):
+        return f"{self.ingredient.title} - {self.total} {self.ingredient.dimension}"
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Сводный список покупок'
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_user_shop_ingredient'),
+            models.UniqueConstraint(fields=('session_key', 'ingredient'), name='unique_session_shop_ingredient'),
+        )
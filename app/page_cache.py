@@ -0,0 +1,68 @@
+import hashlib
+import re
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.middleware.csrf import get_token
+
+CACHED_PARAMS = {'tag', 'tag_mode', 'page', 'cursor'}
+CSRF_PLACEHOLDER = '__csrf_token__'
+CSRF_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")([^"]*)(")')
+
+
+def get_cache():
+    return caches[settings.PAGE_CACHE_ALIAS]
+
+
+def get_version_key(scope):
+    return f'page_version:{scope}'
+
+
+def is_cacheable(request):
+    """
+    Страницу можно отдать из кэша только анонимному посетителю без списка покупок.
+    Посетителю без куки сессии сессию не загружаем вовсе
+    """
+    if not settings.PAGE_CACHE_ENABLED or request.method not in ('GET', 'HEAD'):
+        return False
+    if not set(request.GET).issubset(CACHED_PARAMS):
+        return False
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return True
+    return not request.user.is_authenticated and not request.session.get('purchase_id')
+
+
+def get_page_key(request, scopes):
+    """
+    Ключ страницы: путь, нормализованные параметры и текущие версии областей,
+    от которых зависит страница. Смена версии делает старые ключи недостижимыми
+    """
+    version_keys = [get_version_key(scope) for scope in scopes]
+    versions = get_cache().get_many(version_keys)
+    missing = {key: uuid.uuid4().hex for key in version_keys if key not in versions}
+    if missing:
+        get_cache().set_many(missing, None)
+        versions.update(missing)
+    params = [
+        (key, value) for key in sorted(CACHED_PARAMS) for value in sorted(set(request.GET.getlist(key)))
+    ]
+    raw = repr((request.path, params, [versions[key] for key in version_keys]))
+    return 'page:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def get_page(request, key):
+    """Возвращает html страницы из кэша с csrf токеном текущего посетителя"""
+    content = get_cache().get(key)
+    if content is None:
+        return None
+    return content.replace(CSRF_PLACEHOLDER, get_token(request))
+
+
+def set_page(key, content):
+    get_cache().set(key, CSRF_RE.sub(rf'\g<1>{CSRF_PLACEHOLDER}\g<3>', content))
+
+
+def invalidate(*scopes):
+    """Сбрасывает закэшированные страницы, зависящие от указанных областей"""
+    get_cache().set_many({get_version_key(scope): uuid.uuid4().hex for scope in scopes}, None)
@@ -0,0 +1,147 @@
+import base64
+import json
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .recipe_index import recipe_index
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorPage:
+    """
+    Страница курсорной пагинации. В отличие от Page не знает общего
+    количества объектов и номера страницы, только соседние курсоры
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Курсорная (keyset) пагинация по паре (pub_date, id) от новых к старым.
+    Вместо OFFSET и COUNT(*) страница выбирается условием
+    "строго раньше/позже граничной записи", которое работает по индексу.
+    Если передан index_filter, id страницы берутся из индекса в памяти,
+    а из базы выбираются только строки самой страницы
+    """
+    ordering = ('-pub_date', '-id')
+
+    def __init__(self, object_list, per_page, index_filter=None):
+        self.object_list = object_list.order_by(*self.ordering)
+        self.per_page = int(per_page)
+        self.index_filter = index_filter
+
+    @staticmethod
+    def encode_cursor(direction, obj):
+        """Упаковывает направление и ключ записи в непрозрачный токен"""
+        data = json.dumps([direction, obj.pub_date.isoformat(), obj.id])
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Распаковывает токен, при любой ошибке выбрасывает InvalidCursor"""
+        try:
+            data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, pub_date, pk = json.loads(data)
+            pub_date = parse_datetime(pub_date)
+        except (TypeError, ValueError):
+            raise InvalidCursor('Неверный курсор')
+        if direction not in ('n', 'p') or pub_date is None or not isinstance(pk, int):
+            raise InvalidCursor('Неверный курсор')
+        return direction, pub_date, pk
+
+    @staticmethod
+    def older_than(pub_date, pk):
+        return Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+
+    @staticmethod
+    def newer_than(pub_date, pk):
+        return Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, id__gt=pk)
+
+    def index_page(self, cursor=None):
+        """
+        Страница по индексу в памяти. Если индекс разошелся с базой,
+        он сбрасывается и возвращается None
+        """
+        direction = pub_date = pk = None
+        if cursor:
+            direction, pub_date, pk = self.decode_cursor(cursor)
+        ids, has_next, has_previous = recipe_index.page(
+            self.index_filter, self.per_page, direction, pub_date, pk
+        )
+        object_list = self.object_list.filter(pk__in=ids)
+        rows = list(object_list)
+        if len(rows) != len(ids):
+            recipe_index.invalidate()
+            return None
+        next_cursor = self.encode_cursor('n', rows[-1]) if has_next else None
+        previous_cursor = self.encode_cursor('p', rows[0]) if has_previous else None
+        return CursorPage(object_list, next_cursor, previous_cursor)
+
+    def page(self, cursor=None):
+        """
+        Возвращает страницу после курсора ('n') или перед ним ('p').
+        Для предыдущей страницы сначала по индексу ищется её первая запись,
+        чтобы сама страница всегда выбиралась одним и тем же прямым запросом
+        """
+        if self.index_filter is not None:
+            page = self.index_page(cursor)
+            if page is not None:
+                return page
+
+        queryset = self.object_list
+        if cursor:
+            direction, pub_date, pk = self.decode_cursor(cursor)
+            if direction == 'n':
+                queryset = queryset.filter(self.older_than(pub_date, pk))
+            else:
+                keys = list(
+                    self.object_list.filter(
+                        self.newer_than(pub_date, pk)
+                    ).order_by('pub_date', 'id').values_list('pub_date', 'id')[:self.per_page]
+                )
+                if keys:
+                    start_date, start_pk = keys[-1]
+                    queryset = queryset.filter(
+                        Q(pub_date=start_date, id=start_pk) | self.older_than(start_date, start_pk)
+                    )
+        object_list = queryset[:self.per_page]
+        rows = list(object_list)
+        if not rows:
+            return CursorPage(object_list, None, None)
+
+        first, last = rows[0], rows[-1]
+        next_cursor = previous_cursor = None
+        if len(rows) == self.per_page and self.object_list.filter(
+                self.older_than(last.pub_date, last.id)).exists():
+            next_cursor = self.encode_cursor('n', last)
+        if cursor and self.object_list.filter(self.newer_than(first.pub_date, first.id)).exists():
+            previous_cursor = self.encode_cursor('p', first)
+        return CursorPage(object_list, next_cursor, previous_cursor)
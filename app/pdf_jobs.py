@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+
+from django.conf import settings
+
+from .pdf_pool import render_pdf
+
+TEMPLATE = 'pdf/pdf.html'
+# меняется вместе с шаблоном, чтобы не отдавать PDF, собранные по старому
+VERSION = 1
+
+READY = 'ready'
+PENDING = 'pending'
+ERROR = 'error'
+BUSY = 'busy'
+
+_lock = threading.Lock()
+_executor = None
+_futures = {}
+_pruned_at = None
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.PDF_JOB_WORKERS, thread_name_prefix='pdf')
+    return _executor
+
+
+def get_rows(totals):
+    """Строки сводного списка покупок простыми словарями: они уходят в процесс рендеринга, а он не ходит в базу"""
+    return [
+        {'title': item.ingredient.title, 'total': item.total, 'dimension': item.ingredient.dimension}
+        for item in totals
+    ]
+
+
+def get_key(rows):
+    """Хеш содержимого списка: одинаковые списки разных пользователей дают один файл"""
+    content = json.dumps([VERSION, rows], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def get_path(key, suffix='.pdf'):
+    return os.path.join(settings.PDF_CACHE_ROOT, key + suffix)
+
+
+def _age(path):
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def get_status(key):
+    """
+    Состояние PDF по файлам, чтобы его видели все процессы:
+    готов, рендерится, не получился или None, если его никто не собирал.
+    Зависший рендеринг и старая ошибка через PDF_JOB_TIMEOUT считаются отсутствующими
+    """
+    if os.path.exists(get_path(key)):
+        return READY
+    error_age = _age(get_path(key, '.err'))
+    if error_age is not None and error_age < settings.PDF_JOB_TIMEOUT:
+        return ERROR
+    lock_age = _age(get_path(key, '.lock'))
+    if lock_age is not None and lock_age < settings.PDF_JOB_TIMEOUT:
+        return PENDING
+    return None
+
+
+def _write(path, content):
+    """Пишет файл атомарно, чтобы другой процесс не отдал его недописанным"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as file:
+        file.write(content)
+    os.replace(tmp, path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _prune(root):
+    """
+    Удаляет PDF, которые не запрашивались дольше PDF_CACHE_TTL, а также метки ошибок
+    и блокировки старше PDF_JOB_TIMEOUT: get_status их уже не учитывает
+    """
+    max_ages = {'.pdf': settings.PDF_CACHE_TTL, '.err': settings.PDF_JOB_TIMEOUT, '.lock': settings.PDF_JOB_TIMEOUT}
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        age = _age(path)
+        max_age = max_ages.get(os.path.splitext(name)[1])
+        if max_age is not None and age is not None and age > max_age:
+            _remove(path)
+
+
+def _schedule_prune(executor):
+    """Чистка кэша идет в фоновом потоке и не чаще раза в PDF_PRUNE_INTERVAL секунд"""
+    global _pruned_at
+    now = time.monotonic()
+    with _lock:
+        if _pruned_at is not None and now - _pruned_at < settings.PDF_PRUNE_INTERVAL:
+            return
+        _pruned_at = now
+    executor.submit(_prune, settings.PDF_CACHE_ROOT)
+
+
+def _acquire(key):
+    """
+    Создает файл блокировки со своим токеном и возвращает токен.
+    None - PDF уже собирает другой запрос или процесс. Блокировка старше
+    PDF_JOB_TIMEOUT осталась от упавшего или зависшего рендеринга и снимается
+    """
+    path = get_path(key, '.lock')
+    age = _age(path)
+    if age is not None and age >= settings.PDF_JOB_TIMEOUT:
+        _remove(path)
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None
+    token = uuid.uuid4().hex.encode()
+    with os.fdopen(fd, 'wb') as file:
+        file.write(token)
+    return token
+
+
+def _release(key, token):
+    """Удаляет блокировку, только если ее не перехватил другой процесс после таймаута"""
+    path = get_path(key, '.lock')
+    try:
+        with open(path, 'rb') as file:
+            if file.read() != token:
+                return
+    except OSError:
+        return
+    _remove(path)
+
+
+def _render(key, rows, token):
+    try:
+        content = render_pdf(TEMPLATE, {'totals': rows})
+        if content is None:
+            _write(get_path(key, '.err'), b'')
+        else:
+            _write(get_path(key), content)
+    except Exception:
+        _write(get_path(key, '.err'), b'')
+        raise
+    finally:
+        _release(key, token)
+        with _lock:
+            _futures.pop(key, None)
+
+
+def start(key, rows):
+    """
+    Ставит рендеринг списка в очередь, если PDF еще нет и его не собирает другой запрос
+    или процесс. Фоновый поток только ждет процесс рендеринга, не дольше PDF_RENDER_TIMEOUT.
+    Возвращает состояние PDF или BUSY, если очередь заполнена
+    """
+    status = get_status(key)
+    if status == READY:
+        # файл используется, _prune его не удалит
+        os.utime(get_path(key))
+        return status
+    if status is not None:
+        return status
+
+    with _lock:
+        if len(_futures) >= settings.PDF_QUEUE_SIZE:
+            return BUSY
+
+    os.makedirs(settings.PDF_CACHE_ROOT, exist_ok=True)
+    token = _acquire(key)
+    if token is None:
+        return PENDING
+    # старая ошибка уже не действует, раз get_status ее не вернул
+    _remove(get_path(key, '.err'))
+    executor = get_executor()
+    with _lock:
+        _futures[key] = executor.submit(_render, key, rows, token)
+    _schedule_prune(executor)
+    return PENDING
+
+
+def wait(key, timeout):
+    """Ждет рендеринга в этом процессе не дольше timeout секунд и возвращает состояние PDF"""
+    with _lock:
+        future = _futures.get(key)
+    if future is not None and timeout > 0:
+        wait_futures([future], timeout)
+    return get_status(key)
@@ -0,0 +1,169 @@
+import multiprocessing
+import queue
+import threading
+
+from django.conf import settings
+
+READY = b'ready'
+
+_lock = threading.Lock()
+_pool = None
+
+
+class Renderer:
+    """
+    Состояние прогретого процесса рендеринга: шаблоны компилируются один раз на процесс,
+    модули xhtml2pdf и reportlab загружаются при прогреве, а не на первом PDF
+    """
+
+    def __init__(self):
+        import django
+        django.setup()
+
+        # модуль загружается в процессе рендеринга до django.setup(), services импортирует модели
+        from django.template.loader import get_template
+        from .services import html_to_pdf
+
+        self.get_template = get_template
+        self.html_to_pdf = html_to_pdf
+        self.templates = {}
+
+    def render(self, template_src, context_dict):
+        template = self.templates.get(template_src)
+        if template is None:
+            template = self.templates[template_src] = self.get_template(template_src)
+        return self.html_to_pdf(template.render(context_dict))
+
+
+def _serve(conn):
+    """Цикл процесса рендеринга: получает (шаблон, контекст), отвечает содержимым PDF или None"""
+    renderer = Renderer()
+    from .pdf_jobs import TEMPLATE
+
+    # первый PDF собирается заранее, чтобы шаблон и CSS были разобраны до первого запроса
+    renderer.render(TEMPLATE, {'totals': []})
+    conn.send(READY)
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        template_src, context_dict = job
+        try:
+            conn.send(renderer.render(template_src, context_dict))
+        except Exception:
+            conn.send(None)
+
+
+class Worker:
+    """Процесс рендеринга и канал к нему"""
+
+    def __init__(self, mp_context):
+        self.conn, child = mp_context.Pipe()
+        self.process = mp_context.Process(target=_serve, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.started = False
+        self.jobs = 0
+        self.successor = None
+
+    def ready(self, timeout=0):
+        """Процесс прогрет и принимает задания"""
+        if not self.started and self.conn.poll(timeout):
+            self.started = self.conn.recv() == READY
+        return self.started
+
+    def render(self, template_src, context_dict, timeout):
+        if not self.ready(timeout):
+            raise TimeoutError(f'Процесс рендеринга не запустился за {timeout} с')
+        self.jobs += 1
+        self.conn.send((template_src, context_dict))
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f'PDF не собран за {timeout} с')
+        return self.conn.recv()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+        if self.successor is not None:
+            self.successor.kill()
+
+
+class RendererPool:
+    """
+    Пул заранее запущенных процессов рендеринга PDF. Задания ждут свободный процесс,
+    процесс, не уложившийся в timeout, убивается и заменяется, а отработавший max_jobs
+    заданий заменяется новым, чтобы память xhtml2pdf и reportlab не росла бесконечно.
+    Пока замена прогревается, задания собирает старый процесс
+    """
+
+    def __init__(self, size, max_jobs, timeout):
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        # spawn, а не fork: процесс веб-сервера многопоточный и держит соединения с базой
+        self.mp_context = multiprocessing.get_context('spawn')
+        self.idle = queue.Queue()
+        for _ in range(size):
+            self.idle.put(Worker(self.mp_context))
+
+    def render(self, template_src, context_dict={}):
+        worker = self.idle.get()
+        try:
+            return worker.render(template_src, context_dict, self.timeout)
+        except (TimeoutError, EOFError, OSError):
+            worker.kill()
+            worker = Worker(self.mp_context)
+            raise
+        finally:
+            self.idle.put(self._recycle(worker))
+
+    def _recycle(self, worker):
+        if worker.jobs >= self.max_jobs and worker.successor is None:
+            worker.successor = Worker(self.mp_context)
+        if worker.successor is not None and worker.successor.ready():
+            successor, worker.successor = worker.successor, None
+            # старый процесс доделывает выход, пока задание уже отдано
+            threading.Thread(target=worker.stop, daemon=True).start()
+            return successor
+        return worker
+
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get().stop()
+
+
+def get_pool():
+    """Пул процессов текущего процесса веб-сервера, создается при первом обращении"""
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = RendererPool(
+                settings.PDF_JOB_WORKERS, settings.PDF_RENDER_MAX_JOBS, settings.PDF_RENDER_TIMEOUT
+            )
+    return _pool
+
+
+def start_pool():
+    """Запускает пул при старте процесса веб-сервера, чтобы первый PDF не ждал прогрева"""
+    if settings.PDF_RENDER_POOL:
+        get_pool()
+
+
+def render_pdf(template_src, context_dict={}):
+    """Собирает PDF в пуле процессов, без PDF_RENDER_POOL - в текущем процессе"""
+    if not settings.PDF_RENDER_POOL:
+        from . import services
+        return services.render_pdf(template_src, context_dict)
+    return get_pool().render(template_src, context_dict)
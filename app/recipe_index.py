@@ -0,0 +1,252 @@
+import threading
+import time
+import uuid
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from heapq import merge
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.base import BaseCache
+from django.utils import timezone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ID_BITS = 64
+ID_MASK = (1 << ID_BITS) - 1
+VERSION_KEY = 'recipe_index_change_version'
+
+
+def get_change_key(version):
+    return f'recipe_index_change:{version}'
+
+
+def has_atomic_incr():
+    """
+    Номера записей журнала раздает cache.incr. Атомарен он только у бэкендов,
+    которые реализуют его сами (memcached, Redis, память процесса), у файлового
+    кэша и кэша в базе это чтение и запись, и два процесса могут получить один номер
+    """
+    return type(caches[DEFAULT_CACHE_ALIAS]).incr is not BaseCache.incr
+
+
+def make_key(pub_date, pk):
+    """
+    Упаковывает (pub_date, id) в одно целое число с тем же порядком сортировки,
+    чтобы хранить индексы плоскими отсортированными списками
+    """
+    if timezone.is_naive(pub_date):
+        pub_date = timezone.make_aware(pub_date, timezone.utc)
+    micros = (pub_date - EPOCH) // timedelta(microseconds=1)
+    return micros << ID_BITS | pk
+
+
+def key_to_id(key):
+    return key & ID_MASK
+
+
+def _iter_desc(keys, upper=None):
+    """Ключи списка строго меньше upper, от больших к меньшим"""
+    end = len(keys) if upper is None else bisect_left(keys, upper)
+    for pos in range(end - 1, -1, -1):
+        yield keys[pos]
+
+
+def _iter_asc(keys, lower):
+    """Ключи списка строго больше lower, от меньших к большим"""
+    for pos in range(bisect_right(keys, lower), len(keys)):
+        yield keys[pos]
+
+
+class RecipeIndex:
+    """
+    Индекс рецептов в памяти процесса для главной страницы и страниц авторов.
+    Хранит отсортированные по (pub_date, id) ключи рецептов целиком,
+    по каждому значению маски тегов и по каждому автору.
+    Строится лениво при первом обращении и поддерживается сигналами.
+    Каждое изменение пишется в журнал в кэше под очередным номером версии,
+    остальные процессы применяют новые записи журнала, не перечитывая таблицу.
+    Целиком индекс перестраивается, если журнал неполон, кэш не умеет атомарный incr
+    или истек RECIPE_INDEX_TTL
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._version = None
+        self._reset()
+
+    def _reset(self):
+        self._recipes = {}
+        self._ordered = []
+        self._by_tags = defaultdict(list)
+        self._by_author = defaultdict(list)
+        self._authors = {}
+
+    def load(self):
+        """Строит индекс заново одним проходом по таблице рецептов"""
+        from .models import Recipe
+
+        User = get_user_model()
+        with self._lock:
+            # версия читается до прохода: изменения, сделанные во время него,
+            # применятся из журнала еще раз, это безопасно
+            cache.add(VERSION_KEY, 0, None)
+            version = cache.get(VERSION_KEY)
+            self._reset()
+            rows = Recipe.objects.order_by().values_list('id', 'author_id', 'tags', 'pub_date')
+            for pk, author_id, tags, pub_date in rows.iterator():
+                self._recipes[pk] = (make_key(pub_date, pk), author_id, tags)
+            for key, author_id, tags in sorted(self._recipes.values()):
+                self._ordered.append(key)
+                self._by_tags[tags].append(key)
+                self._by_author[author_id].append(key)
+            self._authors = dict(User.objects.values_list('username', 'id').iterator())
+            self._loaded_at = time.monotonic()
+            self._version = version
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def ensure_loaded(self):
+        version = cache.get(VERSION_KEY)
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > settings.RECIPE_INDEX_TTL:
+                self.load()
+            elif version != self._version and not self._apply_changes(version):
+                self.load()
+
+    def _apply_changes(self, version):
+        """
+        Применяет записи журнала после своей версии до version.
+        False - записей слишком много или часть вытеснена из кэша, нужна полная перезагрузка
+        """
+        if not isinstance(version, int) or not isinstance(self._version, int):
+            return False
+        if not 0 < version - self._version <= settings.RECIPE_INDEX_MAX_CHANGES:
+            return False
+        keys = [get_change_key(number) for number in range(self._version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return False
+        for key in keys:
+            self._apply(*changes[key])
+        self._version = version
+        return True
+
+    def _apply(self, action, pk, *args):
+        if action == 'add':
+            key, author_id, tags = args
+            self._remove(pk)
+            self._recipes[pk] = (key, author_id, tags)
+            self._insert(self._ordered, key)
+            self._insert(self._by_tags[tags], key)
+            self._insert(self._by_author[author_id], key)
+        elif action == 'remove':
+            self._remove(pk)
+        elif action == 'author':
+            for username, user_pk in list(self._authors.items()):
+                if user_pk == pk:
+                    del self._authors[username]
+            self._authors[args[0]] = pk
+
+    def _change(self, *change):
+        """Применяет изменение к своей копии индекса и записывает его в журнал для остальных процессов"""
+        with self._lock:
+            if self._loaded_at is not None:
+                self._apply(*change)
+            if not has_atomic_incr():
+                # запись журнала могла бы затереть чужую с тем же номером, поэтому журнал не ведется:
+                # новая версия не число, и остальные процессы перестраивают индекс целиком
+                cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+                return
+            cache.add(VERSION_KEY, 0, None)
+            try:
+                version = cache.incr(VERSION_KEY)
+            except ValueError:
+                # номер версии вытеснен из кэша: остальные процессы перестроят индекс целиком
+                return
+            # журнал нужен только индексам моложе RECIPE_INDEX_TTL, более старые перестраиваются
+            cache.set(get_change_key(version), change, settings.RECIPE_INDEX_TTL)
+            if self._version == version - 1:
+                self._version = version
+
+    @staticmethod
+    def _insert(keys, key):
+        pos = bisect_left(keys, key)
+        if pos == len(keys) or keys[pos] != key:
+            keys.insert(pos, key)
+
+    @staticmethod
+    def _discard(keys, key):
+        pos = bisect_left(keys, key)
+        if pos < len(keys) and keys[pos] == key:
+            del keys[pos]
+
+    def _remove(self, pk):
+        entry = self._recipes.pop(pk, None)
+        if entry is not None:
+            key, author_id, tags = entry
+            self._discard(self._ordered, key)
+            self._discard(self._by_tags[tags], key)
+            self._discard(self._by_author[author_id], key)
+
+    def add(self, recipe):
+        self._change('add', recipe.pk, make_key(recipe.pub_date, recipe.pk), recipe.author_id, recipe.tags)
+
+    def remove(self, pk):
+        self._change('remove', pk)
+
+    def set_author(self, user):
+        self._change('author', user.pk, user.username)
+
+    def _candidates(self, masks, author_id):
+        if author_id is not None:
+            return [self._by_author.get(author_id, [])]
+        if masks is not None:
+            return [self._by_tags[mask] for mask in masks if self._by_tags.get(mask)]
+        return [self._ordered]
+
+    def _select(self, masks, author_id, bound, newer=False):
+        lists = self._candidates(masks, author_id)
+        if newer:
+            keys = merge(*(_iter_asc(keys, bound) for keys in lists))
+        else:
+            keys = merge(*(_iter_desc(keys, bound) for keys in lists), reverse=True)
+        if author_id is not None and masks is not None:
+            allowed = set(masks)
+            keys = (key for key in keys if self._recipes[key_to_id(key)][2] in allowed)
+        return keys
+
+    def page(self, index_filter, per_page, direction=None, pub_date=None, pk=None):
+        """
+        Возвращает id рецептов страницы от новых к старым и признаки
+        наличия следующей и предыдущей страниц.
+        direction 'n' - страница после курсора, 'p' - перед ним
+        """
+        self.ensure_loaded()
+        masks = index_filter.get('masks')
+        username = index_filter.get('username')
+        with self._lock:
+            author_id = None
+            if username is not None:
+                author_id = self._authors.get(username, 0)
+            upper = None
+            if direction == 'n':
+                upper = make_key(pub_date, pk)
+            elif direction == 'p':
+                newer = list(islice(self._select(masks, author_id, make_key(pub_date, pk), newer=True), per_page))
+                if newer:
+                    upper = newer[-1] + 1
+            keys = list(islice(self._select(masks, author_id, upper), per_page + 1))
+            has_next = len(keys) > per_page
+            keys = keys[:per_page]
+            has_previous = bool(keys) and direction is not None and next(
+                self._select(masks, author_id, keys[0], newer=True), None) is not None
+        return [key_to_id(key) for key in keys], has_next, has_previous
+
+
+recipe_index = RecipeIndex()
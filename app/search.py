@@ -0,0 +1,159 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Ingredient, Recipe
+
+SEARCH_TABLE = 'app_recipe_search'
+MAX_RESULTS = 60
+MAX_TERMS = 10
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Поиск не различает регистр и буквы ё/е"""
+    return text.lower().replace('ё', 'е')
+
+
+def get_terms(query):
+    """Слова запроса без операторов и кавычек, чтобы их нельзя было подставить в MATCH"""
+    return WORD_RE.findall(normalize(query))[:MAX_TERMS]
+
+
+class SqliteSearch:
+    """
+    Таблица FTS5, rowid которой совпадает с id рецепта.
+    Вес совпадения в названии выше, чем в ингредиентах и описании
+    """
+    create_sql = (
+        f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+        f"title, ingredients, text, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    )
+    drop_sql = (f'DROP TABLE IF EXISTS {SEARCH_TABLE}',)
+
+    @staticmethod
+    def update(cursor, recipe_id, title, ingredients, text):
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [recipe_id])
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, title, ingredients, text) VALUES (%s, %s, %s, %s)',
+            [recipe_id, title, ingredients, text]
+        )
+
+    @staticmethod
+    def delete(cursor, recipe_id):
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [recipe_id])
+
+    @staticmethod
+    def search(cursor, terms, limit):
+        cursor.execute(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+            f'ORDER BY bm25({SEARCH_TABLE}, 10.0, 5.0, 1.0) LIMIT %s',
+            [' '.join(f'"{term}"*' for term in terms), limit]
+        )
+        return [pk for pk, in cursor.fetchall()]
+
+
+class PostgresSearch:
+    """
+    Таблица с tsvector и GIN индексом, строки удаляются каскадно вместе с рецептом.
+    Веса: название - A, ингредиенты - B, описание - C
+    """
+    create_sql = (
+        f'CREATE TABLE {SEARCH_TABLE} ('
+        f'recipe_id bigint PRIMARY KEY REFERENCES app_recipe (id) ON DELETE CASCADE, '
+        f'document tsvector NOT NULL)',
+        f'CREATE INDEX {SEARCH_TABLE}_document_idx ON {SEARCH_TABLE} USING GIN (document)',
+    )
+    drop_sql = (f'DROP TABLE IF EXISTS {SEARCH_TABLE}',)
+
+    @staticmethod
+    def update(cursor, recipe_id, title, ingredients, text):
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (recipe_id, document) VALUES (%s, "
+            f"setweight(to_tsvector('russian', %s), 'A') || "
+            f"setweight(to_tsvector('russian', %s), 'B') || "
+            f"setweight(to_tsvector('russian', %s), 'C')) "
+            f"ON CONFLICT (recipe_id) DO UPDATE SET document = EXCLUDED.document",
+            [recipe_id, title, ingredients, text]
+        )
+
+    @staticmethod
+    def delete(cursor, recipe_id):
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE recipe_id = %s', [recipe_id])
+
+    @staticmethod
+    def search(cursor, terms, limit):
+        cursor.execute(
+            f"SELECT recipe_id FROM {SEARCH_TABLE}, to_tsquery('russian', %s) query "
+            f"WHERE document @@ query ORDER BY ts_rank(document, query) DESC, recipe_id DESC LIMIT %s",
+            [' & '.join(f'{term}:*' for term in terms), limit]
+        )
+        return [pk for pk, in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SqliteSearch,
+    'postgresql': PostgresSearch,
+}
+
+
+def get_backend(vendor=None):
+    """Бэкенд поиска для текущей базы, None - база без полнотекстового индекса"""
+    return BACKENDS.get(vendor or connection.vendor)
+
+
+def get_document(recipe):
+    """Тексты рецепта для индекса: название, названия ингредиентов и описание"""
+    ingredients = Ingredient.objects.filter(recipes=recipe).values_list('title', flat=True)
+    return normalize(recipe.title), normalize(' '.join(ingredients)), normalize(recipe.text)
+
+
+def index_recipe(recipe):
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.update(cursor, recipe.id, *get_document(recipe))
+
+
+def unindex_recipe(recipe_id):
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.delete(cursor, recipe_id)
+
+
+def rebuild_index():
+    """Заново индексирует все рецепты, возвращает их число"""
+    count = 0
+    for recipe in Recipe.objects.order_by().iterator():
+        index_recipe(recipe)
+        count += 1
+    return count
+
+
+def search_recipe_ids(query, limit=MAX_RESULTS):
+    """
+    Функция возвращает id рецептов, подходящих под все слова запроса,
+    начиная с самых релевантных. Слова ищутся по началу, чтобы работал ввод по мере набора
+    """
+    terms = get_terms(query)
+    if not terms:
+        return []
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            return backend.search(cursor, terms, limit)
+
+    recipes = Recipe.objects.all()
+    for term in terms:
+        recipes = recipes.filter(
+            Q(title__icontains=term) | Q(text__icontains=term) | Q(ingredient__title__icontains=term)
+        )
+    return list(recipes.order_by('-pub_date', '-id').values_list('id', flat=True).distinct()[:limit])
+
+
+def get_recipes(ids):
+    """Рецепты по списку id в том же порядке"""
+    recipes = Recipe.objects.select_related('author').in_bulk(ids)
+    return [recipes[pk] for pk in ids if pk in recipes]
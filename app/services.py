@@ -1,37 +1,102 @@
 import os
 from io import BytesIO
 
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Q
-from django.http import HttpResponse
-from django.template.loader import get_template
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery, Window
+from django.db.models.functions import RowNumber
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
 from xhtml2pdf import pisa
 
-from app.models import Ingredient, RecipeIngredient
+from app import search, shop_totals
+from app.models import Ingredient, Recipe, RecipeIngredient, ShopList
+from app.thumbnail_kvstore import prefetch_thumbnails
 from foodgram import settings
 
 
+def get_ingredient_rows(request):
+    """
+    Функция возвращает строки ингредиентов из формы: id из справочника, если форма его прислала,
+    название и количество. Старые формы присылают только названия.
+    Если списков полей разное число, строки не сопоставить, и функция возвращает None
+    """
+    names = request.POST.getlist('nameIngredient')
+    values = request.POST.getlist('valueIngredient')
+    ids = request.POST.getlist('idIngredient') or [''] * len(names)
+    if not len(ids) == len(names) == len(values):
+        return None
+    return [(pk, name.strip(), value.strip()) for pk, name, value in zip(ids, names, values)]
+
+
 def add_ingredient(request):
     """
-    Функция принимает запрос,
-    берет оттуда список с названиями и количеством ингредиентов,
-    записывает данные в базу, добавляет базу в список и возвращает этот список
+    Функция принимает запрос и находит ингредиенты всех строк формы одним запросом.
+    Возвращает словарь id ингредиента -> количество для правильных строк
+    и список ошибок остальных. Повторенный ингредиент складывается
     """
-    ingredients = []
-    if 'nameIngredient' in request.POST:
-        try:
-            name = request.POST.getlist('nameIngredient')
-            value = request.POST.getlist('valueIngredient')
+    rows = get_ingredient_rows(request)
+    if rows is None:
+        return {}, ['Строки ингредиентов заполнены не полностью, добавьте их заново']
+    if not rows:
+        return {}, []
+
+    ids = {int(pk) for pk, _, _ in rows if pk.isdecimal()}
+    titles = {name for pk, name, _ in rows if not pk.isdecimal()}
+    by_id, by_title = {}, {}
+    for ingredient in Ingredient.objects.filter(Q(pk__in=ids) | Q(title__in=titles)).order_by('-pk'):
+        by_id[ingredient.pk] = ingredient
+        by_title[ingredient.title] = ingredient
+
+    errors = []
+    amounts = {}
+    for pk, name, value in rows:
+        ingredient = by_id.get(int(pk)) if pk.isdecimal() else by_title.get(name)
+        if ingredient is None:
+            errors.append(f'Ингредиент «{name}» не найден в справочнике')
+        elif not value.isdecimal():
+            errors.append(f'Количество ингредиента «{name}» должно быть целым числом')
+        else:
+            amounts[ingredient.pk] = amounts.get(ingredient.pk, 0) + int(value)
+    return amounts, errors
+
+
+def save_recipe_ingredients(recipe, amounts, created=False):
+    """
+    Приводит ингредиенты рецепта к словарю amounts: удаляет лишние, меняет
+    количество у изменившихся и добавляет новые. Если ингредиенты не менялись,
+    записей в базу нет. Вызывается внутри транзакции вместе с сохранением рецепта
+    """
+    current = {} if created else {row.ingredient_id: row for row in recipe.recipe_ingredients.all()}
+    removed = current.keys() - amounts.keys()
+    changed = [
+        row for ingredient_id, row in current.items()
+        if ingredient_id in amounts and row.ing_count != amounts[ingredient_id]
+    ]
+    added = amounts.keys() - current.keys()
+    # рецепт в чьем-то списке покупок: его вклад в сводные списки пересчитывается целиком
+    listed = (removed or changed or added) and not created and ShopList.objects.filter(recipe=recipe).exists()
+    if listed:
+        shop_totals.remove_listed_recipe(recipe.id)
+
+    if removed:
+        recipe.recipe_ingredients.filter(ingredient_id__in=removed).delete()
+
+    for row in changed:
+        row.ing_count = amounts[row.ingredient_id]
+    if changed:
+        RecipeIngredient.objects.bulk_update(changed, ['ing_count'])
 
-            for name, value in zip(name, value):
-                ingredient = Ingredient.objects.get(title=name)
-                new_ingredient, _ = RecipeIngredient.objects.get_or_create(
-                    defaults={'ingredient': ingredient, 'ing_count': value},
-                    ingredient=ingredient, ing_count=value, )
-                ingredients.append(new_ingredient)
-        except ObjectDoesNotExist:
-            return []
-    return ingredients
+    if added:
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id, ing_count=amounts[ingredient_id])
+            for ingredient_id in added
+        )
+    if listed:
+        shop_totals.add_listed_recipe(recipe.id)
+    if removed or added:
+        # количество в индекс не входит, названия ингредиентов - входят
+        search.index_recipe(recipe)
 
 
 def add_tag(request):
@@ -41,54 +106,135 @@ def add_tag(request):
     для добавления его к созданному рецепту
     """
     tags = []
-    for tag in ['BREAKFAST', 'LUNCH', 'DINNER']:
+    for tag, _ in Recipe.TAGS:
         if request.POST.get(tag):
             tags.append(tag)
     return tags
 
 
+def get_tags_filter(request):
+    """
+    Функция строит фильтр по тегам из url.
+    По умолчанию теги объединяются через "или", с tag_mode=all - через "и"
+    """
+    mask = Recipe.tags_to_mask(request.GET.getlist('tag'))
+    if not mask:
+        return Q()
+    match_all = request.GET.get('tag_mode') == 'all'
+    return Q(tags__in=Recipe.masks_matching(mask, match_all))
+
+
+def get_recipe_index_filter(request, username=None):
+    """
+    Функция строит тот же фильтр, что и get_recipe_filter_tags,
+    но для индекса рецептов в памяти
+    """
+    mask = Recipe.tags_to_mask(request.GET.getlist('tag'))
+    match_all = request.GET.get('tag_mode') == 'all'
+    return {
+        'masks': Recipe.masks_matching(mask, match_all) if mask else None,
+        'username': username,
+    }
+
+
 def get_recipe_filter_tags(request, data, username=None):
     """
     Функция для фильтрации рецептов по url на главной странице и странице автора
     """
-    tags = request.GET.getlist('tag')
-    recipe = data.objects.select_related('author')
-    if tags:
-        if username is None:
-            my_filter = Q(tag__contains=tags[0])
-            if recipe.filter(my_filter).exists():
-                for tag in tags[1:]:
-                    my_filter |= Q(tag__contains=tag)
-            else:
-                my_filter = Q()
-        else:
-            my_filter = Q(author__username=username, tag__contains=tags[0])
-            if recipe.filter(my_filter).exists():
-                for tag in tags[1:]:
-                    my_filter |= Q(author__username=username, tag__contains=tag)
-            else:
-                my_filter = Q(author__username=username)
-    else:
-        my_filter = Q(author__username=username) if username else Q()
-    return recipe.filter(my_filter)
+    my_filter = get_tags_filter(request)
+    if username is not None:
+        my_filter &= Q(author__username=username)
+    return data.objects.select_related('author').filter(my_filter)
 
 
 def get_sub_filter_tags(request, data):
     """
     Функция для фильтрации рецептов по url на странице избранных
     """
-    tags = request.GET.getlist('tag')
-    recipe = data.objects.select_related('author')
-    if tags:
-        my_filter = Q(recipes__user=request.user, tag__contains=tags[0])
-        if recipe.filter(my_filter).exists():
-            for tag in tags[1:]:
-                my_filter |= Q(recipes__user=request.user, tag__contains=tag)
-        else:
-            my_filter = Q(recipes__user=request.user)
-    else:
-        my_filter = Q(recipes__user=request.user)
-    return recipe.filter(my_filter)
+    my_filter = get_tags_filter(request) & Q(recipes__user=request.user)
+    return data.objects.select_related('author').filter(my_filter)
+
+
+def get_latest_recipe_ids(author_ids, limit):
+    """
+    Функция возвращает id последних limit рецептов каждого автора.
+    Если база умеет оконные функции, все выбирается одним запросом по индексу
+    (author, pub_date, id), иначе - коррелированным подзапросом с LIMIT
+    """
+    recipes = Recipe.objects.filter(author_id__in=author_ids).order_by()
+    if connection.features.supports_over_clause:
+        ranked = recipes.annotate(
+            rn=Window(RowNumber(), partition_by=[F('author_id')], order_by=[F('pub_date').desc(), F('id').desc()]),
+        ).values('id', 'rn')
+        sql, params = ranked.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM ({sql}) ranked WHERE rn <= %s', (*params, limit))
+            return [pk for pk, in cursor.fetchall()]
+
+    latest = Recipe.objects.filter(author=OuterRef('author')).order_by('-pub_date', '-id').values('id')[:limit]
+    return list(recipes.filter(id__in=Subquery(latest)).values_list('id', flat=True))
+
+
+def attach_latest_recipes(authors, limit=3):
+    """
+    Функция добавляет авторам страницы подписок latest_recipes -
+    последние limit рецептов без текста описания
+    """
+    authors = list(authors)
+    if not authors:
+        return authors
+    ids = get_latest_recipe_ids([author.id for author in authors], limit)
+    latest = {}
+    for recipe in Recipe.objects.filter(id__in=ids).defer('text').order_by('-pub_date', '-id'):
+        latest.setdefault(recipe.author_id, []).append(recipe)
+    for author in authors:
+        author.latest_recipes = latest.get(author.id, [])
+    return authors
+
+
+def prefetch_recipe_thumbnails(recipes, sizes):
+    """
+    Функция одной пакетной загрузкой получает миниатюры размеров sizes
+    для фото всех рецептов страницы
+    """
+    prefetch_thumbnails([recipe.image.name for recipe in recipes], sizes)
+    return recipes
+
+
+def prefetch_recipe_cards(recipes, sizes):
+    """
+    Функция одним get_many достает из кэша карточки рецептов страницы.
+    Миниатюры размеров sizes подгружаются только для рецептов без готовой карточки:
+    в закэшированной карточке {% thumbnail %} не выполняется
+    """
+    keys = {get_recipe_card_key(recipe): recipe for recipe in recipes}
+    cards = cache.get_many(keys)
+    for key, recipe in keys.items():
+        recipe.cached_card = cards.get(key)
+    missing = [recipe for key, recipe in keys.items() if key not in cards]
+    if missing:
+        prefetch_recipe_thumbnails(missing, sizes)
+    return recipes
+
+
+def get_recipe_card_key(recipe):
+    """Ключ кэша карточки рецепта, меняется при каждом сохранении рецепта"""
+    return f'recipe_card:{recipe.id}:{recipe.mod_date.timestamp()}'
+
+
+def render_recipe_card(recipe):
+    """
+    Функция возвращает html общей для всех пользователей части карточки рецепта:
+    фото, название, теги, время и автора. Кнопки покупок и избранного
+    зависят от пользователя и рендерятся в самом шаблоне страницы
+    """
+    key = get_recipe_card_key(recipe)
+    # карточки страницы уже запрошены из кэша одним get_many в prefetch_recipe_cards
+    html = recipe.cached_card if hasattr(recipe, 'cached_card') else cache.get(key)
+    if html is None:
+        html = render_to_string('skeleton/recipe_card.html', {'recipe': recipe})
+        cache.set(key, html, settings.RECIPE_CARD_CACHE_TIMEOUT)
+    return mark_safe(html)
 
 
 def fetch_pdf_resources(uri, rel):
@@ -104,12 +250,15 @@ def fetch_pdf_resources(uri, rel):
     return path
 
 
-def render_to_pdf(template_src, context_dict={}):
-    """Функция конвертирует HTML в PDF"""
-    template = get_template(template_src)
-    html = template.render(context_dict)
+def html_to_pdf(html):
+    """Функция конвертирует HTML в PDF и возвращает его содержимое, None - если не получилось"""
     result = BytesIO()
     pdf = pisa.pisaDocument(BytesIO(html.encode('UTF-8')), result, encoding='utf-8', link_callback=fetch_pdf_resources)
     if not pdf.err:
-        return HttpResponse(result.getvalue(), content_type='application/pdf')
+        return result.getvalue()
     return None
+
+
+def render_pdf(template_src, context_dict={}):
+    """Функция собирает PDF по шаблону и возвращает его содержимое, None - если не получилось"""
+    return html_to_pdf(get_template(template_src).render(context_dict))
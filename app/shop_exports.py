@@ -0,0 +1,53 @@
+import csv
+
+from . import shop_totals
+
+TITLE = 'Список покупок'
+
+
+class Echo:
+    """Буфер для csv.writer, который не копит строки, а сразу отдает их"""
+
+    def write(self, value):
+        return value
+
+
+def _text(rows):
+    yield f'{TITLE}\n\n'
+    for title, total, dimension in rows:
+        yield f'{title} - {total} {dimension}\n'
+
+
+def _csv(rows):
+    writer = csv.writer(Echo())
+    # BOM, чтобы Excel открыл кириллицу без выбора кодировки
+    yield '\ufeff' + writer.writerow(['Ингредиент', 'Количество', 'Единицы измерения'])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _markdown(rows):
+    yield f'# {TITLE}\n\n'
+    for title, total, dimension in rows:
+        yield f'- [ ] {title} — {total} {dimension}\n'
+
+
+# формат выгрузки: генератор строк, тип содержимого и расширение файла
+EXPORTS = {
+    'txt': (_text, 'text/plain; charset=utf-8', 'txt'),
+    'csv': (_csv, 'text/csv; charset=utf-8', 'csv'),
+    'md': (_markdown, 'text/markdown; charset=utf-8', 'md'),
+}
+
+
+def get_rows(owner):
+    """Строки сводного списка покупок одним запросом, без загрузки всего списка в память"""
+    return shop_totals.get_totals(owner).values_list(
+        'ingredient__title', 'total', 'ingredient__dimension'
+    ).iterator()
+
+
+def export(owner, export_format):
+    """Генератор выгрузки сводного списка покупок владельца owner в формате export_format"""
+    write, _, _ = EXPORTS[export_format]
+    return write(get_rows(owner))
@@ -0,0 +1,135 @@
+from django.db import connection
+
+from .models import RecipeIngredient, ShopList, ShopListIngredient
+
+# колонки владельца: у строки списка покупок может быть и пользователь, и сессия
+# (после регистрации покупки сессии привязываются к пользователю), сводный список
+# ведется для каждого из них отдельно
+OWNER_COLUMNS = ('user_id', 'session_key')
+
+
+def _tables():
+    quote = connection.ops.quote_name
+    return (
+        quote(ShopListIngredient._meta.db_table),
+        quote(RecipeIngredient._meta.db_table),
+        quote(ShopList._meta.db_table),
+    )
+
+
+def _owners(column, owner=None, recipe_id=None):
+    """Подзапрос владельцев: один владелец или все, у кого рецепт recipe_id в списке покупок"""
+    if owner is not None:
+        return 'SELECT %s AS owner', [owner]
+    _, _, shop_list = _tables()
+    return (
+        f'SELECT DISTINCT {column} AS owner FROM {shop_list} WHERE recipe_id = %s AND {column} IS NOT NULL',
+        [recipe_id]
+    )
+
+
+def _add(column, recipe_ids, owner=None, recipe_id=None):
+    """Прибавляет ингредиенты рецептов к сводному списку владельцев одним INSERT ... ON CONFLICT"""
+    totals, ingredients, _ = _tables()
+    owners, params = _owners(column, owner, recipe_id)
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {totals} ({column}, ingredient_id, total, recipes) '
+            f'SELECT o.owner, ri.ingredient_id, SUM(ri.ing_count), COUNT(*) '
+            f'FROM {ingredients} ri, ({owners}) o '
+            f'WHERE ri.recipe_id IN ({placeholders}) GROUP BY o.owner, ri.ingredient_id '
+            f'ON CONFLICT ({column}, ingredient_id) DO UPDATE SET '
+            f'total = {totals}.total + EXCLUDED.total, recipes = {totals}.recipes + EXCLUDED.recipes',
+            [*params, *recipe_ids]
+        )
+
+
+def _subtract(column, recipe_ids, owner=None, recipe_id=None):
+    """Вычитает ингредиенты рецептов и удаляет строки, за которыми не осталось рецептов"""
+    totals, ingredients, _ = _tables()
+    owners, params = _owners(column, owner, recipe_id)
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    amounts = (
+        f'FROM {ingredients} ri WHERE ri.recipe_id IN ({placeholders}) '
+        f'AND ri.ingredient_id = {totals}.ingredient_id'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {totals} SET total = total - (SELECT SUM(ri.ing_count) {amounts}), '
+            f'recipes = recipes - (SELECT COUNT(*) {amounts}) '
+            f'WHERE {column} IN ({owners}) AND ingredient_id IN '
+            f'(SELECT ingredient_id FROM {ingredients} WHERE recipe_id IN ({placeholders}))',
+            [*recipe_ids, *recipe_ids, *params, *recipe_ids]
+        )
+        cursor.execute(f'DELETE FROM {totals} WHERE {column} IN ({owners}) AND recipes <= 0', params)
+
+
+def _column(owner):
+    (column, value), = owner.items()
+    return column, value
+
+
+def add_recipes(owner, recipe_ids):
+    """Рецепты добавлены в список покупок владельца owner ({'user_id': ...} или {'session_key': ...})"""
+    column, value = _column(owner)
+    if recipe_ids and value is not None:
+        _add(connection.ops.quote_name(column), list(recipe_ids), owner=value)
+
+
+def remove_recipes(owner, recipe_ids):
+    """Рецепты удалены из списка покупок владельца, их ингредиенты еще в базе"""
+    column, value = _column(owner)
+    if recipe_ids and value is not None:
+        _subtract(connection.ops.quote_name(column), list(recipe_ids), owner=value)
+
+
+def get_owners(shop_list):
+    """Владельцы, в сводных списках которых учитывается строка списка покупок"""
+    return [{column: getattr(shop_list, column)} for column in OWNER_COLUMNS if getattr(shop_list, column)]
+
+
+def get_request_owner(request):
+    """Владелец списка покупок текущего запроса, None - у анонимного посетителя его еще нет"""
+    if request.user.is_authenticated:
+        return {'user_id': request.user.id}
+    session_key = request.session.get('purchase_id')
+    return {'session_key': session_key} if session_key else None
+
+
+def get_totals(owner):
+    """Сводный список покупок владельца по алфавиту, без агрегации"""
+    if owner is None:
+        return ShopListIngredient.objects.none()
+    return ShopListIngredient.objects.filter(**owner).select_related('ingredient').order_by('ingredient__title')
+
+
+def remove_listed_recipe(recipe_id):
+    """
+    Убирает рецепт из сводных списков всех, у кого он в покупках.
+    Вызывается перед изменением ингредиентов рецепта, после него - add_listed_recipe
+    """
+    for column in OWNER_COLUMNS:
+        _subtract(connection.ops.quote_name(column), [recipe_id], recipe_id=recipe_id)
+
+
+def add_listed_recipe(recipe_id):
+    for column in OWNER_COLUMNS:
+        _add(connection.ops.quote_name(column), [recipe_id], recipe_id=recipe_id)
+
+
+def rebuild_totals():
+    """Заново собирает все сводные списки из списков покупок, возвращает число строк"""
+    totals, ingredients, shop_list = _tables()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {totals}')
+        for column in OWNER_COLUMNS:
+            column = connection.ops.quote_name(column)
+            cursor.execute(
+                f'INSERT INTO {totals} ({column}, ingredient_id, total, recipes) '
+                f'SELECT s.{column}, ri.ingredient_id, SUM(ri.ing_count), COUNT(*) '
+                f'FROM {shop_list} s JOIN {ingredients} ri ON ri.recipe_id = s.recipe_id '
+                f'WHERE s.{column} IS NOT NULL GROUP BY s.{column}, ri.ingredient_id'
+            )
+        cursor.execute(f'SELECT COUNT(*) FROM {totals}')
+        return cursor.fetchone()[0]
@@ -0,0 +1,232 @@
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import page_cache, search, shop_totals, thumbnails
+from .counters import change_counter
+from .ingredient_catalog import invalidate_catalog
+from .ingredient_index import ingredient_index
+from .models import Favorite, Ingredient, Recipe, RecipeIngredient, ShopList, Subscription, User
+from .recipe_index import recipe_index
+from .services import get_recipe_card_key
+from .user_state import invalidate_user_state
+
+AUTHOR_CARD_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+def get_author_username(recipe):
+    if Recipe.author.is_cached(recipe):
+        return recipe.author.username
+    return User.objects.filter(pk=recipe.author_id).values_list('username', flat=True).first()
+
+
+def author_fields_changed(raw, update_fields):
+    return not raw and (update_fields is None or bool(AUTHOR_CARD_FIELDS & set(update_fields)))
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, **kwargs):
+    """
+    Добавляет или обновляет рецепт в индексе в памяти после коммита:
+    при откате транзакции в индексе не должно остаться несуществующего рецепта
+    """
+    transaction.on_commit(partial(recipe_index.add, instance))
+
+
+def forget_recipe(pk, card_key):
+    recipe_index.remove(pk)
+    cache.delete(card_key)
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, **kwargs):
+    """
+    Удаляет рецепт из индекса в памяти и его карточку из кэша после коммита.
+    id запоминается сейчас: после удаления у instance его уже нет
+    """
+    transaction.on_commit(partial(forget_recipe, instance.pk, get_recipe_card_key(instance)))
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe_search(sender, instance, **kwargs):
+    """Обновляет рецепт в полнотекстовом индексе"""
+    search.index_recipe(instance)
+
+
+@receiver(m2m_changed, sender=Recipe.ingredient.through)
+def index_recipe_ingredients(sender, instance, action, reverse, pk_set, **kwargs):
+    """Названия ингредиентов тоже ищутся, поэтому их изменение переиндексирует рецепт"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        search.index_recipe(instance)
+    elif pk_set:
+        for recipe in Recipe.objects.filter(pk__in=pk_set):
+            search.index_recipe(recipe)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def index_recipe_ingredient(sender, instance, **kwargs):
+    """
+    Ингредиент, сохраненный отдельно от рецепта (фикстуры, админка), попадает в индекс.
+    Форма рецепта пишет ингредиенты через bulk_create и обновляет индекс сама
+    """
+    search.index_recipe(instance.recipe)
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe_search(sender, instance, **kwargs):
+    search.unindex_recipe(instance.id)
+
+
+@receiver(post_save, sender=Recipe)
+def build_thumbnails(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Миниатюры нового или замененного фото создаются в фоне после коммита,
+    а не на первой странице, которая их покажет
+    """
+    if raw or not instance.image or (update_fields is not None and 'image' not in update_fields):
+        return
+    transaction.on_commit(partial(thumbnails.submit, instance.image.name))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_pages(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш главной страницы, страницы рецепта и страницы его автора после коммита:
+    иначе запрос между сбросом и коммитом закэширует старые данные под новой версией
+    """
+    scopes = ['index', f'recipe:{instance.slug}']
+    username = get_author_username(instance)
+    if username is not None:
+        scopes.append(f'author:{username}')
+    transaction.on_commit(partial(page_cache.invalidate, *scopes))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def reload_ingredients(sender, instance, **kwargs):
+    """Справочник ингредиентов изменился, подсказки перестраиваются во всех процессах"""
+    ingredient_index.invalidate()
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=User)
+def index_author(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    """
+    Обновляет имя автора, по которому ищутся его рецепты. Каждое изменение пишется
+    в журнал индекса, поэтому сохранения без нового имени (вход обновляет last_login) пропускаются
+    """
+    if not created and (
+        not author_fields_changed(raw, update_fields)
+        or getattr(instance, '_old_username', None) == instance.username
+    ):
+        return
+    transaction.on_commit(partial(recipe_index.set_author, instance))
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Запоминает прежнее имя пользователя, чтобы сбросить кэш его старой страницы"""
+    if instance.pk is not None and author_fields_changed(raw, update_fields):
+        instance._old_username = User.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    """
+    Имя автора выводится в карточках и на страницах его рецептов,
+    поэтому при его изменении у рецептов обновляется дата изменения
+    и сбрасывается кэш страниц
+    """
+    if created or not author_fields_changed(raw, update_fields):
+        return
+    recipes = Recipe.objects.filter(author=instance)
+    recipes.update(mod_date=timezone.now())
+    scopes = {'index', f'author:{instance.username}'}
+    old_username = getattr(instance, '_old_username', None)
+    if old_username:
+        scopes.add(f'author:{old_username}')
+    scopes.update(f'recipe:{slug}' for slug in recipes.values_list('slug', flat=True))
+    transaction.on_commit(partial(page_cache.invalidate, *scopes))
+
+
+@receiver(post_save, sender=User)
+def reset_new_user_state(sender, instance, created=False, **kwargs):
+    """У нового пользователя не может быть сохраненного состояния, даже если id переиспользован"""
+    if created:
+        invalidate_user_state(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_author_pages(sender, instance, **kwargs):
+    transaction.on_commit(partial(page_cache.invalidate, 'index', f'author:{instance.username}'))
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShopList)
+@receiver(post_delete, sender=ShopList)
+def invalidate_state(sender, instance, **kwargs):
+    """Сбрасывает закэшированные подписки, избранное и покупки владельца записи"""
+    invalidate_user_state(instance.user_id, getattr(instance, 'session_key', None))
+
+
+def counter_delta(signal, created=False, raw=False, **kwargs):
+    """Изменение счетчика: +1 за новую запись, -1 за удаленную, загрузка фикстур не считается"""
+    if signal is post_delete:
+        return -1
+    return 1 if created and not raw else 0
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def count_recipes(sender, instance, **kwargs):
+    """Число рецептов автора"""
+    change_counter(User, instance.author_id, 'recipe_count', counter_delta(**kwargs))
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def count_followers(sender, instance, **kwargs):
+    """Число подписчиков автора"""
+    change_counter(User, instance.author_id, 'follower_count', counter_delta(**kwargs))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def count_favorites(sender, instance, **kwargs):
+    """Сколько раз рецепт добавлен в избранное"""
+    change_counter(Recipe, instance.recipe_id, 'favorite_count', counter_delta(**kwargs))
+
+
+@receiver(post_save, sender=ShopList)
+@receiver(post_delete, sender=ShopList)
+def count_purchases(sender, instance, **kwargs):
+    """Число рецептов в списке покупок пользователя, у анонимной сессии счетчика нет"""
+    change_counter(User, instance.user_id, 'purchase_count', counter_delta(**kwargs))
+
+
+@receiver(post_save, sender=ShopList)
+def add_to_shop_totals(sender, instance, created=False, raw=False, **kwargs):
+    """Ингредиенты рецепта прибавляются к сводному списку покупок, в фикстурах он уже посчитан"""
+    if created and not raw:
+        for owner in shop_totals.get_owners(instance):
+            shop_totals.add_recipes(owner, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=ShopList)
+def subtract_from_shop_totals(sender, instance, **kwargs):
+    """
+    Вычитается до удаления: если удаляется сам рецепт,
+    его ингредиенты удаляются каскадом вместе со строкой списка покупок
+    """
+    for owner in shop_totals.get_owners(instance):
+        shop_totals.remove_recipes(owner, [instance.recipe_id])
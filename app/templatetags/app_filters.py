@@ -1,5 +1,8 @@
 from django import template
 
+from app.services import render_recipe_card
+from app.thumbnails import get_recipe_thumbnail, get_sources
+
 register = template.Library()
 
 
@@ -30,7 +33,39 @@ def get_list(request, key):
 @register.simple_tag()
 def clear_url(request, key, value):
     """Удаляет таг и пагинацию из url"""
-    url = request.GET.urlencode()
-    if 'page' in url:
-        url = url[:-7]
-    return url.replace(f'{key}={value}', '')
+    query = request.GET.copy()
+    query.pop('page', None)
+    query.pop('cursor', None)
+    query.setlist(key, [item for item in query.getlist(key) if item != str(value)])
+    return query.urlencode()
+
+
+@register.simple_tag()
+def cursor_url(request, cursor):
+    """Заменяет в url курсор и убирает номер страницы"""
+    query = request.GET.copy()
+    query.pop('page', None)
+    query['cursor'] = cursor
+    return query.urlencode()
+
+
+@register.simple_tag()
+def recipe_card(recipe):
+    """Выводит закэшированную часть карточки рецепта"""
+    return render_recipe_card(recipe)
+
+
+@register.simple_tag()
+def recipe_thumbnail(image, size):
+    """Миниатюра фото рецепта размера из thumbnails.THUMBNAILS: card или list"""
+    return get_recipe_thumbnail(image, size)
+
+
+@register.inclusion_tag('skeleton/recipe_picture.html')
+def recipe_picture(recipe, picture, css_class):
+    """<picture> с вариантами фото рецепта в WebP и AVIF и JPEG для остальных браузеров"""
+    return {
+        'recipe': recipe,
+        'sources': get_sources(recipe.image, picture) if recipe.image else [],
+        'css_class': css_class,
+    }
@@ -0,0 +1,23 @@
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import override_settings
+
+from app.ingredient_catalog import CATALOG_KEY
+
+
+def use_temp_media(test):
+    """
+    Фото рецептов, миниатюры и справочник ингредиентов теста пишутся
+    во временный каталог, который удаляется после теста
+    """
+    root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, root, True)
+    settings = override_settings(MEDIA_ROOT=root, INGREDIENT_CATALOG_ROOT=os.path.join(root, 'catalog'))
+    settings.enable()
+    test.addCleanup(settings.disable)
+    # имя справочника из кэша указывало бы на файл вне временного каталога
+    cache.delete(CATALOG_KEY)
+    test.addCleanup(cache.delete, CATALOG_KEY)
@@ -73,6 +73,15 @@ class TestAuthorizedUsers(TestCase):
                                    )
         self.assertEqual(response.context['recipes'].count(), 2)
 
+    def test_tag_without_recipes(self):
+        response = self.client.get(reverse('author_recipe', kwargs={'username': 'veronika'}),
+                                   data={'tag': 'LUNCH'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['recipes']), 0)
+        self.assertEqual(response.context['author'], self.author)
+        response = self.client.get(reverse('author_recipe', kwargs={'username': 'nobody'}))
+        self.assertEqual(response.status_code, 404)
+
 
 class TestUnauthorizedUsers(TestCase):
     fixtures = ['db_test.json', ]
@@ -0,0 +1,136 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from app.models import User, Favorite, Recipe, ShopList, Subscription
+
+
+class TestAuthorizedUsers(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+
+        self.user = User.objects.create_user(
+            username='sarah', email='connor@skynet.com', password='test')
+        self.client.login(email='connor@skynet.com', password='test')
+        self.author = User.objects.get(username='veronika')
+        self.recipes = list(Recipe.objects.order_by('id')[:3])
+
+    def post(self, operations):
+        return self.client.post(reverse('batch'), data={'operations': operations}, content_type='application/json')
+
+    def test_batch(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipes[2])
+        response = self.post([
+            {'action': 'add', 'kind': 'purchase', 'id': self.recipes[0].id},
+            {'action': 'add', 'kind': 'purchase', 'id': self.recipes[1].id},
+            {'action': 'add', 'kind': 'favorite', 'id': self.recipes[0].id},
+            {'action': 'remove', 'kind': 'favorite', 'id': self.recipes[2].id},
+            {'action': 'add', 'kind': 'subscription', 'id': self.author.id},
+        ])
+        self.assertEqual(response.json(), {
+            'results': [True, True, True, True, True],
+            'subscriptions': [self.author.id],
+            'favorites': [self.recipes[0].id],
+            'purchases': [self.recipes[0].id, self.recipes[1].id],
+        })
+        self.assertEqual(ShopList.objects.filter(user=self.user).count(), 2)
+        self.assertTrue(Subscription.objects.filter(user=self.user, author=self.author).exists())
+
+    def test_batch_counters(self):
+        follower_count = self.author.follower_count
+        favorite_count = self.recipes[0].favorite_count
+        self.post([
+            {'action': 'add', 'kind': 'purchase', 'id': self.recipes[0].id},
+            {'action': 'add', 'kind': 'purchase', 'id': self.recipes[1].id},
+            {'action': 'add', 'kind': 'favorite', 'id': self.recipes[0].id},
+            {'action': 'add', 'kind': 'subscription', 'id': self.author.id},
+        ])
+        self.assertEqual(User.objects.get(pk=self.user.pk).purchase_count, 2)
+        self.assertEqual(User.objects.get(pk=self.author.pk).follower_count, follower_count + 1)
+        self.assertEqual(Recipe.objects.get(pk=self.recipes[0].pk).favorite_count, favorite_count + 1)
+
+        self.post([{'action': 'remove', 'kind': 'purchase', 'id': self.recipes[0].id}])
+        self.assertEqual(User.objects.get(pk=self.user.pk).purchase_count, 1)
+
+    def test_batch_repeated_and_missing(self):
+        ShopList.objects.create(user=self.user, recipe=self.recipes[0])
+        response = self.post([
+            {'action': 'add', 'kind': 'purchase', 'id': self.recipes[0].id},
+            {'action': 'add', 'kind': 'purchase', 'id': 100500},
+            {'action': 'add', 'kind': 'favorite', 'id': self.recipes[1].id},
+            {'action': 'remove', 'kind': 'favorite', 'id': self.recipes[1].id},
+            {'action': 'add', 'kind': 'subscription', 'id': self.user.id},
+        ])
+        data = response.json()
+        self.assertEqual(data['results'], [False, False, False, False, False])
+        self.assertEqual(data['purchases'], [self.recipes[0].id])
+        self.assertEqual(data['favorites'], [])
+        self.assertEqual(data['subscriptions'], [])
+
+    def test_batch_queries(self):
+        operations = [{'action': 'add', 'kind': 'purchase', 'id': recipe.id} for recipe in self.recipes]
+        operations += [{'action': 'add', 'kind': 'favorite', 'id': recipe.id} for recipe in self.recipes]
+        self.post([{'action': 'add', 'kind': 'subscription', 'id': self.author.id}])
+        with CaptureQueriesContext(connection) as context:
+            response = self.post(operations)
+        self.assertEqual(response.json()['results'], [True] * 6)
+        writes = [
+            ' '.join(query['sql'].split()[:3]) for query in context.captured_queries
+            if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+        # по одному INSERT и UPDATE счетчика на группу, сколько бы рецептов в ней ни было
+        self.assertCountEqual(writes, [
+            'INSERT INTO "app_shoplist"', 'UPDATE "users_user" SET',
+            'INSERT INTO "app_shoplistingredient"',
+            'INSERT INTO "app_favorite"', 'UPDATE "app_recipe" SET',
+        ])
+
+    def test_batch_without_returning(self):
+        with mock.patch('app.toggles.supports_returning', return_value=False):
+            response = self.post([
+                {'action': 'add', 'kind': 'purchase', 'id': self.recipes[0].id},
+                {'action': 'add', 'kind': 'purchase', 'id': self.recipes[0].id},
+                {'action': 'add', 'kind': 'purchase', 'id': self.recipes[1].id},
+            ])
+        self.assertEqual(response.json()['results'], [False, True, True])
+        self.assertEqual(User.objects.get(pk=self.user.pk).purchase_count, 2)
+
+    def test_batch_bad_request(self):
+        for operations in ([], [{'action': 'toggle', 'kind': 'purchase', 'id': 1}],
+                           [{'action': 'add', 'kind': 'purchase', 'id': 'test'}],
+                           [{'action': 'add', 'kind': 'purchase', 'id': 1}] * 101):
+            self.assertEqual(self.post(operations).status_code, 400)
+        response = self.client.post(reverse('batch'), data='test', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class TestUnauthorizedUsers(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+        self.recipes = list(Recipe.objects.order_by('id')[:2])
+
+    def test_batch_purchases(self):
+        response = self.client.post(reverse('batch'), data={'operations': [
+            {'action': 'add', 'kind': 'purchase', 'id': recipe.id} for recipe in self.recipes
+        ]}, content_type='application/json')
+        self.assertEqual(response.json()['purchases'], [recipe.id for recipe in self.recipes])
+        session_key = self.client.session.get('purchase_id')
+        self.assertEqual(ShopList.objects.filter(session_key=session_key).count(), 2)
+
+        response = self.client.get(reverse('purchases'))
+        self.assertEqual(response.context['purchases'].count(), 2)
+
+    def test_batch_favorites(self):
+        response = self.client.post(reverse('batch'), data={'operations': [
+            {'action': 'add', 'kind': 'favorite', 'id': self.recipes[0].id}
+        ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
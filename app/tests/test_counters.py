@@ -0,0 +1,90 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+from app.counters import save_without_counters
+from app.models import User, Recipe
+
+
+class TestCounters(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='sarah', email='connor@skynet.com', password='test')
+        self.client.login(email='connor@skynet.com', password='test')
+        self.author = User.objects.get(username='test_user')
+        self.recipe = Recipe.objects.filter(author=self.author).first()
+
+    def test_fixture_counters(self):
+        self.assertEqual(self.author.recipe_count, self.author.recipes.count())
+        self.assertEqual(self.author.follower_count, self.author.following.count())
+
+    def test_subscription_counter(self):
+        count = self.author.follower_count
+        self.client.post(reverse('add_subscriptions'), data={'id': self.author.id},
+                         content_type='application/json')
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.follower_count, count + 1)
+
+        self.client.delete(reverse('remove_subscriptions', kwargs={'id': self.author.id}))
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.follower_count, count)
+
+    def test_favorite_counter(self):
+        self.client.post(reverse('add_favorites'), data={'id': self.recipe.id},
+                         content_type='application/json')
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorite_count, 1)
+
+        self.client.delete(reverse('remove_favorites', kwargs={'id': self.recipe.id}))
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorite_count, 0)
+
+    def test_purchase_counter(self):
+        self.client.post(reverse('add_purchases'), data={'id': self.recipe.id},
+                         content_type='application/json')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.purchase_count, 1)
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['purchases_count'], 1)
+
+    def test_recipe_counter(self):
+        count = self.author.recipe_count
+        self.recipe.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipe_count, count - 1)
+
+    def test_save_keeps_counter(self):
+        stale = User.objects.get(pk=self.author.pk)
+        self.client.post(reverse('add_subscriptions'), data={'id': self.author.id},
+                         content_type='application/json')
+        stale.first_name = 'Джон'
+        save_without_counters(stale)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.follower_count, stale.follower_count + 1)
+        self.assertEqual(self.author.first_name, 'Джон')
+
+    def test_save_recipe_keeps_counter(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        self.client.post(reverse('add_favorites'), data={'id': self.recipe.id},
+                         content_type='application/json')
+        stale.title = 'Новое название'
+        save_without_counters(stale)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorite_count, stale.favorite_count + 1)
+        self.assertEqual(self.recipe.title, 'Новое название')
+
+    def test_reconcile_counters(self):
+        User.objects.filter(pk=self.author.pk).update(recipe_count=100)
+        Recipe.objects.filter(pk=self.recipe.pk).update(favorite_count=7)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.author.refresh_from_db()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.author.recipe_count, self.author.recipes.count())
+        self.assertEqual(self.recipe.favorite_count, 0)
+        self.assertIn('users.User.recipe_count: исправлено 1', out.getvalue())
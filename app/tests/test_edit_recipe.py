@@ -1,8 +1,11 @@
 from pprint import pprint
 
+from django.db import connection
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from app.models import User, Recipe
+from app.tests import use_temp_media
 from foodgram.settings import LOGIN_URL
 
 
@@ -12,6 +15,7 @@ class TestAuthorizedUsers(TestCase):
     def setUp(self):
         """создание тестового клиента"""
         self.client = Client()
+        use_temp_media(self)
 
         self.user = User.objects.create_user(
             username='sarah', email='connor@skynet.com', first_name='Sarah', last_name='connor', password='test'
@@ -45,6 +49,41 @@ class TestAuthorizedUsers(TestCase):
         self.assertRedirects(response, f'/{self.recipe.slug}/')
         self.assertEqual(response.context['recipe'].text, 'test_edit')
 
+    def get_ingredient_data(self):
+        rows = self.recipe.recipe_ingredients.values_list('ingredient__title', 'ing_count')
+        return {'nameIngredient': [title for title, _ in rows], 'valueIngredient': [count for _, count in rows]}
+
+    def test_edit_recipe_text_only(self):
+        data = self.get_ingredient_data()
+        with CaptureQueriesContext(connection) as context:
+            self.client.post(reverse('edit_recipe', kwargs={'recipe_slug': self.recipe.slug}), data={
+                'title': self.recipe.title, 'BREAKFAST': ['on'], 'text': 'test_edit', 'time': 35, **data
+            })
+        writes = [
+            query['sql'] for query in context.captured_queries
+            if 'app_recipeingredient' in query['sql'] and not query['sql'].startswith('SELECT')
+        ]
+        self.assertEqual(writes, [])
+        self.assertEqual(Recipe.objects.get(pk=self.recipe.pk).text, 'test_edit')
+        self.assertEqual(self.get_ingredient_data(), data)
+
+    def test_edit_recipe_ingredients_diff(self):
+        data = self.get_ingredient_data()
+        ids = dict(self.recipe.recipe_ingredients.values_list('ingredient__title', 'id'))
+        data['nameIngredient'] = data['nameIngredient'][1:] + ['куриные грудки']
+        data['valueIngredient'] = [count + 1 for count in data['valueIngredient'][1:]] + [400]
+        self.client.post(reverse('edit_recipe', kwargs={'recipe_slug': self.recipe.slug}), data={
+            'title': self.recipe.title, 'BREAKFAST': ['on'], 'text': 'test_edit', 'time': 35, **data
+        })
+        rows = self.recipe.recipe_ingredients.values_list('ingredient__title', 'ing_count', 'id')
+        self.assertEqual(
+            sorted((title, count) for title, count, _ in rows),
+            sorted(zip(data['nameIngredient'], data['valueIngredient']))
+        )
+        for title, _, pk in rows:
+            if title in ids:
+                self.assertEqual(pk, ids[title])
+
     def test_edit_recipe_not_tag(self):
         with open('media/test/test_image_1.png', 'rb') as img:
             response = self.client.post(reverse('edit_recipe',
@@ -1,6 +1,11 @@
+from unittest import mock
+
+from django.db import DatabaseError, connection
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from app import toggles
 from app.models import User, Favorite, Recipe, ShopList
 
 
@@ -54,6 +59,44 @@ class TestAuthorizedUsers(TestCase):
         response = self.client.delete(reverse('remove_favorites', kwargs={'id': self.recipes.first().id}))
         self.assertContains(response, '{"success": false}')
 
+    def test_favorites_missing_recipe(self):
+        response = self.client.post(reverse('add_favorites'), data={'id': 100500},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post(reverse('add_favorites'), data={'id': 'test'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.delete(reverse('remove_favorites', kwargs={'id': 100500}))
+        self.assertEqual(response.status_code, 404)
+
+    def statements(self, toggle, *args):
+        """Результат toggle и его запросы без SAVEPOINT, которые atomic добавляет внутри теста"""
+        with CaptureQueriesContext(connection) as context:
+            result = toggle(*args)
+        return result, [query['sql'].split()[0] for query in context.captured_queries
+                        if 'SAVEPOINT' not in query['sql']]
+
+    def test_toggle_queries(self):
+        recipe = self.recipes[1]
+        owner = {'user_id': self.user.id}
+        result = self.statements(toggles.add, Favorite, owner, 'recipe', recipe.id)
+        self.assertEqual(result, (True, ['INSERT', 'UPDATE']))
+        result = self.statements(toggles.add, Favorite, owner, 'recipe', recipe.id)
+        self.assertEqual(result, (False, ['INSERT', 'SELECT']))
+        self.assertEqual(Favorite.objects.filter(user=self.user, recipe=recipe).count(), 1)
+        self.assertEqual(Recipe.objects.get(pk=recipe.pk).favorite_count, recipe.favorite_count + 1)
+
+        result = self.statements(toggles.remove, Favorite, owner, 'recipe', recipe.id)
+        self.assertEqual(result, (True, ['DELETE', 'UPDATE']))
+        self.assertEqual(Recipe.objects.get(pk=recipe.pk).favorite_count, recipe.favorite_count)
+
+    def test_toggle_is_atomic(self):
+        recipe = self.recipes[1]
+        with mock.patch('app.toggles._apply_side_effects', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                toggles.add(Favorite, {'user_id': self.user.id}, 'recipe', recipe.id)
+        self.assertFalse(Favorite.objects.filter(user=self.user, recipe=recipe).exists())
+
     def test_recipe_full_name(self):
         html = '<a href="/recipe/test_user/" style="color: black">test_ls test_fn</a>'
         self.assertContains(self.response, html, count=1, html=True)
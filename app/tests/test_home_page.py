@@ -1,6 +1,8 @@
 import uuid
 
+from django.db import connection
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from app.models import User, Recipe, Favorite, ShopList
 
@@ -115,3 +117,45 @@ class TestUnauthorizedUsers(TestCase):
         self.assertEqual(response.context['recipes'].count(), 5)
         response = self.client.get(reverse('index'), data={'tag': ['BREAKFAST', 'LUNCH']})
         self.assertEqual(response.context['recipes'].count(), 6)
+
+    def test_tag_filter_all(self):
+        response = self.client.get(reverse('index'), data={'tag': ['BREAKFAST', 'LUNCH'], 'tag_mode': 'all'})
+        self.assertEqual(response.context['recipes'].count(), 3)
+        response = self.client.get(reverse('index'), data={'tag': ['BREAKFAST', 'DINNER'], 'tag_mode': 'all'})
+        self.assertEqual(response.context['recipes'].count(), 0)
+
+
+class TestUserState(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+
+        self.user = User.objects.create_user(
+            username='sarah', email='connor@skynet.com', password='test'
+        )
+        self.client.login(email='connor@skynet.com', password='test')
+        self.recipe = Recipe.objects.all().first()
+        self.client.get(reverse('index'))
+
+    def test_state_is_cached(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('index'))
+        # подписки, избранное и покупки берутся из кэша, а не из базы
+        state_queries = [
+            query['sql'] for query in context.captured_queries
+            if any(table in query['sql'] for table in ('app_subscription', 'app_favorite', 'app_shoplist'))
+        ]
+        self.assertEqual(state_queries, [])
+        html = '<span class="badge badge_style_blue nav__badge" id="counter"></span>'
+        self.assertContains(response, html, html=True)
+
+    def test_add_purchase_resets_state(self):
+        response = self.client.post(reverse('add_purchases'), data={'id': self.recipe.id},
+                                    content_type='application/json')
+        self.assertContains(response, '{"success": true}')
+
+        response = self.client.get(reverse('index'))
+        html = '<span class="badge badge_style_blue nav__badge" id="counter">1</span>'
+        self.assertContains(response, html, html=True)
@@ -0,0 +1,59 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from app.ingredient_catalog import CATALOG_KEY, get_catalog_url
+from app.models import User, Ingredient
+
+
+class TestIngredientCatalog(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        settings = override_settings(INGREDIENT_CATALOG_ROOT=self.root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.delete(CATALOG_KEY)
+
+    def read(self, url):
+        with open(os.path.join(self.root, url.rsplit('/', 1)[1]), 'rb') as file:
+            return file.read()
+
+    def test_catalog_content(self):
+        url = get_catalog_url()
+        self.assertRegex(url, r'^/media/catalog/ingredients\.[0-9a-f]{12}\.json$')
+        data = json.loads(self.read(url))
+        self.assertEqual(len(data), Ingredient.objects.count())
+        orange = Ingredient.objects.get(title='апельсины крупные')
+        self.assertIn({'id': orange.id, 'title': 'апельсины крупные', 'dimension': 'шт.'}, data)
+        self.assertEqual(gzip.decompress(self.read(url + '.gz')), self.read(url))
+
+    def test_new_version_on_change(self):
+        url = get_catalog_url()
+        self.assertEqual(get_catalog_url(), url)
+        sauce = Ingredient.objects.create(title='соус квазипармезанный', dimension='г')
+        new_url = get_catalog_url()
+        self.assertNotEqual(new_url, url)
+        self.assertIn({'id': sauce.id, 'title': 'соус квазипармезанный', 'dimension': 'г'},
+                      json.loads(self.read(new_url)))
+
+    def test_old_versions_pruned(self):
+        for number in range(5):
+            Ingredient.objects.create(title=f'ингредиент {number}', dimension='г')
+            get_catalog_url()
+        self.assertEqual(len([name for name in os.listdir(self.root) if name.endswith('.json')]), 3)
+
+    def test_new_recipe_page(self):
+        User.objects.create_user(username='sarah', email='connor@skynet.com', password='test')
+        self.client.login(email='connor@skynet.com', password='test')
+        response = self.client.get(reverse('new_recipe'))
+        self.assertContains(response, f'data-catalog="{get_catalog_url()}"')
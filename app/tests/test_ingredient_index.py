@@ -0,0 +1,52 @@
+from django.test import TestCase, Client
+from django.urls import reverse
+from app.ingredient_index import ingredient_index
+from app.models import User, Ingredient
+
+
+class TestIngredientIndex(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+        ingredient_index.invalidate()
+
+    def titles(self, query, **kwargs):
+        return [item['title'] for item in ingredient_index.search(query, **kwargs)]
+
+    def test_prefix(self):
+        expected = sorted(Ingredient.objects.filter(title__startswith='апельсин').values_list('title', flat=True),
+                          key=lambda title: (len(title), title))
+        self.assertEqual(self.titles('апельсин')[:len(expected)], expected)
+
+    def test_case_and_yo(self):
+        Ingredient.objects.create(title='Ёжевика садовая', dimension='г')
+        self.assertEqual(self.titles('ЕЖЕВИКА САД'), ['Ёжевика садовая'])
+        self.assertEqual(self.titles('ёжевика  сад'), ['Ёжевика садовая'])
+
+    def test_ranking(self):
+        titles = self.titles('груд')
+        self.assertEqual(titles[:3], ['грудинка', 'грудинка копченая', 'грудинка варено-копченая'])
+        self.assertEqual(titles[3:5], ['утиная грудка', 'индейка грудка'])
+        self.assertIn('куриные грудки', titles)
+
+    def test_substring_fallback(self):
+        Ingredient.objects.create(title='соус квазипармезанный', dimension='г')
+        self.assertEqual(self.titles('ипармез'), ['соус квазипармезанный'])
+
+    def test_limit(self):
+        self.assertEqual(len(self.titles('сыр', limit=5)), 5)
+        self.assertEqual(self.titles('ап'), [])
+
+    def test_no_queries(self):
+        ingredient_index.ensure_loaded()
+        with self.assertNumQueries(0):
+            self.titles('апельсин')
+
+    def test_api(self):
+        User.objects.create_user(username='sarah', email='connor@skynet.com', password='test')
+        self.client.login(email='connor@skynet.com', password='test')
+        response = self.client.get(reverse('ingredient'), data={'query': 'Апельсины'})
+        self.assertEqual(response.json()[0], {'title': 'апельсины', 'dimension': 'г'})
+        self.assertIn({'title': 'апельсины крупные', 'dimension': 'шт.'}, response.json())
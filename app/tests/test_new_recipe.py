@@ -1,6 +1,8 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, RequestFactory
 from django.urls import reverse
-from app.models import User, Recipe
+from app.models import User, Recipe, Ingredient
+from app.services import add_ingredient
+from app.tests import use_temp_media
 
 
 class TestAuthorizedUsers(TestCase):
@@ -9,6 +11,7 @@ class TestAuthorizedUsers(TestCase):
     def setUp(self):
         """создание тестового клиента"""
         self.client = Client()
+        use_temp_media(self)
 
         self.user = User.objects.create_user(
             username='sarah', email='connor@skynet.com', first_name='Sarah', last_name='connor', password='test'
@@ -86,6 +89,85 @@ class TestAuthorizedUsers(TestCase):
         html = '<span class="form__error message">Вы забыли выбрать ингредиенты</span>'
         self.assertContains(response, html, html=True)
 
+    def test_new_recipe_ingredient_errors(self):
+        with open('media/test/test_image_1.png', 'rb') as img:
+            response = self.client.post(reverse('new_recipe'), data={
+                'title': 'test_title',
+                'nameIngredient': ['куриные грудки', 'test', 'яйца куриные'],
+                'valueIngredient': ['400', '250', 'много'],
+                'BREAKFAST': ['on'],
+                'text': 'test_test',
+                'image': img,
+                'time': 35
+            }, follow=True)
+
+        self.assertContains(response, 'Ингредиент «test» не найден в справочнике')
+        self.assertContains(response, 'Количество ингредиента «яйца куриные» должно быть целым числом')
+        self.assertNotContains(response, 'Вы забыли выбрать ингредиенты')
+        self.assertFalse(Recipe.objects.filter(title='test_title').exists())
+
+    def test_new_recipe_ingredient_rows_mismatch(self):
+        with open('media/test/test_image_1.png', 'rb') as img:
+            response = self.client.post(reverse('new_recipe'), data={
+                'title': 'test_title',
+                'nameIngredient': ['куриные грудки', 'яйца куриные'],
+                'valueIngredient': ['400'],
+                'BREAKFAST': ['on'],
+                'text': 'test_test',
+                'image': img,
+                'time': 35
+            }, follow=True)
+
+        self.assertContains(response, 'Строки ингредиентов заполнены не полностью, добавьте их заново')
+        self.assertFalse(Recipe.objects.filter(title='test_title').exists())
+
+    def test_new_recipe_ingredient_ids(self):
+        ingredients = list(Ingredient.objects.filter(title__in=['куриные грудки', 'яйца куриные']).order_by('title'))
+        with open('media/test/test_image_1.png', 'rb') as img:
+            self.client.post(reverse('new_recipe'), data={
+                'title': 'test_title',
+                'idIngredient': [str(ingredient.id) for ingredient in ingredients],
+                'nameIngredient': ['старое название', 'другое название'],
+                'valueIngredient': ['400', '3'],
+                'BREAKFAST': ['on'],
+                'text': 'test_test',
+                'image': img,
+                'time': 35
+            })
+        recipe = Recipe.objects.get(title='test_title')
+        self.assertEqual(
+            sorted(recipe.recipe_ingredients.values_list('ingredient__title', 'ing_count')),
+            [('куриные грудки', 400), ('яйца куриные', 3)]
+        )
+
+    def test_add_ingredient_queries(self):
+        titles = list(Ingredient.objects.values_list('title', flat=True).distinct()[:25])
+        request = RequestFactory().post('/', data={
+            'nameIngredient': titles,
+            'valueIngredient': [str(number + 1000) for number in range(len(titles))],
+        })
+        with self.assertNumQueries(1):
+            amounts, errors = add_ingredient(request)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(amounts), len(titles))
+
+    def test_new_recipe_duplicate_ingredients(self):
+        with open('media/test/test_image_1.png', 'rb') as img:
+            self.client.post(reverse('new_recipe'), data={
+                'title': 'test_title',
+                'nameIngredient': ['куриные грудки', 'куриные грудки'],
+                'valueIngredient': ['400', '100'],
+                'BREAKFAST': ['on'],
+                'text': 'test_test',
+                'image': img,
+                'time': 35
+            })
+        recipe = Recipe.objects.get(title='test_title')
+        self.assertEqual(
+            list(recipe.recipe_ingredients.values_list('ingredient__title', 'ing_count')),
+            [('куриные грудки', 500)]
+        )
+
     def test_author_remove_recipe(self):
         self.client.login(email='veronika@mail.ru', password='test')
         response = self.client.delete(reverse('remove_recipe', kwargs={'recipe_slug': self.recipe.slug}), follow=True)
@@ -0,0 +1,96 @@
+import uuid
+
+from django.core.cache import caches
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from app.models import User, Recipe, ShopList
+
+
+@override_settings(PAGE_CACHE_ENABLED=True)
+class TestAnonymousPageCache(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+        caches['pages'].clear()
+        self.recipe = Recipe.objects.order_by('-pub_date').first()
+        self.response = self.client.get(reverse('index'))
+
+    def test_index_from_cache(self):
+        self.assertIsNotNone(self.response.context)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('index'))
+        self.assertIsNone(response.context)
+        self.assertEqual(len(response.content), len(self.response.content))
+        self.assertContains(response, self.recipe.title)
+
+    def test_normalized_tags(self):
+        self.client.get(reverse('index'), data={'tag': ['LUNCH', 'BREAKFAST']})
+        response = self.client.get(reverse('index'), data={'tag': ['BREAKFAST', 'LUNCH', 'LUNCH']})
+        self.assertIsNone(response.context)
+
+        response = self.client.get(reverse('index'), data={'tag': 'BREAKFAST'})
+        self.assertIsNotNone(response.context)
+
+    def test_unknown_params_are_not_cached(self):
+        self.client.get(reverse('index'), data={'utm': 'mail'})
+        response = self.client.get(reverse('index'), data={'utm': 'mail'})
+        self.assertIsNotNone(response.context)
+
+    def test_csrf_token(self):
+        self.assertNotContains(self.response, '__csrf_token__')
+        response = Client().get(reverse('index'))
+        self.assertIsNone(response.context)
+        self.assertNotContains(response, '__csrf_token__')
+        self.assertIn('csrftoken', response.cookies)
+
+    def test_recipe_change(self):
+        self.recipe.title = 'Новое название'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.save()
+        response = self.client.get(reverse('index'))
+        self.assertIsNotNone(response.context)
+        self.assertContains(response, 'Новое название')
+
+    def test_invalidated_after_commit(self):
+        self.recipe.title = 'Новое название'
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.recipe.save()
+            # до коммита страница отдается из кэша, а не рендерится и не кэшируется заново
+            self.assertIsNone(self.client.get(reverse('index')).context)
+        for callback in callbacks:
+            callback()
+        self.assertIsNotNone(self.client.get(reverse('index')).context)
+
+    def test_detail_and_author_pages(self):
+        detail_url = reverse('recipe', kwargs={'recipe_slug': self.recipe.slug})
+        author_url = reverse('author_recipe', kwargs={'username': self.recipe.author.username})
+        self.client.get(detail_url)
+        self.client.get(author_url)
+        self.assertIsNone(self.client.get(detail_url).context)
+        self.assertIsNone(self.client.get(author_url).context)
+
+        author = self.recipe.author
+        author.last_name = 'Коннор'
+        with self.captureOnCommitCallbacks(execute=True):
+            author.save()
+        self.assertContains(self.client.get(detail_url), 'Коннор')
+        self.assertContains(self.client.get(author_url), 'Коннор')
+        self.assertContains(self.client.get(reverse('index')), 'Коннор')
+
+    def test_visitor_with_purchases(self):
+        session = self.client.session
+        session.update({
+            "purchase_id": str(uuid.uuid4()),
+        })
+        session.save()
+        ShopList.objects.create(session_key=self.client.session.get('purchase_id'), recipe=self.recipe)
+        response = self.client.get(reverse('index'))
+        self.assertIsNotNone(response.context)
+
+    def test_authorized_user(self):
+        User.objects.create_user(username='sarah', email='connor@skynet.com', password='test')
+        self.client.login(email='connor@skynet.com', password='test')
+        response = self.client.get(reverse('index'))
+        self.assertIsNotNone(response.context)
@@ -0,0 +1,70 @@
+from django.test import TestCase, Client
+from django.urls import reverse
+from app.models import Recipe
+from app.recipe_index import recipe_index
+
+
+class TestCursorPagination(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+        # индекс в памяти мог загрузиться внутри транзакции другого теста, которая откатилась
+        recipe_index.invalidate()
+        self.response = self.client.get(reverse('index'))
+
+    def test_first_page(self):
+        page = self.response.context['page_obj']
+        self.assertTrue(page.is_cursor)
+        self.assertEqual(self.response.context['recipes'].count(), 6)
+        self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+
+    def test_next_and_previous_page(self):
+        page = self.response.context['page_obj']
+        response = self.client.get(reverse('index'), data={'cursor': page.next_cursor})
+        next_page = response.context['page_obj']
+        self.assertEqual(response.context['recipes'].count(), 2)
+        self.assertFalse(next_page.has_next())
+        self.assertTrue(next_page.has_previous())
+
+        ids = list(Recipe.objects.order_by('-pub_date', '-id').values_list('id', flat=True))
+        self.assertEqual([recipe.id for recipe in response.context['recipes']], ids[6:])
+
+        response = self.client.get(reverse('index'), data={'cursor': next_page.previous_cursor})
+        self.assertEqual([recipe.id for recipe in response.context['recipes']], ids[:6])
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_cursor_keeps_tags(self):
+        page = self.response.context['page_obj']
+        html = f'href="?cursor={page.next_cursor}"'
+        self.assertContains(self.response, html)
+
+        response = self.client.get(reverse('index'), data={'tag': 'BREAKFAST'})
+        self.assertEqual(response.context['recipes'].count(), 5)
+        self.assertFalse(response.context['page_obj'].has_next())
+
+        # еще два завтрака, чтобы у страницы с тегом была следующая
+        breakfast = Recipe.tags_to_mask(['BREAKFAST'])
+        for recipe in Recipe.objects.filter(tags=breakfast)[:2]:
+            recipe.pk, recipe.slug = None, f'{recipe.slug}-copy'
+            recipe.save()
+        recipe_index.invalidate()
+        response = self.client.get(reverse('index'), data={'tag': 'BREAKFAST'})
+        page = response.context['page_obj']
+        self.assertTrue(page.has_next())
+        self.assertContains(response, f'href="?tag=BREAKFAST&amp;cursor={page.next_cursor}"')
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('index'), data={'cursor': 'broken'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_old_page_urls(self):
+        response = self.client.get(reverse('index'), data={'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['recipes'].count(), 2)
+        self.assertEqual(response.context['page_obj'].number, 2)
+
+        response = self.client.get(reverse('index'), data={'page': 100})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,223 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from app import pdf_jobs, pdf_pool
+from app.models import Recipe, User
+from app.pdf_pool import RendererPool
+from app.services import render_pdf
+
+
+class TestPDFJobs(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+
+        self.user = User.objects.create_user(
+            username='sarah', email='connor@skynet.com', password='test')
+        self.client.login(email='connor@skynet.com', password='test')
+        self.recipe = Recipe.objects.get(id=38)
+        self.client.post(reverse('add_purchases'), data={'id': self.recipe.id}, content_type='application/json')
+
+        self.root = tempfile.mkdtemp()
+        # очередь и блокировки проверяются на рендеринге в процессе теста, пул - в TestRendererPool
+        self.settings = override_settings(PDF_CACHE_ROOT=self.root, PDF_RENDER_POOL=0)
+        self.settings.enable()
+        pdf_jobs._pruned_at = None
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def get_key(self):
+        return pdf_jobs.get_key(pdf_jobs.get_rows(
+            self.user.shop_ingredients.select_related('ingredient').order_by('ingredient__title')
+        ))
+
+    def test_pdf(self):
+        response = self.client.get(reverse('pdf'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content)[:4], b'%PDF')
+        self.assertIn('inline', response['Content-Disposition'])
+
+        response = self.client.get(reverse('pdf'), {'download': 1})
+        self.assertIn('attachment', response['Content-Disposition'])
+
+    @override_settings(PDF_WAIT_TIMEOUT=0)
+    def test_pending(self):
+        response = self.client.get(reverse('pdf'), HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 202)
+        key = self.get_key()
+        self.assertEqual(response.json(), {
+            'status': 'pending', 'status_url': reverse('pdf_status', kwargs={'key': key})
+        })
+
+        self.assertEqual(pdf_jobs.wait(key, 30), pdf_jobs.READY)
+        response = self.client.get(reverse('pdf_status', kwargs={'key': key}))
+        self.assertEqual(response.json(), {'status': 'ready', 'url': reverse('pdf')})
+        self.assertEqual(self.client.get(reverse('pdf')).status_code, 200)
+
+    @override_settings(PDF_WAIT_TIMEOUT=0)
+    def test_pending_page(self):
+        response = self.client.get(reverse('pdf'))
+        self.assertEqual(response.status_code, 202)
+        self.assertContains(response, 'http-equiv="refresh"', status_code=202)
+        pdf_jobs.wait(self.get_key(), 30)
+
+    def test_unchanged_list_is_not_rendered_again(self):
+        with mock.patch('app.pdf_jobs.render_pdf', side_effect=render_pdf) as render:
+            self.client.get(reverse('pdf'))
+            self.client.get(reverse('pdf'))
+            self.assertEqual(render.call_count, 1)
+
+            self.client.post(reverse('add_purchases'), data={'id': 39}, content_type='application/json')
+            self.client.get(reverse('pdf'))
+            self.assertEqual(render.call_count, 2)
+
+    def test_same_list_shares_pdf(self):
+        self.client.get(reverse('pdf'))
+        client = Client()
+        client.post(reverse('add_purchases'), data={'id': self.recipe.id}, content_type='application/json')
+        with mock.patch('app.pdf_jobs.render_pdf') as render:
+            self.assertEqual(client.get(reverse('pdf')).status_code, 200)
+        render.assert_not_called()
+
+    def test_render_error(self):
+        with mock.patch('app.pdf_jobs.render_pdf', return_value=None):
+            response = self.client.get(reverse('pdf'))
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(pdf_jobs.get_status(self.get_key()), pdf_jobs.ERROR)
+
+    @override_settings(PDF_QUEUE_SIZE=0)
+    def test_busy(self):
+        response = self.client.get(reverse('pdf'))
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+    def test_fresh_lock_is_kept(self):
+        key = self.get_key()
+        with open(pdf_jobs.get_path(key, '.lock'), 'wb') as file:
+            file.write(b'other')
+        with mock.patch('app.pdf_jobs.render_pdf') as render:
+            self.assertEqual(pdf_jobs.start(key, []), pdf_jobs.PENDING)
+        render.assert_not_called()
+        with open(pdf_jobs.get_path(key, '.lock'), 'rb') as file:
+            self.assertEqual(file.read(), b'other')
+
+    def test_stale_lock_is_taken_over(self):
+        key = self.get_key()
+        lock = pdf_jobs.get_path(key, '.lock')
+        open(lock, 'wb').close()
+        past = time.time() - 2 * 120
+        os.utime(lock, (past, past))
+        with override_settings(PDF_JOB_TIMEOUT=120):
+            pdf_jobs.start(key, [])
+            self.assertEqual(pdf_jobs.wait(key, 30), pdf_jobs.READY)
+        self.assertFalse(os.path.exists(lock))
+
+    def test_foreign_lock_is_not_released(self):
+        key = self.get_key()
+        token = pdf_jobs._acquire(key)
+        self.assertIsNone(pdf_jobs._acquire(key))
+        # блокировку перехватил другой процесс
+        with open(pdf_jobs.get_path(key, '.lock'), 'wb') as file:
+            file.write(b'other')
+        pdf_jobs._release(key, token)
+        self.assertTrue(os.path.exists(pdf_jobs.get_path(key, '.lock')))
+
+    def test_prune(self):
+        old = pdf_jobs.get_path('old')
+        old_error = pdf_jobs.get_path('old', '.err')
+        error = pdf_jobs.get_path('new', '.err')
+        past = time.time() - 2 * 60
+        for path in (old, old_error, error):
+            open(path, 'wb').close()
+        os.utime(old, (past, past))
+        os.utime(old_error, (past, past))
+        with override_settings(PDF_CACHE_TTL=60, PDF_JOB_TIMEOUT=60), \
+                mock.patch('app.pdf_jobs._prune', wraps=pdf_jobs._prune) as prune:
+            self.client.get(reverse('pdf'))
+            # чистка идет в фоновом потоке
+            deadline = time.monotonic() + 30
+            while (os.path.exists(old) or os.path.exists(old_error)) and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertFalse(os.path.exists(old))
+            self.assertFalse(os.path.exists(old_error))
+            self.assertTrue(os.path.exists(error))
+
+            # следующий PDF чистку не запускает
+            self.client.post(reverse('add_purchases'), data={'id': 39}, content_type='application/json')
+            self.client.get(reverse('pdf'))
+        prune.assert_called_once()
+
+    def test_unknown_status(self):
+        response = self.client.get(reverse('pdf_status', kwargs={'key': 'test'}))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(PDF_RENDER_POOL=1, PDF_WAIT_TIMEOUT=0)
+    def test_pool(self):
+        self.use_pool(RendererPool(1, max_jobs=10, timeout=30))
+        self.client.get(reverse('pdf'))
+        self.assertEqual(pdf_jobs.wait(self.get_key(), 30), pdf_jobs.READY)
+        response = self.client.get(reverse('pdf'))
+        self.assertEqual(b''.join(response.streaming_content)[:4], b'%PDF')
+
+    @override_settings(PDF_RENDER_POOL=1, PDF_WAIT_TIMEOUT=0)
+    def test_hung_render_frees_slot(self):
+        self.use_pool(RendererPool(1, max_jobs=10, timeout=0.01))
+        key = self.get_key()
+        self.client.get(reverse('pdf'))
+        self.assertEqual(pdf_jobs.wait(key, 30), pdf_jobs.ERROR)
+        # процесс убит, блокировка снята, место в очереди освободилось
+        self.assertEqual(pdf_jobs._futures, {})
+        self.assertFalse(os.path.exists(pdf_jobs.get_path(key, '.lock')))
+
+    def use_pool(self, pool):
+        pdf_pool._pool = pool
+        self.addCleanup(setattr, pdf_pool, '_pool', None)
+        self.addCleanup(pool.close)
+
+
+class TestRendererPool(TestCase):
+
+    def setUp(self):
+        self.context = {'totals': [{'title': 'соль', 'total': 5, 'dimension': 'г'}]}
+
+    def get_pool(self, **kwargs):
+        pool = RendererPool(1, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_render(self):
+        pool = self.get_pool(max_jobs=10, timeout=30)
+        self.assertEqual(pool.render(pdf_jobs.TEMPLATE, self.context)[:4], b'%PDF')
+
+    def test_recycle(self):
+        pool = self.get_pool(max_jobs=2, timeout=30)
+        first = pool.idle.queue[0]
+        pool.render(pdf_jobs.TEMPLATE, self.context)
+        pool.render(pdf_jobs.TEMPLATE, self.context)
+        # замена прогревается, пока задания собирает старый процесс
+        self.assertIs(pool.idle.queue[0], first)
+        self.assertTrue(first.successor.ready(30))
+        pool.render(pdf_jobs.TEMPLATE, self.context)
+        second = pool.idle.queue[0]
+        self.assertIsNot(second, first)
+        self.assertEqual(second.jobs, 0)
+        self.assertEqual(pool.render(pdf_jobs.TEMPLATE, self.context)[:4], b'%PDF')
+
+    def test_timeout(self):
+        pool = self.get_pool(max_jobs=10, timeout=0.01)
+        first = pool.idle.queue[0]
+        with self.assertRaises(TimeoutError):
+            pool.render(pdf_jobs.TEMPLATE, self.context)
+        self.assertFalse(first.process.is_alive())
+        self.assertIsNot(pool.idle.queue[0], first)
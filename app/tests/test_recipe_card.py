@@ -0,0 +1,43 @@
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.urls import reverse
+from app.models import User, Recipe
+from app.services import get_recipe_card_key
+
+
+class TestRecipeCardCache(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+        cache.clear()
+        self.recipe = Recipe.objects.order_by('-pub_date').first()
+        self.response = self.client.get(reverse('index'))
+
+    def test_card_is_cached(self):
+        self.assertIsNotNone(cache.get(get_recipe_card_key(self.recipe)))
+
+    def test_recipe_change(self):
+        self.recipe.title = 'Новое название'
+        self.recipe.save()
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Новое название')
+
+    def test_author_change(self):
+        author = self.recipe.author
+        author.first_name = 'Джон'
+        author.save()
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Джон')
+
+    def test_recipe_delete(self):
+        key = get_recipe_card_key(self.recipe)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        self.assertIsNone(cache.get(key))
+
+    def test_login_keeps_cards(self):
+        author = User.objects.get(id=self.recipe.author_id)
+        author.save(update_fields=['last_login'])
+        self.assertIsNotNone(cache.get(get_recipe_card_key(Recipe.objects.get(id=self.recipe.id))))
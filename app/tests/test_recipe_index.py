@@ -0,0 +1,103 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+from app.models import User, Recipe
+from app.recipe_index import VERSION_KEY, RecipeIndex, get_change_key, recipe_index
+
+
+class TestRecipeIndex(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+        recipe_index.load()
+        self.ordered = list(Recipe.objects.order_by('-pub_date', '-id').values_list('id', flat=True))
+
+    def test_page(self):
+        ids, has_next, has_previous = recipe_index.page({}, 6)
+        self.assertEqual(ids, self.ordered[:6])
+        self.assertTrue(has_next)
+        self.assertFalse(has_previous)
+
+    def test_tag_filter(self):
+        masks = Recipe.masks_matching(Recipe.tags_to_mask(['BREAKFAST']))
+        ids, _, _ = recipe_index.page({'masks': masks}, 6)
+        expected = Recipe.objects.filter(tags__in=masks).order_by('-pub_date', '-id')
+        self.assertEqual(ids, list(expected.values_list('id', flat=True)))
+
+    def test_author_filter(self):
+        masks = Recipe.masks_matching(Recipe.tags_to_mask(['BREAKFAST']))
+        ids, _, _ = recipe_index.page({'masks': masks, 'username': 'veronika'}, 6)
+        expected = Recipe.objects.filter(tags__in=masks, author__username='veronika')
+        self.assertEqual(ids, list(expected.values_list('id', flat=True)))
+
+        ids, _, _ = recipe_index.page({'username': 'nobody'}, 6)
+        self.assertEqual(ids, [])
+
+    def test_index_follows_signals(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.get(id=self.ordered[0]).delete()
+        ids, _, _ = recipe_index.page({}, 6)
+        self.assertNotIn(self.ordered[0], ids)
+
+        author = User.objects.get(username='veronika')
+        author.username = 'nika'
+        with self.captureOnCommitCallbacks(execute=True):
+            author.save()
+        ids, _, _ = recipe_index.page({'username': 'nika'}, 6)
+        self.assertEqual(len(ids), 2)
+
+    def test_login_is_not_logged(self):
+        User.objects.create_user(username='sarah', email='connor@skynet.com', password='test')
+        version = cache.get(VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.login(email='connor@skynet.com', password='test')
+        self.assertEqual(cache.get(VERSION_KEY), version)
+
+    def test_rolled_back_recipe(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            Recipe.objects.get(id=self.ordered[0]).delete()
+        self.assertTrue(callbacks)
+        ids, _, _ = recipe_index.page({}, 6)
+        # транзакция не закоммичена: индекс не меняется
+        self.assertIn(self.ordered[0], ids)
+
+    def test_other_process_applies_changes(self):
+        other = RecipeIndex()
+        other.load()
+        recipe_index.add(Recipe(id=1000, author_id=1, tags=1, pub_date=timezone.now()))
+        recipe_index.remove(self.ordered[0])
+        # изменения берутся из журнала в кэше, таблица рецептов не перечитывается
+        with self.assertNumQueries(0):
+            ids, _, _ = other.page({}, 6)
+        self.assertEqual(ids, [1000] + self.ordered[1:6])
+
+    def test_other_process_reloads_without_changes(self):
+        other = RecipeIndex()
+        other.load()
+        recipe_index.remove(self.ordered[0])
+        cache.delete(get_change_key(cache.get(VERSION_KEY)))
+        with self.assertNumQueries(2):
+            ids, _, _ = other.page({}, 6)
+        self.assertEqual(ids, self.ordered[:6])
+
+    def test_other_process_reloads_without_atomic_incr(self):
+        other = RecipeIndex()
+        other.load()
+        self.addCleanup(cache.delete, VERSION_KEY)
+        with mock.patch('app.recipe_index.has_atomic_incr', return_value=False):
+            recipe_index.add(Recipe(id=1000, author_id=1, tags=1, pub_date=timezone.now()))
+        self.assertIsNone(cache.get(get_change_key(other._version + 1)))
+        with self.assertNumQueries(2):
+            ids, _, _ = other.page({}, 6)
+        self.assertEqual(ids, self.ordered[:6])
+
+    def test_stale_index(self):
+        recipe_index.add(Recipe(id=1000, author_id=1, tags=1, pub_date=timezone.now()))
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['recipes'].count(), 6)
+        self.assertEqual([recipe.id for recipe in response.context['recipes']], self.ordered[:6])
@@ -0,0 +1,64 @@
+from unittest import mock
+
+from django.test import TestCase, Client
+from django.urls import reverse
+from app.models import User, Recipe
+from app.search import search_recipe_ids
+
+
+class TestSearch(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+
+    def test_search_page(self):
+        response = self.client.get(reverse('search'), {'q': 'панкейки'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([recipe.id for recipe in response.context['recipes']], [37])
+        self.assertContains(response, 'Пышные панкейки без разрыхлителя')
+
+    def test_empty_query(self):
+        response = self.client.get(reverse('search'), {'q': '"*'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['recipes'], [])
+
+    def test_prefix_and_all_terms(self):
+        self.assertEqual(search_recipe_ids('пышн панк'), [37])
+        self.assertEqual(search_recipe_ids('пышные креветки'), [])
+
+    def test_title_ranked_first(self):
+        recipe = Recipe.objects.get(id=38)
+        recipe.text = 'Подавать с панкейками'
+        recipe.save()
+        self.assertEqual(search_recipe_ids('панкейк'), [37, 38])
+
+    def test_ingredient_search(self):
+        self.assertEqual(set(search_recipe_ids('креветки')), {34, 38})
+
+    def test_index_follows_changes(self):
+        recipe = Recipe.objects.get(id=38)
+        recipe.title = 'Ёжики в тумане'
+        recipe.save()
+        self.assertEqual(search_recipe_ids('ежики'), [38])
+
+        recipe.ingredient.clear()
+        self.assertEqual(set(search_recipe_ids('креветки')), {34})
+
+        recipe.delete()
+        self.assertEqual(search_recipe_ids('ежики'), [])
+
+    def test_fallback_without_index(self):
+        with mock.patch('app.search.get_backend', return_value=None):
+            self.assertEqual(set(search_recipe_ids('креветки')), {34, 38})
+
+    def test_search_api(self):
+        response = self.client.get(reverse('search_api'), {'q': 'панкейки'})
+        recipe = Recipe.objects.get(id=37)
+        self.assertEqual(response.json(), [{
+            'id': 37,
+            'title': recipe.title,
+            'author': User.objects.get(id=recipe.author_id).get_full_name(),
+            'url': recipe.get_absolute_url(),
+        }])
@@ -0,0 +1,64 @@
+import csv
+import io
+
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from app.models import Recipe, ShopListIngredient, User
+
+
+class TestShopExports(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+
+        self.user = User.objects.create_user(
+            username='sarah', email='connor@skynet.com', password='test')
+        self.client.login(email='connor@skynet.com', password='test')
+        for recipe in Recipe.objects.filter(id__in=(34, 38)):
+            self.client.post(reverse('add_purchases'), data={'id': recipe.id}, content_type='application/json')
+        self.totals = list(ShopListIngredient.objects.filter(user=self.user).order_by(
+            'ingredient__title'
+        ).values_list('ingredient__title', 'total', 'ingredient__dimension'))
+
+    def get(self, export_format, **params):
+        response = self.client.get(reverse('pdf'), {'format': export_format, **params})
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_text(self):
+        response, content = self.get('txt')
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertEqual(content.splitlines()[2:], [
+            f'{title} - {total} {dimension}' for title, total, dimension in self.totals
+        ])
+
+    def test_csv(self):
+        response, content = self.get('csv', download=1)
+        self.assertIn('attachment; filename="Shop list.csv"', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(content.lstrip('\ufeff'))))
+        self.assertEqual(rows[0], ['Ингредиент', 'Количество', 'Единицы измерения'])
+        self.assertEqual(rows[1:], [[title, str(total), dimension] for title, total, dimension in self.totals])
+
+    def test_markdown(self):
+        _, content = self.get('md')
+        self.assertTrue(content.startswith('# Список покупок'))
+        title, total, dimension = self.totals[0]
+        self.assertIn(f'- [ ] {title} — {total} {dimension}\n', content)
+
+    def test_single_query(self):
+        response = self.client.get(reverse('pdf'), {'format': 'txt'})
+        # строки читаются, когда ответ уже отдается
+        with self.assertNumQueries(1):
+            b''.join(response.streaming_content)
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('pdf'), {'format': 'docx'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_anonymous_empty_list(self):
+        self.client.logout()
+        _, content = self.get('txt')
+        self.assertEqual(content, 'Список покупок\n\n')
@@ -1,6 +1,7 @@
+import tempfile
 import uuid
 
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from app.models import User, Recipe, ShopList
 
@@ -73,7 +74,8 @@ class TestAuthorizedUsers(TestCase):
         html = '<button class="button button_style_blue">Скачать список</button>'
         self.assertContains(self.response, html, html=True)
 
-        response = self.client.get(reverse('pdf'), content_type='application/pdf')
+        with tempfile.TemporaryDirectory() as root, override_settings(PDF_CACHE_ROOT=root, PDF_RENDER_POOL=0):
+            response = self.client.get(reverse('pdf'), content_type='application/pdf')
         self.assertEqual(response.status_code, 200)
 
 
@@ -153,7 +155,8 @@ class TestUnauthorizedUsers(TestCase):
         response = self.client.get(reverse('purchases'))
         self.assertContains(response, html, html=True)
 
-        response = self.client.get(reverse('pdf'), content_type='application/pdf')
+        with tempfile.TemporaryDirectory() as root, override_settings(PDF_CACHE_ROOT=root, PDF_RENDER_POOL=0):
+            response = self.client.get(reverse('pdf'), content_type='application/pdf')
         self.assertEqual(response.status_code, 200)
 
 
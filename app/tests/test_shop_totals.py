@@ -0,0 +1,137 @@
+from django.db.models import Sum
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from app.models import Recipe, RecipeIngredient, ShopList, ShopListIngredient, User
+from app.shop_totals import rebuild_totals
+
+
+def get_totals(**owner):
+    return dict(ShopListIngredient.objects.filter(**owner).values_list('ingredient_id', 'total'))
+
+
+def get_expected(**owner):
+    """Сводный список, посчитанный агрегацией, как раньше считался pdf"""
+    lookups = {f'recipe__purchases__{key}': value for key, value in owner.items()}
+    return dict(RecipeIngredient.objects.filter(**lookups).order_by().values('ingredient_id').annotate(
+        total=Sum('ing_count')
+    ).values_list('ingredient_id', 'total'))
+
+
+class TestAuthorizedUsers(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+
+        self.user = User.objects.create_user(
+            username='sarah', email='connor@skynet.com', password='test')
+        self.client.login(email='connor@skynet.com', password='test')
+        self.recipes = list(Recipe.objects.filter(id__in=(34, 38)).order_by('id'))
+
+    def add(self, recipe):
+        return self.client.post(reverse('add_purchases'), data={'id': recipe.id}, content_type='application/json')
+
+    def remove(self, recipe):
+        return self.client.delete(reverse('remove_purchases', kwargs={'id': recipe.id}))
+
+    def test_fixture_totals(self):
+        user = User.objects.get(pk=2)
+        self.assertEqual(get_totals(user=user), get_expected(user=user))
+
+    def test_add_and_remove(self):
+        for recipe in self.recipes:
+            self.add(recipe)
+        totals = get_totals(user=self.user)
+        self.assertEqual(totals, get_expected(user=self.user))
+        shared = set(
+            self.recipes[0].recipe_ingredients.values_list('ingredient_id', flat=True)
+        ) & set(self.recipes[1].recipe_ingredients.values_list('ingredient_id', flat=True))
+        self.assertTrue(shared)
+        self.assertEqual(
+            ShopListIngredient.objects.get(user=self.user, ingredient_id=shared.pop()).recipes, 2
+        )
+
+        self.remove(self.recipes[0])
+        self.assertEqual(get_totals(user=self.user), get_expected(user=self.user))
+        self.remove(self.recipes[1])
+        self.assertEqual(get_totals(user=self.user), {})
+
+    def test_batch(self):
+        self.client.post(reverse('batch'), data={'operations': [
+            {'action': 'add', 'kind': 'purchase', 'id': recipe.id} for recipe in self.recipes
+        ]}, content_type='application/json')
+        self.assertEqual(get_totals(user=self.user), get_expected(user=self.user))
+
+        self.client.post(reverse('batch'), data={'operations': [
+            {'action': 'remove', 'kind': 'purchase', 'id': self.recipes[1].id}
+        ]}, content_type='application/json')
+        self.assertEqual(get_totals(user=self.user), get_expected(user=self.user))
+
+    def test_orm_changes(self):
+        purchase = ShopList.objects.create(user=self.user, recipe=self.recipes[0])
+        self.assertEqual(get_totals(user=self.user), get_expected(user=self.user))
+        purchase.delete()
+        self.assertEqual(get_totals(user=self.user), {})
+
+    def test_listed_recipe_edit(self):
+        recipe = Recipe.objects.get(author__username='veronika', id=37)
+        self.add(recipe)
+        self.client.logout()
+        self.client.login(email='veronika@mail.ru', password='test')
+        rows = list(recipe.recipe_ingredients.values_list('ingredient__title', 'ing_count'))
+        titles = [title for title, _ in rows[1:]] + ['куриные грудки']
+        counts = [count * 2 for _, count in rows[1:]] + [400]
+        response = self.client.post(reverse('edit_recipe', kwargs={'recipe_slug': recipe.slug}), data={
+            'title': recipe.title, 'BREAKFAST': ['on'], 'text': recipe.text, 'time': recipe.time,
+            'nameIngredient': titles, 'valueIngredient': counts,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(get_totals(user=self.user), get_expected(user=self.user))
+        self.assertEqual(sorted(get_totals(user=self.user).values()), sorted(counts))
+
+    def test_recipe_delete(self):
+        self.add(self.recipes[0])
+        self.add(self.recipes[1])
+        self.recipes[0].delete()
+        self.assertEqual(get_totals(user=self.user), get_expected(user=self.user))
+
+    def test_shop_list_page(self):
+        self.add(self.recipes[0])
+        response = self.client.get(reverse('purchases'))
+        item = ShopListIngredient.objects.filter(user=self.user).select_related('ingredient').first()
+        self.assertContains(response, f'{item.ingredient.title} - {item.total} {item.ingredient.dimension}')
+
+    def test_rebuild(self):
+        for recipe in self.recipes:
+            self.add(recipe)
+        totals = list(ShopListIngredient.objects.order_by('user', 'session_key', 'ingredient').values_list(
+            'user', 'session_key', 'ingredient', 'total', 'recipes'
+        ))
+        rebuild_totals()
+        self.assertEqual(list(ShopListIngredient.objects.order_by('user', 'session_key', 'ingredient').values_list(
+            'user', 'session_key', 'ingredient', 'total', 'recipes'
+        )), totals)
+
+
+class TestUnauthorizedUsers(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+        self.recipe = Recipe.objects.get(id=38)
+
+    def test_session_totals_and_sign_up(self):
+        self.client.post(reverse('add_purchases'), data={'id': self.recipe.id}, content_type='application/json')
+        session_key = self.client.session.get('purchase_id')
+        self.assertEqual(get_totals(session_key=session_key), get_expected(session_key=session_key))
+
+        self.client.post(reverse('signup'), data={
+            'first_name': 'Sarah', 'last_name': 'Connor', 'username': 'sarah',
+            'email': 'connor@skynet.com', 'password1': 'Te5t_pa55word', 'password2': 'Te5t_pa55word',
+        })
+        user = User.objects.get(username='sarah')
+        self.assertEqual(get_totals(user=user), get_expected(user=user))
+        self.assertTrue(get_totals(user=user))
@@ -1,6 +1,10 @@
+from unittest import mock
+
+from django.db import connection
 from django.test import TestCase, Client
 from django.urls import reverse
-from app.models import User, Subscription
+from app.models import User, Recipe, Subscription
+from app.services import get_latest_recipe_ids
 
 
 class TestAuthorizedUsers(TestCase):
@@ -19,7 +23,7 @@ class TestAuthorizedUsers(TestCase):
 
     def test_subscription_page(self):
         self.assertEqual(self.response.status_code, 200)
-        self.assertEqual(self.response.context['authors'].count(), 1)
+        self.assertEqual(len(self.response.context['authors']), 1)
 
     def test_add_subscriptions(self):
         self.author = User.objects.get(username='aziz')
@@ -29,7 +33,7 @@ class TestAuthorizedUsers(TestCase):
 
         response = self.client.get(reverse('subscriptions'))
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.context['authors'].count(), 2)
+        self.assertEqual(len(response.context['authors']), 2)
 
     def test_user_subscribes_author_for_the_second_time(self):
         response = self.client.post(reverse('add_subscriptions'), data={'id': self.author.id},
@@ -45,7 +49,7 @@ class TestAuthorizedUsers(TestCase):
         self.assertContains(response, '{"success": true}')
 
         response = self.client.get(reverse('subscriptions'))
-        self.assertEqual(response.context['authors'].count(), 0)
+        self.assertEqual(len(response.context['authors']), 0)
 
     def test_user_remove_subscribes_author_for_the_second_time(self):
         response = self.client.delete(reverse('remove_subscriptions', kwargs={'id': self.author.id}))
@@ -54,6 +58,19 @@ class TestAuthorizedUsers(TestCase):
         response = self.client.delete(reverse('remove_subscriptions', kwargs={'id': self.author.id}))
         self.assertContains(response, '{"success": false}')
 
+    def test_subscriptions_missing_author(self):
+        response = self.client.post(reverse('add_subscriptions'), data={'id': 100500},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.delete(reverse('remove_subscriptions', kwargs={'id': 100500}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_subscribe_to_yourself(self):
+        response = self.client.post(reverse('add_subscriptions'), data={'id': self.user.id},
+                                    content_type='application/json')
+        self.assertContains(response, '{"success": false}')
+        self.assertFalse(Subscription.objects.filter(user=self.user, author=self.user).exists())
+
     def test_recipe_author_full_name(self):
         html = '<h2 class="card-user__title">Veronika Jonson</h2>'
         self.assertContains(self.response, html, count=1, html=True)
@@ -80,11 +97,27 @@ class TestAuthorizedUsers(TestCase):
         self.author = User.objects.get(username='test_user')
         self.subscription = Subscription.objects.create(user=self.user, author=self.author)
         response = self.client.get(reverse('subscriptions'))
-        self.assertEqual(response.context['authors'].count(), 2)
+        self.assertEqual(len(response.context['authors']), 2)
         self.assertEqual(response.context['authors'][0].recipes.all().count(), 4)
         html = '<a href="/recipe/test_user/"class="card-user__link link">Еще 1 рецептов...</a>'
         self.assertContains(response, html, html=True)
 
+    def test_author_latest_recipes(self):
+        self.author = User.objects.get(username='test_user')
+        Subscription.objects.create(user=self.user, author=self.author)
+        response = self.client.get(reverse('subscriptions'))
+        author = response.context['authors'][0]
+        expected = self.author.recipes.order_by('-pub_date', '-id')[:3]
+        self.assertEqual([recipe.id for recipe in author.latest_recipes], [recipe.id for recipe in expected])
+        self.assertEqual(author.recipe_count, 4)
+
+    def test_latest_recipes_fallback(self):
+        author_ids = list(Recipe.objects.values_list('author_id', flat=True).distinct())
+        ids = get_latest_recipe_ids(author_ids, 3)
+        with mock.patch.object(connection.features, 'supports_over_clause', False):
+            fallback_ids = get_latest_recipe_ids(author_ids, 3)
+        self.assertEqual(sorted(ids), sorted(fallback_ids))
+
 
 class TestUnauthorizedUsers(TestCase):
     fixtures = ['db_test.json', ]
@@ -0,0 +1,115 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files import File
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from sorl.thumbnail import default, get_thumbnail
+
+from app import thumbnails
+from app.models import Recipe
+from app.thumbnail_kvstore import get_thumbnail_key, prefetch_thumbnails
+
+
+class TestThumbnailKVStore(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+        recipe = Recipe.objects.get(id=37)
+        with open('media/test/test_image_1.png', 'rb') as img:
+            recipe.image.save('test_kvstore.png', File(img))
+        self.image = recipe.image.name
+        # все рецепты первой страницы с одним и тем же загруженным фото
+        Recipe.objects.update(image=self.image)
+        self.sizes = [thumbnails.CARD_SIZE, thumbnails.LIST_SIZE]
+        for geometry, options in self.sizes:
+            get_thumbnail(self.image, geometry, **options)
+        default.kvstore.clear_local()
+        cache.clear()
+
+    def tearDown(self):
+        default.kvstore.clear_local()
+
+    def test_thumbnail_key(self):
+        # get_thumbnail_key повторяет приватную логику ThumbnailBackend из sorl-thumbnail==12.7.0,
+        # тест падает, если новая версия sorl считает ключ иначе
+        sizes = self.sizes + [
+            ('360x360', {**thumbnails.VARIANT_OPTIONS, 'format': 'PNG'}),
+            ('720x720', {**thumbnails.VARIANT_OPTIONS, 'format': 'JPEG'}),
+            ('100x50', {'crop': 'top', 'quality': 60, 'progressive': False}),
+        ]
+        for geometry, options in sizes:
+            self.assertEqual(
+                get_thumbnail_key(self.image, geometry, **options), get_thumbnail(self.image, geometry, **options).key
+            )
+        with override_settings(THUMBNAIL_PRESERVE_FORMAT=True, THUMBNAIL_QUALITY=70):
+            for geometry, options in sizes:
+                self.assertEqual(
+                    get_thumbnail_key(self.image, geometry, **options),
+                    get_thumbnail(self.image, geometry, **options).key
+                )
+
+    def test_local_lru(self):
+        geometry, options = thumbnails.CARD_SIZE
+        get_thumbnail(self.image, geometry, **options)
+        with mock.patch.object(cache, 'get') as cache_get, self.assertNumQueries(0):
+            get_thumbnail(self.image, geometry, **options)
+        cache_get.assert_not_called()
+
+    def test_prefetch(self):
+        images = [self.image] * 6
+        with self.assertNumQueries(1):
+            prefetch_thumbnails(images, self.sizes)
+        with mock.patch.object(cache, 'get') as cache_get, self.assertNumQueries(0):
+            for image in images:
+                for geometry, options in self.sizes:
+                    get_thumbnail(image, geometry, **options)
+        cache_get.assert_not_called()
+
+        # из общего кэша без запросов к базе
+        default.kvstore.clear_local()
+        with self.assertNumQueries(0):
+            prefetch_thumbnails(images, self.sizes)
+
+    def test_prefetch_missing(self):
+        with self.assertNumQueries(1):
+            prefetch_thumbnails(['recipes/missing.png'], self.sizes)
+        # отсутствие запомнено в общем кэше, база больше не спрашивается
+        with self.assertNumQueries(0):
+            prefetch_thumbnails(['recipes/missing.png'], self.sizes)
+
+    @override_settings(THUMBNAIL_LRU_SIZE=1)
+    def test_lru_size(self):
+        prefetch_thumbnails([self.image], self.sizes)
+        self.assertEqual(len(default.kvstore._local), 1)
+
+    @override_settings(THUMBNAIL_LRU_TTL=-1)
+    def test_lru_ttl(self):
+        prefetch_thumbnails([self.image], self.sizes)
+        geometry, options = thumbnails.LIST_SIZE
+        with mock.patch.object(cache, 'get', wraps=cache.get) as cache_get:
+            get_thumbnail(self.image, geometry, **options)
+        cache_get.assert_called()
+
+    def test_index_page(self):
+        with mock.patch('app.thumbnail_kvstore.KVStore.prefetch', autospec=True) as prefetch:
+            self.client.get(reverse('index'))
+        prefetch.assert_called_once()
+        _, keys = prefetch.call_args[0]
+        self.assertEqual(len(keys), 6 * len(thumbnails.get_picture_sizes('card')))
+
+    def test_cached_cards_skip_prefetch(self):
+        self.client.get(reverse('index'))
+        # карточки в кэше: миниатюры в них уже отрендерены
+        with mock.patch('app.thumbnail_kvstore.KVStore.prefetch', autospec=True) as prefetch:
+            self.client.get(reverse('index'))
+        prefetch.assert_not_called()
+
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        recipe.save()
+        with mock.patch('app.thumbnail_kvstore.KVStore.prefetch', autospec=True) as prefetch:
+            self.client.get(reverse('index'))
+        _, keys = prefetch.call_args[0]
+        self.assertEqual(len(keys), len(thumbnails.get_picture_sizes('card')))
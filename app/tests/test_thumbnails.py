@@ -0,0 +1,116 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+from sorl.thumbnail import base
+
+from app import thumbnails
+from app.models import Recipe
+
+
+class TestThumbnails(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        self.recipe = Recipe.objects.get(id=37)
+
+    def set_image(self):
+        with open('media/test/test_image_1.png', 'rb') as img:
+            self.recipe.image.save('test_thumbnails.png', File(img), save=False)
+
+    def test_generate(self):
+        self.set_image()
+        names = thumbnails.generate(self.recipe.image.name)
+        self.assertEqual(len(set(names)), len(thumbnails.SIZES) + len(thumbnails.get_variants()))
+        for name in names:
+            self.assertTrue(default_storage.exists(name))
+        # повторный вызов находит готовые миниатюры
+        with mock.patch('sorl.thumbnail.base.ThumbnailBackend._create_thumbnail') as create:
+            self.assertEqual(thumbnails.generate(self.recipe.image.name), names)
+        create.assert_not_called()
+
+    def test_missing_image(self):
+        with self.assertRaises(FileNotFoundError):
+            thumbnails.generate('recipes/missing.png')
+        self.assertIsNone(thumbnails.try_generate('recipes/missing.png'))
+
+    def test_template_sizes_are_generated(self):
+        self.set_image()
+        names = thumbnails.generate(self.recipe.image.name)
+        for size in thumbnails.THUMBNAILS:
+            thumbnail = thumbnails.get_recipe_thumbnail(self.recipe.image, size)
+            self.assertIn(thumbnail.name, names)
+        self.assertIsNone(thumbnails.get_recipe_thumbnail(None, 'card'))
+
+    def test_saved_image_is_submitted_after_commit(self):
+        self.set_image()
+        with mock.patch('app.thumbnails.submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.recipe.save()
+        submit.assert_called_once_with(self.recipe.image.name)
+
+    def test_other_fields_are_not_submitted(self):
+        with mock.patch('app.thumbnails.submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.recipe.save(update_fields=['title'])
+        submit.assert_not_called()
+
+    def test_background(self):
+        with mock.patch('app.thumbnails.generate', return_value=[]) as generate:
+            thumbnails.submit('recipes/test.png').result(30)
+        generate.assert_called_once_with('recipes/test.png')
+
+    def test_formats(self):
+        formats = [image_format for image_format, _ in thumbnails.get_formats()]
+        self.assertTrue(set(formats) <= {'AVIF', 'WEBP'})
+        # расширения современных форматов зарегистрированы в sorl при старте приложения
+        self.assertEqual(base.EXTENSIONS['AVIF'], 'avif')
+
+    def test_command(self):
+        self.set_image()
+        self.recipe.save()
+        out = StringIO()
+        with mock.patch('app.thumbnails.generate', return_value=[]) as generate:
+            call_command('build_thumbnails', workers=0, stdout=out)
+        images = Recipe.objects.exclude(image='').values_list('image', flat=True).distinct().count()
+        self.assertEqual(generate.call_count, images)
+        self.assertIn(f'Фото: {images}, с ошибками: 0', out.getvalue())
+
+
+class TestPictures(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+        self.recipe = Recipe.objects.get(id=37)
+        with open('media/test/test_image_1.png', 'rb') as img:
+            self.recipe.image.save('test_pictures.png', File(img))
+        # Pillow в тестах может быть собран без WebP и AVIF, варианты проверяются на PNG
+        formats = mock.patch('app.thumbnails.get_formats', return_value=(('PNG', 'image/png'),))
+        formats.start()
+        self.addCleanup(formats.stop)
+
+    def test_variants_are_generated(self):
+        names = thumbnails.generate(self.recipe.image.name)
+        self.assertEqual(len(names), len(thumbnails.SIZES) + len(thumbnails.get_variants()))
+        self.assertEqual(len(thumbnails.get_variants()), 4)
+        for name in names:
+            self.assertTrue(default_storage.exists(name))
+
+    def test_detail_page_picture(self):
+        response = self.client.get(reverse('recipe', kwargs={'recipe_slug': self.recipe.slug}))
+        sources = thumbnails.get_sources(self.recipe.image, 'detail')
+        self.assertEqual(len(sources), 1)
+        self.assertContains(response, f'srcset="{sources[0]["srcset"]}"')
+        self.assertContains(response, 'sizes="(max-width: 520px) 100vw, 480px"')
+        self.assertRegex(sources[0]['srcset'], r'^/media/cache/\S+\.png 480w, /media/cache/\S+\.png 960w$')
+
+    def test_card_picture(self):
+        response = self.client.get(reverse('index'))
+        sources = thumbnails.get_sources(self.recipe.image, 'card')
+        self.assertContains(response, f'<source type="image/png" srcset="{sources[0]["srcset"]}"')
@@ -0,0 +1,151 @@
+from io import BytesIO
+
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from app.forms import RecipeForm
+from app.models import User, Recipe
+from app.tests import use_temp_media
+
+
+def make_image(size, image_format, mode='RGB', color='red', orientation=None):
+    image = Image.new(mode, size, color)
+    content = BytesIO()
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        image.save(content, image_format, exif=exif)
+    else:
+        image.save(content, image_format)
+    return content.getvalue()
+
+
+@override_settings(RECIPE_IMAGE_MAX_SIDE=1600, RECIPE_IMAGE_QUALITY=85)
+class TestUploads(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+        use_temp_media(self)
+        User.objects.create_user(
+            username='sarah', email='connor@skynet.com', first_name='Sarah', last_name='connor', password='test'
+        )
+        self.client.login(email='connor@skynet.com', password='test')
+
+    def post_recipe(self, name, content):
+        return self.client.post(reverse('new_recipe'), data={
+            'title': 'test_title',
+            'nameIngredient': ['куриные грудки'],
+            'valueIngredient': ['400'],
+            'BREAKFAST': ['on'],
+            'text': 'test_test',
+            'image': SimpleUploadedFile(name, content),
+            'time': 35
+        })
+
+    def test_large_photo(self):
+        # ориентация 6: камера повернута, при показе фото поворачивается на 90 градусов
+        self.post_recipe('photo.jpeg', make_image((3000, 2000), 'JPEG', orientation=6))
+        recipe = Recipe.objects.get(title='test_title')
+        self.assertTrue(recipe.image.name.endswith('.jpg'))
+        with Image.open(recipe.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (1067, 1600))
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_transparent_png(self):
+        self.post_recipe('photo.png', make_image((400, 300), 'PNG', mode='RGBA', color=(0, 0, 0, 0)))
+        recipe = Recipe.objects.get(title='test_title')
+        with Image.open(recipe.image.path) as image:
+            self.assertEqual((image.format, image.mode, image.size), ('JPEG', 'RGB', (400, 300)))
+            self.assertEqual(image.getpixel((0, 0)), (255, 255, 255))
+
+    def test_broken_image(self):
+        form = RecipeForm(
+            data={'title': 'test_title', 'text': 'test_test', 'time': 35},
+            files={'image': SimpleUploadedFile('photo.png', b'not an image')}
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+
+@override_settings(RECIPE_IMAGE_MAX_UPLOAD_SIZE=100 * 2 ** 10)
+class TestUploadHandler(TestCase):
+    fixtures = ['db_test.json', ]
+
+    def setUp(self):
+        """создание тестового клиента"""
+        self.client = Client()
+        use_temp_media(self)
+        User.objects.create_user(
+            username='sarah', email='connor@skynet.com', first_name='Sarah', last_name='connor', password='test'
+        )
+        self.client.login(email='connor@skynet.com', password='test')
+
+    def upload(self, content):
+        request = RequestFactory().post('/', data={'title': 'test_title', 'image': SimpleUploadedFile('photo', content)})
+        receive = TemporaryFileUploadHandler.receive_data_chunk
+        with mock.patch.object(
+            TemporaryFileUploadHandler, 'receive_data_chunk', autospec=True, side_effect=receive
+        ) as write:
+            request.FILES
+        self.written = sum(len(call.args[1]) for call in write.call_args_list)
+        return request
+
+    def test_photo_is_spooled_to_disk(self):
+        request = self.upload(make_image((100, 100), 'PNG'))
+        self.assertIsInstance(request.FILES['image'], TemporaryUploadedFile)
+        self.assertFalse(hasattr(request, 'upload_errors'))
+
+    def test_large_file_is_rejected_early(self):
+        request = self.upload(b'\xff\xd8\xff' + b'0' * 2 ** 21)
+        self.assertNotIn('image', request.FILES)
+        self.assertEqual(request.POST['title'], 'test_title')
+        self.assertIn('image', request.upload_errors)
+        # на диск попадает не больше допустимого, остаток тела только дочитывается
+        self.assertLessEqual(self.written, 100 * 2 ** 10)
+        self.assertEqual(request._stream.remaining, 0)
+
+    def test_not_image_is_rejected_by_signature(self):
+        request = self.upload(b'<?php echo 1; ?>' + b'0' * 2 ** 19)
+        self.assertNotIn('image', request.FILES)
+        self.assertEqual(request.upload_errors['image'], 'Загрузите фото в формате JPEG, PNG, GIF или WebP')
+        self.assertEqual(self.written, 0)
+        self.assertEqual(request._stream.remaining, 0)
+
+    def test_new_recipe_form_error(self):
+        response = self.client.post(reverse('new_recipe'), data={
+            'title': 'test_title',
+            'nameIngredient': ['куриные грудки'],
+            'valueIngredient': ['400'],
+            'BREAKFAST': ['on'],
+            'text': 'test_test',
+            # поле фото в форме последнее, остальные поля приходят до него
+            'time': 35,
+            'image': SimpleUploadedFile('photo.png', b'GIF' + b'0' * 2 ** 10)
+        })
+        self.assertContains(response, 'Загрузите фото в формате JPEG, PNG, GIF или WebP')
+        self.assertNotContains(response, 'Обязательное поле')
+        self.assertFalse(Recipe.objects.filter(title='test_title').exists())
+
+    def test_edit_recipe_keeps_old_image(self):
+        recipe = Recipe.objects.filter(author__username='veronika').first()
+        self.client.login(email='veronika@mail.ru', password='test')
+        response = self.client.post(reverse('edit_recipe', kwargs={'recipe_slug': recipe.slug}), data={
+            'title': 'test_title',
+            'nameIngredient': ['куриные грудки'],
+            'valueIngredient': ['400'],
+            'BREAKFAST': ['on'],
+            'text': 'test_test',
+            'time': 35,
+            'image': SimpleUploadedFile('photo.jpg', b'\xff\xd8\xff' + b'0' * 2 ** 18)
+        })
+        self.assertContains(response, 'Размер файла не должен превышать')
+        recipe.refresh_from_db()
+        self.assertNotEqual(recipe.title, 'test_title')
@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    """
+    Хранилище ключей sorl: LRU в памяти процесса перед общим кэшем и базой.
+    Записи в LRU живут THUMBNAIL_LRU_TTL секунд, чтобы миниатюры, удаленные
+    другим процессом, не отдавались долго. Отсутствующие ключи в LRU не попадают:
+    миниатюру может создать другой процесс
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._local = OrderedDict()
+        self._local_lock = threading.Lock()
+
+    def _local_get(self, key):
+        with self._local_lock:
+            item = self._local.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return value
+
+    def _local_set(self, key, value):
+        with self._local_lock:
+            self._local[key] = (value, time.monotonic() + settings.THUMBNAIL_LRU_TTL)
+            self._local.move_to_end(key)
+            while len(self._local) > settings.THUMBNAIL_LRU_SIZE:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, *keys):
+        with self._local_lock:
+            for key in keys:
+                self._local.pop(key, None)
+
+    def clear_local(self):
+        with self._local_lock:
+            self._local.clear()
+
+    def _get_raw(self, key):
+        value = self._local_get(key)
+        if value is None:
+            value = super()._get_raw(key)
+            if value is not None:
+                self._local_set(key, value)
+        return value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        self._local_set(key, value)
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        self._local_delete(*keys)
+
+    def clear(self, delete_thumbnails=False):
+        super().clear(delete_thumbnails)
+        self.clear_local()
+
+    def prefetch(self, keys):
+        """
+        Загружает ключи в LRU одним get_many из общего кэша и одним запросом
+        к базе для тех, которых нет в кэше
+        """
+        missing = [key for key in dict.fromkeys(keys) if self._local_get(key) is None]
+        if not missing:
+            return
+        values = self.cache.get_many(missing)
+        rest = [key for key in missing if key not in values]
+        if rest:
+            found = dict(KVStoreModel.objects.filter(key__in=rest).values_list('key', 'value'))
+            self.cache.set_many(
+                {key: found.get(key, cached_db_kvstore.EMPTY_VALUE) for key in rest},
+                sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+            values.update(found)
+        for key, value in values.items():
+            if value != cached_db_kvstore.EMPTY_VALUE:
+                self._local_set(key, value)
+
+
+def get_thumbnail_key(file_, geometry_string, **options):
+    """
+    Ключ миниатюры в хранилище, посчитанный так же, как в ThumbnailBackend.get_thumbnail,
+    но без обращения к хранилищу и к файлу. Повторяет приватные методы sorl-thumbnail 12.7.0
+    (версия закреплена в requirements.txt), совпадение ключей проверяет test_thumbnail_key
+    """
+    backend = default.backend
+    source = ImageFile(file_)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry_string, options)
+    return ImageFile(name, default.storage).key
+
+
+def prefetch_thumbnails(images, sizes):
+    """
+    Одной пакетной загрузкой подтягивает в память процесса миниатюры всех размеров sizes
+    для фото images, чтобы {% thumbnail %} в цикле по карточкам не ходил в кэш за каждой
+    """
+    kvstore = default.kvstore
+    if not hasattr(kvstore, 'prefetch'):
+        return
+    kvstore.prefetch([
+        add_prefix(get_thumbnail_key(image, geometry, **options))
+        for image in images if image for geometry, options in sizes
+    ])
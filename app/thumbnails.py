@@ -0,0 +1,170 @@
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# все размеры фото рецепта, которые запрашивают шаблоны через {% recipe_thumbnail %}:
+# карточки и страница рецепта, списки покупок и подписок
+CARD_SIZE = ('500x500', {'crop': 'center', 'upscale': True})
+LIST_SIZE = ('100x100', {'crop': 'center', 'upscale': True})
+THUMBNAILS = {
+    'card': CARD_SIZE,
+    'list': LIST_SIZE,
+}
+SIZES = tuple(THUMBNAILS.values())
+
+# варианты фото для <picture>: ширины квадратного кропа (1x и 2x) и атрибут sizes
+PICTURES = {
+    'card': ((360, 720), '(max-width: 400px) 100vw, 363px'),
+    'detail': ((480, 960), '(max-width: 520px) 100vw, 480px'),
+}
+# современные форматы в порядке предпочтения и их MIME-типы
+FORMATS = (
+    ('AVIF', 'image/avif'),
+    ('WEBP', 'image/webp'),
+)
+VARIANT_OPTIONS = {'crop': 'center', 'upscale': True, 'quality': 80}
+
+_lock = threading.Lock()
+_executor = None
+
+
+def register_formats():
+    """
+    Подключает pillow-avif-plugin, если он установлен, и добавляет sorl расширения
+    форматов из FORMATS: сам sorl знает только JPEG, PNG, GIF и WEBP.
+    Вызывается один раз из AppConfig.ready
+    """
+    from sorl.thumbnail import base
+
+    try:
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        pass
+    for image_format, _ in FORMATS:
+        base.EXTENSIONS.setdefault(image_format, image_format.lower())
+
+
+@functools.lru_cache(maxsize=None)
+def get_formats():
+    """
+    Форматы из FORMATS, которые умеет сохранять установленный Pillow.
+    AVIF появляется, если установлен pillow-avif-plugin
+    """
+    from PIL import Image
+
+    Image.init()
+    return tuple((image_format, mime) for image_format, mime in FORMATS if image_format in Image.SAVE)
+
+
+def get_picture_sizes(picture):
+    """Миниатюры, которые запрашивает <picture>: запасной JPEG и варианты в современных форматах"""
+    widths, _ = PICTURES[picture]
+    return [CARD_SIZE, *[
+        (f'{width}x{width}', {**VARIANT_OPTIONS, 'format': image_format})
+        for width in widths for image_format, _ in get_formats()
+    ]]
+
+
+def get_variants():
+    """Геометрия и опции sorl для каждого варианта фото в современных форматах"""
+    return [size for picture in PICTURES for size in get_picture_sizes(picture)[1:]]
+
+
+def get_sources(image, picture):
+    """
+    Атрибуты <source> для фото: MIME-тип, srcset с шириной каждого варианта и sizes.
+    Имя миниатюры sorl - хеш имени фото и опций, а новое фото Django сохраняет под новым
+    именем, поэтому адреса вариантов не меняют содержимое и кэшируются навсегда
+    """
+    from sorl.thumbnail import get_thumbnail
+
+    _, sizes = PICTURES[picture]
+    srcsets = {}
+    for geometry, options in get_picture_sizes(picture)[1:]:
+        width = geometry.split('x')[0]
+        srcsets.setdefault(options['format'], []).append(f'{get_thumbnail(image, geometry, **options).url} {width}w')
+    return [
+        {'type': mime, 'srcset': ', '.join(srcsets[image_format]), 'sizes': sizes}
+        for image_format, mime in get_formats()
+    ]
+
+
+def get_recipe_thumbnail(image, size):
+    """
+    Миниатюра фото размера size из THUMBNAILS. Как и тег {% thumbnail %},
+    для пустого фото и при ошибке sorl возвращает None, ошибка пишется в лог
+    """
+    from sorl.thumbnail import get_thumbnail
+
+    if not image:
+        return None
+    geometry, options = THUMBNAILS[size]
+    try:
+        return get_thumbnail(image, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', image)
+        return None
+
+
+def generate(image_name):
+    """
+    Создает миниатюры всех размеров и варианты в современных форматах для фото рецепта.
+    Уже созданные sorl находит в своем хранилище ключей и не пересчитывает.
+    Возвращает имена файлов миниатюр
+    """
+    # sorl загружается лениво: модуль импортируется процессами команды до django.setup()
+    from sorl.thumbnail import get_thumbnail
+    from sorl.thumbnail.images import ImageFile
+
+    # sorl сам не сообщает об отсутствующем фото, а отдает заглушку
+    if not ImageFile(image_name).exists():
+        raise FileNotFoundError(image_name)
+    return [
+        get_thumbnail(image_name, geometry, **options).name
+        for geometry, options in [*SIZES, *get_variants()]
+    ]
+
+
+def try_generate(image_name):
+    """То же, что generate, но ошибка одного фото пишется в лог и возвращается None"""
+    try:
+        return generate(image_name)
+    except FileNotFoundError:
+        logger.warning('Нет файла фото %s', image_name)
+        return None
+    except Exception:
+        logger.exception('Не удалось создать миниатюры %s', image_name)
+        return None
+
+
+def _generate_in_background(image_name):
+    try:
+        try_generate(image_name)
+    finally:
+        # поток держит собственное соединение с базой хранилища ключей sorl
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS, thread_name_prefix='thumbnails')
+    return _executor
+
+
+def submit(image_name):
+    """Ставит создание миниатюр в фоновый поток, чтобы Pillow не работал в запросе"""
+    return get_executor().submit(_generate_in_background, image_name)
+
+
+def setup_worker():
+    """Инициализация процесса команды build_thumbnails"""
+    import django
+    django.setup()
@@ -0,0 +1,188 @@
+from django.db import connection, transaction
+
+from . import shop_totals
+from .counters import COUNTERS, change_counter, change_counters
+from .models import Favorite, ShopList, Subscription
+from .user_state import invalidate_user_state, refresh_user_state
+
+# вид записи в пакетном запросе: модель и внешний ключ на рецепт или автора
+KINDS = {
+    'purchase': (ShopList, 'recipe'),
+    'favorite': (Favorite, 'recipe'),
+    'subscription': (Subscription, 'author'),
+}
+ACTIONS = ('add', 'remove')
+MAX_OPERATIONS = 100
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def supports_returning():
+    """RETURNING есть в Postgres и в SQLite начиная с 3.35"""
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35, 0)
+    return connection.vendor == 'postgresql'
+
+
+def _execute(model, owner, target_field, target_ids, exclude_id=None, returning=False, delete=False):
+    """
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING или DELETE для записей владельца owner
+    с внешним ключом target_field из target_ids. Без returning возвращает число строк,
+    с returning - id рецептов или авторов, которые действительно изменились
+    """
+    field = model._meta.get_field(target_field)
+    owner_columns = [model._meta.get_field(name).column for name in owner]
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    if delete:
+        conditions = ' AND '.join(f'{_quote(column)} = %s' for column in owner_columns)
+        sql = (
+            f'DELETE FROM {_quote(model._meta.db_table)} '
+            f'WHERE {conditions} AND {_quote(field.column)} IN ({placeholders})'
+        )
+        params = [*owner.values(), *target_ids]
+    else:
+        target = field.related_model._meta
+        pk = _quote(target.pk.column)
+        columns = ', '.join(map(_quote, owner_columns + [field.column]))
+        sql = (
+            f'INSERT INTO {_quote(model._meta.db_table)} ({columns}) '
+            f'SELECT {", ".join(["%s"] * len(owner))}, {pk} FROM {_quote(target.db_table)} '
+            f'WHERE {pk} IN ({placeholders})'
+        )
+        params = [*owner.values(), *target_ids]
+        if exclude_id is not None:
+            sql += f' AND {pk} <> %s'
+            params.append(exclude_id)
+        sql += ' ON CONFLICT DO NOTHING'
+    if returning:
+        sql += f' RETURNING {_quote(field.column)}'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [pk for pk, in cursor.fetchall()] if returning else cursor.rowcount
+
+
+def _missing(model, target_field, target_id):
+    """Второй запрос нужен только когда ничего не изменилось, чтобы отличить повтор от несуществующего id"""
+    related = model._meta.get_field(target_field).related_model
+    return False if related.objects.filter(pk=target_id).exists() else None
+
+
+def add(model, owner, target_field, target_id, exclude_id=None):
+    """
+    Добавляет запись одним INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+    owner - поля владельца записи ({'user_id': 1} или {'session_key': '...'}),
+    target_field - внешний ключ на рецепт или автора, exclude_id - id, на который
+    ссылаться нельзя (подписка на самого себя). Счетчики и сводный список покупок
+    меняются следом в той же транзакции, без сигналов модели.
+    Возвращает True, если запись добавлена, False, если она уже была,
+    и None, если рецепта или автора нет
+    """
+    with transaction.atomic():
+        added = _execute(model, owner, target_field, [target_id], exclude_id)
+        if added:
+            _apply_side_effects(model, owner, target_field, [target_id], 1)
+    if added:
+        invalidate_user_state(owner.get('user_id'), owner.get('session_key'))
+        return True
+    return _missing(model, target_field, target_id)
+
+
+def remove(model, owner, target_field, target_id):
+    """
+    Удаляет запись одним DELETE, счетчики и сводный список покупок меняются следом
+    в той же транзакции. Возвращает True, если запись удалена, False, если ее не было,
+    и None, если рецепта или автора нет
+    """
+    with transaction.atomic():
+        removed = _execute(model, owner, target_field, [target_id], delete=True)
+        if removed:
+            _apply_side_effects(model, owner, target_field, [target_id], -1)
+    if removed:
+        invalidate_user_state(owner.get('user_id'), owner.get('session_key'))
+        return True
+    return _missing(model, target_field, target_id)
+
+
+def _change_many(model, owner, target_field, target_ids, exclude_id=None, delete=False):
+    """
+    Меняет записи для всех target_ids одним запросом, возвращает id, которые изменились.
+    Без RETURNING записи меняются по одной, чтобы счетчики остались точными
+    """
+    if supports_returning():
+        return _execute(model, owner, target_field, target_ids, exclude_id, returning=True, delete=delete)
+    return [pk for pk in target_ids if _execute(model, owner, target_field, [pk], exclude_id, delete=delete)]
+
+
+def _update_counters(model, owner, target_field, target_ids, delta):
+    """Счетчики из COUNTERS меняются одним UPDATE на группу вместо сигнала на каждую запись"""
+    for counter_model, field, related, fk in COUNTERS:
+        if related is not model:
+            continue
+        if fk == target_field:
+            change_counters(counter_model, target_ids, field, delta)
+        else:
+            change_counter(counter_model, owner.get(f'{fk}_id'), field, delta * len(target_ids))
+
+
+def _apply_side_effects(model, owner, target_field, target_ids, delta):
+    """
+    Записи меняются в обход ORM и сигналов моделей, поэтому счетчики и сводный
+    список покупок обновляются здесь: delta 1 - записи добавлены, -1 - удалены
+    """
+    _update_counters(model, owner, target_field, target_ids, delta)
+    if model is ShopList:
+        (shop_totals.remove_recipes if delta < 0 else shop_totals.add_recipes)(owner, target_ids)
+
+
+def parse_operations(data):
+    """
+    Проверяет тело пакетного запроса {"operations": [{"action", "kind", "id"}, ...]}.
+    Возвращает список (action, kind, id) или None, если пакет неверный
+    """
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not 0 < len(operations) <= MAX_OPERATIONS:
+        return None
+    result = []
+    for operation in operations:
+        if not isinstance(operation, dict):
+            return None
+        action, kind, pk = operation.get('action'), operation.get('kind'), operation.get('id')
+        if action not in ACTIONS or kind not in KINDS or isinstance(pk, bool):
+            return None
+        try:
+            result.append((action, kind, int(pk)))
+        except (TypeError, ValueError):
+            return None
+    return result
+
+
+def apply_operations(operations, user_id=None, session_key=None):
+    """
+    Применяет пакет операций в одной транзакции: для каждой пары (вид, действие)
+    один INSERT или DELETE по всем id и один UPDATE счетчиков.
+    Если над одной записью несколько операций, действует последняя.
+    Возвращает успех каждой операции и новое состояние пользователя
+    """
+    owner = {'user_id': user_id} if user_id is not None else {'session_key': session_key}
+    last = {(kind, pk): index for index, (_, kind, pk) in enumerate(operations)}
+    groups = {}
+    for kind, pk in last:
+        action = operations[last[kind, pk]][0]
+        groups.setdefault((kind, action), []).append(pk)
+
+    changed = set()
+    with transaction.atomic():
+        for (kind, action), target_ids in groups.items():
+            model, target_field = KINDS[kind]
+            exclude_id = user_id if kind == 'subscription' else None
+            done = _change_many(model, owner, target_field, target_ids, exclude_id, delete=action == 'remove')
+            _apply_side_effects(model, owner, target_field, done, -1 if action == 'remove' else 1)
+            changed.update((kind, pk) for pk in done)
+
+    results = [
+        index == last[kind, pk] and (kind, pk) in changed
+        for index, (_, kind, pk) in enumerate(operations)
+    ]
+    return results, refresh_user_state(user_id, session_key)
@@ -0,0 +1,98 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+# Начала файлов форматов, которые принимаются как фото рецепта
+IMAGE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a')
+SIGNATURE_LENGTH = 12
+
+
+def normalize_image(upload):
+    """
+    Уменьшает загруженное фото рецепта до RECIPE_IMAGE_MAX_SIDE по длинной стороне,
+    поворачивает по EXIF и пересохраняет в JPEG с качеством RECIPE_IMAGE_QUALITY
+    без метаданных. Прозрачный фон заливается белым, у анимации берется первый кадр.
+    Ошибки Pillow пробрасываются: форма показывает их как ошибку поля
+    """
+    max_side = settings.RECIPE_IMAGE_MAX_SIDE
+    upload.seek(0)
+    with Image.open(upload) as image:
+        # JPEG декодируется сразу в уменьшенном масштабе, а не в полном размере
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        content = BytesIO()
+        image.save(content, 'JPEG', quality=settings.RECIPE_IMAGE_QUALITY, optimize=True, progressive=True)
+
+    name = os.path.splitext(os.path.basename(upload.name))[0] + '.jpg'
+    size = content.tell()
+    content.seek(0)
+    return InMemoryUploadedFile(content, 'image', name, 'image/jpeg', size, None)
+
+
+def is_image_signature(head):
+    """Начало файла совпадает с JPEG, PNG, GIF или WebP"""
+    return head.startswith(IMAGE_SIGNATURES) or (head[:4] == b'RIFF' and head[8:12] == b'WEBP')
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Обработчик загрузки фото: файл сразу пишется во временный файл кусками по chunk_size,
+    сигнатура проверяется по первым байтам, размер - по мере поступления данных.
+    Неподходящий файл отклоняется сразу: остаток тела запроса дочитывается без записи
+    на диск, чтобы ответ с ошибкой формы дошел до nginx, а не обрыв соединения.
+    Причина остается в request.upload_errors и показывается формой рецепта как ошибка поля
+    """
+    chunk_size = 64 * 2 ** 10
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.body_length = content_length
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.head = b''
+        # даже если остальные поля формы заняли бы весь DATA_UPLOAD_MAX_MEMORY_SIZE,
+        # на файл останется больше допустимого
+        if self.body_length - (settings.DATA_UPLOAD_MAX_MEMORY_SIZE or 0) > settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE:
+            self.reject(self.too_large())
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE:
+            self.reject(self.too_large())
+        if len(self.head) < SIGNATURE_LENGTH:
+            self.head += raw_data[:SIGNATURE_LENGTH - len(self.head)]
+            if len(self.head) == SIGNATURE_LENGTH and not is_image_signature(self.head):
+                self.reject(self.not_image())
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if not is_image_signature(self.head):
+            self.reject(self.not_image())
+        return super().file_complete(file_size)
+
+    def reject(self, message):
+        """Запоминает причину и прекращает разбор запроса, временный файл удаляется парсером"""
+        if not hasattr(self.request, 'upload_errors'):
+            self.request.upload_errors = {}
+        self.request.upload_errors[self.field_name] = message
+        raise StopUpload()
+
+    @staticmethod
+    def too_large():
+        return f'Размер файла не должен превышать {filesizeformat(settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE)}'
+
+    @staticmethod
+    def not_image():
+        return 'Загрузите фото в формате JPEG, PNG, GIF или WebP'
@@ -2,8 +2,8 @@ from django.urls import path, include
 
 from .views import (AuthorRecipeList, EditRecipeView, FavoriteList,
                     GeneratePDF, IndexView, NewRecipeView,
-                    PurchaseList, RecipeDetail, RemoveRecipeView,
-                    SubscriptionList)
+                    PDFStatus, PurchaseList, RecipeDetail, RemoveRecipeView,
+                    SearchView, SubscriptionList)
 
 urlpatterns = [
     path("", IndexView.as_view(), name="index"),
@@ -12,6 +12,8 @@ urlpatterns = [
     path("favorites/", FavoriteList.as_view(), name='favorites'),
     path("purchases/", PurchaseList.as_view(), name='purchases'),
     path("pdf/", GeneratePDF.as_view(), name='pdf'),
+    path("pdf/status/<slug:key>/", PDFStatus.as_view(), name='pdf_status'),
+    path("search/", SearchView.as_view(), name='search'),
     path("<slug:recipe_slug>/", RecipeDetail.as_view(), name="recipe"),
     path("<slug:recipe_slug>/edit/", EditRecipeView.as_view(), name="edit_recipe"),
     path("<slug:recipe_slug>/remove_recipe/", RemoveRecipeView.as_view(), name="remove_recipe"),
@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, Value
+
+from .models import Favorite, ShopList, Subscription
+
+
+class UserState:
+    """
+    Подписки, избранное и покупки пользователя в виде множеств id,
+    чтобы проверка "рецепт в покупках" в шаблоне стоила O(1)
+    """
+
+    def __init__(self, subscribers=(), favorites=(), purchases=()):
+        self.subscribers = frozenset(subscribers)
+        self.favorites = frozenset(favorites)
+        self.purchases = frozenset(purchases)
+
+    @property
+    def purchases_count(self):
+        return len(self.purchases)
+
+    @property
+    def favorites_count(self):
+        return len(self.favorites)
+
+
+EMPTY_STATE = UserState()
+
+
+def get_state_key(user_id=None, session_key=None):
+    if user_id is not None:
+        return f'user_state:user:{user_id}'
+    return f'user_state:session:{session_key}'
+
+
+def load_user_state(user_id):
+    """Загружает состояние пользователя одним запросом UNION ALL"""
+    kind = CharField()
+    rows = Subscription.objects.filter(user_id=user_id).annotate(
+        kind=Value('s', output_field=kind)
+    ).values_list('kind', 'author_id').union(
+        Favorite.objects.filter(user_id=user_id).annotate(
+            kind=Value('f', output_field=kind)
+        ).values_list('kind', 'recipe_id'),
+        ShopList.objects.filter(user_id=user_id).annotate(
+            kind=Value('p', output_field=kind)
+        ).values_list('kind', 'recipe_id'),
+        all=True,
+    )
+    ids = {'s': [], 'f': [], 'p': []}
+    for row_kind, pk in rows:
+        ids[row_kind].append(pk)
+    return UserState(ids['s'], ids['f'], ids['p'])
+
+
+def load_session_state(session_key):
+    return UserState(purchases=ShopList.objects.filter(session_key=session_key).values_list('recipe_id', flat=True))
+
+
+def get_user_state(request):
+    """
+    Возвращает состояние текущего пользователя или анонимной сессии.
+    Запоминается на время запроса и хранится в кэше до первого изменения
+    """
+    state = getattr(request, '_user_state', None)
+    if state is not None:
+        return state
+
+    if request.user.is_authenticated:
+        key = get_state_key(user_id=request.user.id)
+        loader = load_user_state
+        arg = request.user.id
+    else:
+        session_key = request.session.get('purchase_id')
+        if not session_key:
+            request._user_state = EMPTY_STATE
+            return EMPTY_STATE
+        key = get_state_key(session_key=session_key)
+        loader = load_session_state
+        arg = session_key
+
+    state = cache.get(key)
+    if state is None:
+        state = loader(arg)
+        cache.set(key, state, settings.USER_STATE_CACHE_TIMEOUT)
+    request._user_state = state
+    return state
+
+
+def invalidate_user_state(user_id=None, session_key=None):
+    if user_id is not None:
+        cache.delete(get_state_key(user_id=user_id))
+    if session_key:
+        cache.delete(get_state_key(session_key=session_key))
+
+
+def refresh_user_state(user_id=None, session_key=None):
+    """Перечитывает состояние после пакетного изменения и сразу кладет его в кэш"""
+    if user_id is not None:
+        key, state = get_state_key(user_id=user_id), load_user_state(user_id)
+    else:
+        key, state = get_state_key(session_key=session_key), load_session_state(session_key)
+    cache.set(key, state, settings.USER_STATE_CACHE_TIMEOUT)
+    return state
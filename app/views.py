@@ -1,20 +1,24 @@
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Count, F, Sum
-from django.http import HttpResponse
-from django.shortcuts import redirect, render
-from django.urls import reverse_lazy
+from django.http import (FileResponse, Http404, HttpResponse, JsonResponse,
+                         StreamingHttpResponse)
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse, reverse_lazy
 from django.views import View
 from django.views.generic import (CreateView, DeleteView, DetailView, ListView,
                                   UpdateView)
 
+from . import pdf_jobs, shop_exports, shop_totals, thumbnails
 from .forms import RecipeForm
-from .mixins import DataMixin, GetContextDataMixin
-from .models import (Favorite, Recipe, RecipeIngredient, ShopList,
-                     Subscription, User)
-from .services import get_recipe_filter_tags, get_sub_filter_tags, render_to_pdf
+from .mixins import AnonymousPageCacheMixin, CursorPaginationMixin, DataMixin
+from .models import Favorite, Recipe, ShopList, Subscription, User
+from .search import get_recipes, search_recipe_ids
+from .services import (attach_latest_recipes, get_recipe_filter_tags,
+                       get_recipe_index_filter, get_sub_filter_tags,
+                       prefetch_recipe_cards, prefetch_recipe_thumbnails)
 
 
-class IndexView(GetContextDataMixin, ListView):
+class IndexView(AnonymousPageCacheMixin, CursorPaginationMixin, ListView):
     """Класс для вывода рецептов на главной странице"""
     model = Recipe
     paginate_by = 6
@@ -25,14 +29,34 @@ class IndexView(GetContextDataMixin, ListView):
     def get_queryset(self):
         return get_recipe_filter_tags(self.request, Recipe)
 
+    def get_index_filter(self):
+        return get_recipe_index_filter(self.request)
+
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(**kwargs)
-        context.update(super().get_user_context_data(self.request, context))
+        context['recipes'] = prefetch_recipe_cards(context['recipes'], thumbnails.get_picture_sizes('card'))
         context['navbar'] = 'index'
         return context
 
 
-class RecipeDetail(GetContextDataMixin, DetailView):
+class SearchView(ListView):
+    """Класс для поиска рецептов по названию, описанию и ингредиентам"""
+    paginate_by = 6
+    template_name = 'search.html'
+    context_object_name = 'recipes'
+
+    def get_queryset(self):
+        return search_recipe_ids(self.request.GET.get('q', ''))
+
+    def get_context_data(self, *, object_list=None, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['recipes'] = get_recipes(context['recipes'])
+        context['recipes'] = prefetch_recipe_cards(context['recipes'], thumbnails.get_picture_sizes('card'))
+        context['query'] = self.request.GET.get('q', '')
+        return context
+
+
+class RecipeDetail(AnonymousPageCacheMixin, DetailView):
     """Класс для вывода рецепта"""
     model = Recipe
     slug_url_kwarg = 'recipe_slug'
@@ -43,10 +67,12 @@ class RecipeDetail(GetContextDataMixin, DetailView):
     def get_queryset(self):
         return Recipe.objects.select_related('author').all()
 
+    def get_page_cache_scopes(self):
+        return [f"recipe:{self.kwargs['recipe_slug']}"]
+
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(**kwargs)
-        context.update(super().get_user_context_data(self.request, context))
-        context['ingredients'] = context['recipe'].ingredient.prefetch_related('ingredient').all()
+        context['ingredients'] = context['recipe'].recipe_ingredients.select_related('ingredient')
         context['navbar'] = 'recipe'
         return context
 
@@ -62,7 +88,6 @@ class NewRecipeView(LoginRequiredMixin, DataMixin, CreateView):
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['purchases'] = self.request.user.users.values_list('recipe', flat=True)
         context['navbar'] = 'new_recipe'
         return context
 
@@ -81,8 +106,7 @@ class EditRecipeView(LoginRequiredMixin, DataMixin, UpdateView):
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['purchases'] = self.request.user.users.values_list('recipe', flat=True)
-        context['ingredient'] = context['recipe'].ingredient.all()
+        context['ingredient'] = context['recipe'].recipe_ingredients.select_related('ingredient')
         context['tag_label'] = 'Теги'
         context['tag'] = context['recipe'].tag
         context['navbar'] = 'new_recipe'
@@ -106,22 +130,28 @@ class RemoveRecipeView(LoginRequiredMixin, DeleteView):
         return redirect('index')
 
 
-class AuthorRecipeList(GetContextDataMixin, ListView):
+class AuthorRecipeList(AnonymousPageCacheMixin, CursorPaginationMixin, ListView):
     """Класс вывод рецептов на странице автора"""
     model = Recipe
     paginate_by = 6
     template_name = 'author_recipe.html'
     context_object_name = 'recipes'
-    allow_empty = False
 
     def get_queryset(self):
-        username = self.kwargs['username']
-        return get_recipe_filter_tags(self.request, Recipe, username)
+        # автор загружается отдельно: рецептов под выбранными тегами у него может не быть
+        self.author = get_object_or_404(User, username=self.kwargs['username'])
+        return get_recipe_filter_tags(self.request, Recipe, self.author.username)
+
+    def get_index_filter(self):
+        return get_recipe_index_filter(self.request, self.kwargs['username'])
+
+    def get_page_cache_scopes(self):
+        return [f"author:{self.kwargs['username']}"]
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(**kwargs)
-        context.update(super().get_user_context_data(self.request, context))
-        context['author'] = context['recipes'].first().author
+        context['author'] = self.author
+        context['recipes'] = prefetch_recipe_cards(context['recipes'], thumbnails.get_picture_sizes('card'))
         context['navbar'] = 'author_recipe'
         return context
 
@@ -136,22 +166,22 @@ class SubscriptionList(LoginRequiredMixin, ListView):
     context_object_name = 'authors'
 
     def get_queryset(self):
-        recipes = User.objects.annotate(
-            recipe_count=Count('recipes')
-        ).filter(
+        return User.objects.filter(
             following__user=self.request.user,
-            recipe_count__gt=0
-        ).prefetch_related('recipes').order_by('username')
-        return recipes
+            recipe_count__gt=0,
+        ).order_by('username')
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['purchases'] = self.request.user.users.values_list('recipe', flat=True)
+        context['authors'] = attach_latest_recipes(context['authors'])
+        prefetch_recipe_thumbnails(
+            [recipe for author in context['authors'] for recipe in author.latest_recipes], [thumbnails.LIST_SIZE]
+        )
         context['navbar'] = 'subscriptions'
         return context
 
 
-class FavoriteList(LoginRequiredMixin, ListView):
+class FavoriteList(LoginRequiredMixin, CursorPaginationMixin, ListView):
     """
     Класс выводит рецепты которые пользователь добавил в избранное
     """
@@ -166,7 +196,7 @@ class FavoriteList(LoginRequiredMixin, ListView):
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['purchases'] = self.request.user.users.values_list('recipe', flat=True)
+        context['favorites'] = prefetch_recipe_cards(context['favorites'], thumbnails.get_picture_sizes('card'))
         context['navbar'] = 'favorites'
         return context
 
@@ -188,45 +218,73 @@ class PurchaseList(ListView):
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(**kwargs)
+        if context['purchases']:
+            prefetch_recipe_thumbnails([purchase.recipe for purchase in context['purchases']], [thumbnails.LIST_SIZE])
         context['navbar'] = 'shop_list'
+        context['totals'] = shop_totals.get_totals(shop_totals.get_request_owner(self.request))
         return context
 
 
 class GeneratePDF(View):
-    """Класс для скачивания PDF"""
+    """
+    Класс для скачивания PDF. PDF собирается в фоне и хранится под хешем содержимого
+    списка, поэтому неизменившийся список повторно не рендерится.
+    С format=txt, csv или md список отдается потоком в легком текстовом формате
+    """
 
     def get(self, request, *args, **kwargs):
-        recipes = None
-        if self.request.user.is_authenticated:
-            recipes = RecipeIngredient.objects.filter(
-                ingredients__purchases__user=self.request.user
-            ).values(
-                ing_title=F('ingredient__title'),
-                ing_dimension=F('ingredient__dimension')
-            ).annotate(ing_count_sum=Sum('ing_count'))
-        else:
-            session_key = self.request.session.get('purchase_id')
-            if session_key:
-                recipes = RecipeIngredient.objects.filter(
-                    ingredients__purchases__session_key=session_key
-                ).values(
-                    ing_title=F('ingredient__title'),
-                    ing_dimension=F('ingredient__dimension')
-                ).annotate(ing_count_sum=Sum('ing_count'))
-        context = {
-            'recipes': recipes
-        }
-        pdf = render_to_pdf('pdf/pdf.html', context)
-        if pdf:
-            response = HttpResponse(pdf, content_type='application/pdf; charset=utf-8')
-            filename = f"Shop list.pdf"
-            content = f"inline; filename={filename}"
+        export_format = request.GET.get('format', 'pdf')
+        if export_format != 'pdf':
+            return self.export(request, export_format)
+
+        rows = pdf_jobs.get_rows(shop_totals.get_totals(shop_totals.get_request_owner(request)))
+        key = pdf_jobs.get_key(rows)
+        status = pdf_jobs.start(key, rows)
+        if status == pdf_jobs.PENDING:
+            status = pdf_jobs.wait(key, settings.PDF_WAIT_TIMEOUT)
+
+        if status == pdf_jobs.READY:
             download = request.GET.get("download")
-            if download:
-                content = f"attachment; filename={filename}"
-            response['Content-Disposition'] = content
+            return FileResponse(
+                open(pdf_jobs.get_path(key), 'rb'), as_attachment=bool(download),
+                filename="Shop list.pdf", content_type='application/pdf'
+            )
+        if status == pdf_jobs.PENDING:
+            status_url = reverse('pdf_status', kwargs={'key': key})
+            if 'application/json' in request.headers.get('Accept', ''):
+                return JsonResponse({'status': status, 'status_url': status_url}, status=202)
+            return render(request, 'pdf/pending.html', status=202)
+        if status == pdf_jobs.BUSY:
+            response = HttpResponse('Service unavailable', status=503)
+            response['Retry-After'] = int(settings.PDF_WAIT_TIMEOUT) + 1
+            return response
+        if status == pdf_jobs.ERROR:
+            # метка ошибки действует PDF_JOB_TIMEOUT секунд, после этого PDF собирается заново
+            response = HttpResponse('Не удалось собрать PDF, повторите позже', status=500)
+            response['Retry-After'] = settings.PDF_JOB_TIMEOUT
             return response
-        return HttpResponse('Not found')
+        return HttpResponse('Not found', status=404)
+
+    def export(self, request, export_format):
+        if export_format not in shop_exports.EXPORTS:
+            raise Http404
+        _, content_type, extension = shop_exports.EXPORTS[export_format]
+        response = StreamingHttpResponse(
+            shop_exports.export(shop_totals.get_request_owner(request), export_format), content_type=content_type
+        )
+        disposition = 'attachment' if request.GET.get("download") else 'inline'
+        response['Content-Disposition'] = f'{disposition}; filename="Shop list.{extension}"'
+        return response
+
+
+class PDFStatus(View):
+    """Состояние фонового рендеринга PDF для опроса со страницы списка покупок"""
+
+    def get(self, request, key):
+        status = pdf_jobs.get_status(key)
+        if status is None:
+            return JsonResponse({'status': status}, status=404)
+        return JsonResponse({'status': status, 'url': reverse('pdf')})
 
 
 def page_not_found(request, exception):
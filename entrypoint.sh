@@ -13,5 +13,6 @@ fi
 
 python manage.py migrate --noinput
 python manage.py collectstatic --no-input --clear
+python manage.py build_ingredient_catalog
 
 exec "$@"
\ No newline at end of file
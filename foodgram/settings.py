@@ -78,6 +78,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'app.context_processors.user_state',
             ],
         },
     },
@@ -101,6 +102,32 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Несколько процессов gunicorn должны использовать общий бэкенд (файлы, memcached, redis),
+# иначе сброс кэша и версии индекса рецептов видны только в одном процессе.
+# Для журнала индекса рецептов основному кэшу нужен атомарный incr, docker-compose берет memcached
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'default'),
+    },
+    'pages': {
+        'BACKEND': os.getenv('PAGE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('PAGE_CACHE_LOCATION', 'pages'),
+        'TIMEOUT': None,
+    },
+}
+
+# Кэш страниц целиком для анонимных посетителей, сбрасывается сигналами, а не по времени
+PAGE_CACHE_ENABLED = int(os.getenv("PAGE_CACHE_ENABLED", 0))
+PAGE_CACHE_ALIAS = 'pages'
+
+# Время жизни подписок, избранного и покупок пользователя в кэше, в секундах
+USER_STATE_CACHE_TIMEOUT = int(os.getenv("USER_STATE_CACHE_TIMEOUT", 60 * 60 * 24))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -145,9 +172,69 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Справочник ингредиентов для подсказок на клиенте, имя файла содержит хеш содержимого
+INGREDIENT_CATALOG_ROOT = os.path.join(MEDIA_ROOT, 'catalog')
+INGREDIENT_CATALOG_URL = MEDIA_URL + 'catalog/'
+
+# Готовые PDF списков покупок, имя файла - хеш содержимого списка. Время жизни файла, в секундах
+PDF_CACHE_ROOT = os.getenv("PDF_CACHE_ROOT", os.path.join(BASE_DIR, 'pdf_cache'))
+PDF_CACHE_TTL = int(os.getenv("PDF_CACHE_TTL", 60 * 60 * 24 * 7))
+# PDF старше PDF_CACHE_TTL удаляются в фоне не чаще раза в столько секунд
+PDF_PRUNE_INTERVAL = int(os.getenv("PDF_PRUNE_INTERVAL", 60 * 60))
+
+# Процессов рендеринга PDF на процесс веб-сервера и время, после которого блокировка
+# задания считается брошенной, в секундах. Очередь больше PDF_QUEUE_SIZE заданий не растет, запрос получает 503
+PDF_JOB_WORKERS = int(os.getenv("PDF_JOB_WORKERS", 2))
+PDF_JOB_TIMEOUT = int(os.getenv("PDF_JOB_TIMEOUT", 120))
+PDF_QUEUE_SIZE = int(os.getenv("PDF_QUEUE_SIZE", 50))
+
+# Пул из PDF_JOB_WORKERS прогретых процессов рендеринга: время на один PDF, в секундах,
+# после которого процесс убивается, и число PDF, после которого процесс перезапускается.
+# С PDF_RENDER_POOL=0 PDF собирается в потоке процесса веб-сервера, без таймаута
+PDF_RENDER_POOL = int(os.getenv("PDF_RENDER_POOL", 1))
+PDF_RENDER_TIMEOUT = int(os.getenv("PDF_RENDER_TIMEOUT", 30))
+PDF_RENDER_MAX_JOBS = int(os.getenv("PDF_RENDER_MAX_JOBS", 200))
+
+# Сколько запрос ждет готовности PDF, прежде чем вернуть адрес для опроса, в секундах
+PDF_WAIT_TIMEOUT = float(os.getenv("PDF_WAIT_TIMEOUT", 2))
+
 
 FIXTURE_DIRS = (os.path.join(BASE_DIR, 'fixtures'),)
 
+# Максимальный возраст индекса рецептов в памяти процесса, в секундах
+RECIPE_INDEX_TTL = int(os.getenv("RECIPE_INDEX_TTL", 300))
+
+# Сколько изменений других процессов индекс рецептов применяет из журнала,
+# при большем отставании он перестраивается целиком. Журнал ведется только в кэше
+# с атомарным incr (memcached, Redis): с файловым кэшем или кэшем в базе
+# каждое изменение перестраивает индекс в остальных процессах
+RECIPE_INDEX_MAX_CHANGES = int(os.getenv("RECIPE_INDEX_MAX_CHANGES", 500))
+
+# Максимальный возраст справочника ингредиентов в памяти процесса, в секундах
+INGREDIENT_INDEX_TTL = int(os.getenv("INGREDIENT_INDEX_TTL", 3600))
+
+# Время жизни html карточки рецепта в кэше, в секундах
+RECIPE_CARD_CACHE_TIMEOUT = int(os.getenv("RECIPE_CARD_CACHE_TIMEOUT", 60 * 60 * 24))
+
+# Загруженные фото рецептов уменьшаются до этой длинной стороны, в пикселях,
+# и пересохраняются в JPEG с этим качеством
+RECIPE_IMAGE_MAX_SIDE = int(os.getenv("RECIPE_IMAGE_MAX_SIDE", 1600))
+RECIPE_IMAGE_QUALITY = int(os.getenv("RECIPE_IMAGE_QUALITY", 85))
+
+# Наибольший размер загружаемого фото, в байтах: больший файл отклоняется, не дочитываясь
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = int(os.getenv("RECIPE_IMAGE_MAX_UPLOAD_SIZE", 10 * 2 ** 20))
+
+# Загрузки пишутся на диск кусками, сигнатура и размер фото проверяются по мере чтения
+FILE_UPLOAD_HANDLERS = ['app.uploads.ImageUploadHandler']
+
+# Потоков, которые создают миниатюры фото рецептов после сохранения, в процессе
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", 1))
+
+# Хранилище ключей sorl с LRU в памяти процесса: сколько ключей держать и сколько секунд
+THUMBNAIL_KVSTORE = 'app.thumbnail_kvstore.KVStore'
+THUMBNAIL_LRU_SIZE = int(os.getenv("THUMBNAIL_LRU_SIZE", 10000))
+THUMBNAIL_LRU_TTL = int(os.getenv("THUMBNAIL_LRU_TTL", 300))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
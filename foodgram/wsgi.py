@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_wsgi_application()
+
+# процессы рендеринга PDF запускаются вместе с воркером, а не на первом запросе
+from app.pdf_pool import start_pool  # noqa: E402
+
+start_pool()
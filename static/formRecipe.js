@@ -27,6 +27,7 @@ function Ingredients() {
     const dropdown = (e) => {
         if (e.target.classList.contains('form__item-list')) {
             nameIngredient.value = e.target.textContent;
+            nameIngredient.dataset.id = e.target.getAttribute('data-id') || '';
             formDropdownItems.style.display = ''
             cantidadVal.textContent = e.target.getAttribute('data-val');
         }
@@ -38,6 +39,7 @@ function Ingredients() {
             const elem = document.createElement('div');
             elem.classList.add('form__field-item-ingredient');
             elem.innerHTML = `<span> ${data.name} ${data.value}${data.units}</span> <span class="form__field-item-delete"></span>
+                             <input id="idIngredient" name="idIngredient" type="hidden" value="${data.id}">
                              <input id="nameIngredient" name="nameIngredient" type="hidden" value="${data.name}">
                              <input id="valueIngredient" name="valueIngredient" type="hidden" value="${data.value}">
                              <input id="unitsIngredient" name="unitsIngredient" type="hidden" value="${data.units}">`;
@@ -58,11 +60,13 @@ function Ingredients() {
     // получение данных из инпутов для добавления
     const getValue = (e) => {
         const data = {
+            id: nameIngredient.dataset.id || '',
             name: nameIngredient.value,
             value: cantidad.value,
             units: cantidadVal.textContent
         };
         clearValue(nameIngredient);
+        nameIngredient.dataset.id = '';
         clearValue(cantidad);
         return data;
     };
@@ -78,11 +82,56 @@ function Ingredients() {
     }
 }
 
+// справочник ингредиентов целиком, подсказки ищутся без запросов к серверу
+function IngredientCatalog(url) {
+    const minLength = 3;
+    const limit = 20;
+    let items = null;
+    const normalize = (text) => text.toLowerCase().replace(/ё/g, 'е').split(/\s+/).filter(Boolean).join(' ');
+    const load = () => {
+        if (!items) {
+            items = api.getCatalog(url).then( data => data.map( item => ({...item, key: normalize(item.title)})));
+        }
+        return items;
+    };
+    // точное совпадение, начало названия, начало слова, вхождение; короче - выше
+    const rank = (key, query) => {
+        if (key === query) { return 0 }
+        if (key.startsWith(query)) { return 1 }
+        if (key.split(' ').slice(1).some( word => word.startsWith(query))) { return 2 }
+        if (key.includes(query)) { return 3 }
+        return -1;
+    };
+    const search = (text) => {
+        const query = normalize(text);
+        if (query.length < minLength) { return Promise.resolve([]) }
+        return load().then( data => data
+            .map( item => ({item, rank: rank(item.key, query)}))
+            .filter( found => found.rank >= 0)
+            .sort( (a, b) => a.rank - b.rank || a.item.key.length - b.item.key.length || (a.item.key < b.item.key ? -1 : 1))
+            .slice(0, limit)
+            .map( found => found.item));
+    };
+    return {
+        search
+    }
+}
+
+const catalogUrl = document.querySelector('.form').getAttribute('data-catalog');
+const catalog = catalogUrl ? IngredientCatalog(catalogUrl) : null;
+
+const getIngredients = (text) => {
+    if (!catalog) {
+        return api.getIngredients(text);
+    }
+    return catalog.search(text).catch( () => api.getIngredients(text));
+};
+
 const cbEventInput = (elem) => {
-    return api.getIngredients(elem.target.value).then( e => {
+    return getIngredients(elem.target.value).then( e => {
         if(e.length !== 0 ) {
             const items = e.map( elem => {
-                return `<a class="form__item-list" data-val="${elem.dimension}"">${elem.title}</a>`
+                return `<a class="form__item-list" data-id="${elem.id || ''}" data-val="${elem.dimension}"">${elem.title}</a>`
             }).join(' ')
             formDropdownItems.style.display = 'flex';
             formDropdownItems.innerHTML = items;
@@ -97,6 +146,8 @@ const eventInput = debouncing(cbEventInput, 1000);
 
 // вешаем апи
 nameIngredient.addEventListener('input', eventInput);
+// введенное вручную название ищется на сервере по справочнику
+nameIngredient.addEventListener('input', () => { nameIngredient.dataset.id = '' });
 const ingredients = Ingredients();
 // вешаем слушатель на элементы с апи
 formDropdownItems.addEventListener('click', ingredients.dropdown);
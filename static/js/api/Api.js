@@ -2,30 +2,38 @@
 class Api {
     constructor(apiUrl) {
         this.apiUrl =  apiUrl;
+        this.queue = [];
+        this.timer = null;
+        this.batchDelay = 150;
+        this.batchSize = 100;
     }
-  getPurchases () {
-    return fetch(`/api/v1/purchases/`, {
-      headers: {
-        'Content-Type': 'application/json',
-        'X-CSRFToken': document.getElementsByName('csrfmiddlewaretoken')[0].value
+  // клики по кнопкам копятся и уходят одним запросом к /api/v1/batch/
+  enqueue (action, kind, id) {
+    return new Promise((resolve, reject) => {
+      this.queue.push({operation: {action: action, kind: kind, id: Number(id)}, resolve: resolve, reject: reject});
+      if (this.queue.length >= this.batchSize) {
+        this.flush();
+      } else if (!this.timer) {
+        this.timer = setTimeout(() => this.flush(), this.batchDelay);
       }
     })
-      .then( e => {
-          if(e.ok) {
-              return e.json()
-          }
-          return Promise.reject(e.statusText)
-      })
   }
-  addPurchases (id) {
-    return fetch(`/api/v1/add_purchases/`, {
+  flush () {
+    const queue = this.queue;
+    clearTimeout(this.timer);
+    this.queue = [];
+    this.timer = null;
+    if (!queue.length) {
+      return;
+    }
+    fetch(`/api/v1/batch/`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
         'X-CSRFToken': document.getElementsByName('csrfmiddlewaretoken')[0].value
       },
       body: JSON.stringify({
-        id: id
+        operations: queue.map(item => item.operation)
       })
     })
       .then( e => {
@@ -34,10 +42,15 @@ class Api {
           }
           return Promise.reject(e.statusText)
       })
+      .then( data => {
+          queue.forEach((item, index) => item.resolve({success: data.results[index]}))
+      })
+      .catch( e => {
+          queue.forEach(item => item.reject(e))
+      })
   }
-  removePurchases (id){
-    return fetch(`/api/v1/remove_purchases/${id}/`, {
-      method: 'DELETE',
+  getPurchases () {
+    return fetch(`/api/v1/purchases/`, {
       headers: {
         'Content-Type': 'application/json',
         'X-CSRFToken': document.getElementsByName('csrfmiddlewaretoken')[0].value
@@ -50,71 +63,23 @@ class Api {
           return Promise.reject(e.statusText)
       })
   }
-  addSubscriptions(id) {
-    return fetch(`/api/v1/add_subscriptions/`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        'X-CSRFToken': document.getElementsByName('csrfmiddlewaretoken')[0].value
-      },
-      body: JSON.stringify({
-        id: id
-      })
-    })
-      .then( e => {
-          if(e.ok) {
-              return e.json()
-          }
-          return Promise.reject(e.statusText)
-      })
+  addPurchases (id) {
+    return this.enqueue('add', 'purchase', id)
+  }
+  removePurchases (id) {
+    return this.enqueue('remove', 'purchase', id)
+  }
+  addSubscriptions (id) {
+    return this.enqueue('add', 'subscription', id)
   }
   removeSubscriptions (id) {
-    return fetch(`/api/v1/remove_subscriptions/${id}/`, {
-      method: 'DELETE',
-      headers: {
-        'Content-Type': 'application/json',
-        'X-CSRFToken': document.getElementsByName('csrfmiddlewaretoken')[0].value
-      }
-    })
-      .then( e => {
-          if(e.ok) {
-              return e.json()
-          }
-          return Promise.reject(e.statusText)
-      })
+    return this.enqueue('remove', 'subscription', id)
   }
-  addFavorites (id)  {
-    return fetch(`/api/v1/add_favorites/`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        'X-CSRFToken': document.getElementsByName('csrfmiddlewaretoken')[0].value
-      },
-      body: JSON.stringify({
-        id: id
-      })
-    })
-        .then( e => {
-            if(e.ok) {
-                return e.json()
-            }
-            return Promise.reject(e.statusText)
-        })
+  addFavorites (id) {
+    return this.enqueue('add', 'favorite', id)
   }
   removeFavorites (id) {
-    return fetch(`/api/v1/remove_favorites/${id}/`, {
-      method: 'DELETE',
-      headers: {
-        'Content-Type': 'application/json',
-        'X-CSRFToken': document.getElementsByName('csrfmiddlewaretoken')[0].value
-      }
-    })
-        .then( e => {
-            if(e.ok) {
-                return e.json()
-            }
-            return Promise.reject(e.statusText)
-        })
+    return this.enqueue('remove', 'favorite', id)
   }
     getIngredients  (text)  {
         return fetch(`/api/v1/ingredients?query=${text}`, {
@@ -129,4 +94,13 @@ class Api {
                 return Promise.reject(e.statusText)
             })
     }
+    getCatalog  (url)  {
+        return fetch(url)
+            .then( e => {
+                if(e.ok) {
+                    return e.json()
+                }
+                return Promise.reject(e.statusText)
+            })
+    }
 }
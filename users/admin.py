@@ -1,13 +1,19 @@
 from django.contrib import admin
 
+from app.counters import save_without_counters
+
 from .models import User
 
 
 class UserAdmin(admin.ModelAdmin):
-    list_display = ("pk", "username", "email", "first_name", "last_name", "role", "is_active", "date_joined")
+    list_display = ("pk", "username", "email", "first_name", "last_name", "role", "is_active", "date_joined",
+                    "recipe_count", "follower_count", "purchase_count")
     list_display_links = ("pk", "username", "email")
     list_filter = ("role", "is_active", "date_joined")
     search_fields = ("username", "email")
 
+    def save_model(self, request, obj, form, change):
+        save_without_counters(obj)
+
 
 admin.site.register(User, UserAdmin)
@@ -44,6 +44,9 @@ class User(AbstractUser):
     date_joined = models.DateTimeField(_('registered'), auto_now_add=True)
     email = models.EmailField(unique=True, verbose_name='Адрес электронной почты')
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='user')
+    recipe_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Число рецептов')
+    follower_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Число подписчиков')
+    purchase_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Число покупок')
 
     objects = MyUserManager()
 
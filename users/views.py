@@ -11,6 +11,8 @@ from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 from django.views.generic import CreateView
 
+from app import shop_totals
+from app.counters import change_counter
 from app.models import ShopList, User
 from foodgram import settings
 
@@ -25,23 +27,15 @@ class SignUp(CreateView):
     success_url = reverse_lazy('login')
     template_name = 'signup.html'
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        session_key = self.request.session.get('purchase_id')
-        if session_key:
-            context['purchases'] = ShopList.objects.filter(
-                session_key=session_key
-            ).select_related('recipe').values_list('recipe', flat=True)
-
-        return context
-
     def form_valid(self, form):
         session_key = self.request.session.get('purchase_id')
         user = form.save(commit=False)
         user.save()
         if session_key:
-            shop_list = ShopList.objects.select_related('recipe').filter(session_key=session_key)
+            shop_list = list(ShopList.objects.filter(session_key=session_key))
             user.users.add(*shop_list)
+            change_counter(User, user.pk, 'purchase_count', len(shop_list))
+            shop_totals.add_recipes({'user_id': user.pk}, [purchase.recipe_id for purchase in shop_list])
         return super().form_valid(form)
 
 
@@ -50,16 +44,6 @@ class LoginUser(LoginView):
     Класс авторизации пользователя
     """
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        session_key = self.request.session.get('purchase_id')
-        if session_key:
-            context['purchases'] = ShopList.objects.filter(
-                session_key=session_key
-            ).select_related('recipe').values_list('recipe', flat=True)
-
-        return context
-
 
 def password_reset_request(request):
     """